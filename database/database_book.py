@@ -38,13 +38,13 @@ class DatabaseBook:
 
     @staticmethod
     def list_available_book_metas():
-        return [b.get_meta() for b in DatabaseBook.list_available()]
-    
+        from database.database_book_catalog import book_catalog
+        return [entry.meta for entry in book_catalog.books()]
+
     @staticmethod
     def list_available_book_metas_for_user(user, flag):
-        def user_access(b):
-            return b.resolve_user_permissions(user).has(flag)
-        return [b.get_meta() for b in DatabaseBook.list_available() if user_access(b)]
+        from database.database_book_catalog import book_catalog
+        return [meta for meta, _ in book_catalog.books_for_user(user, flag)]
 
     @staticmethod
     def list_all_pages_with_lock(locks: List['LockState']) -> List['DatabasePage']:
@@ -67,9 +67,10 @@ class DatabaseBook:
     def pages(self) -> List['DatabasePage']:
         assert(self.is_valid())
         from database.database_page import DatabasePage
+        from database.database_book_page_index import DatabaseBookPageIndex
 
-        pages = [DatabasePage(self, p) for p in sorted(os.listdir(self.local_path('pages')))]
-        return [p for p in pages if p.is_valid()]
+        index = DatabaseBookPageIndex.load(self)
+        return [DatabasePage(self, p, page_progress=index.progress[p]) for p in index.pages()]
 
     def pages_with_lock(self, locks: List['LockState']) -> List['DatabasePage']:
         from database.file_formats.performance.pageprogress import Locks
@@ -131,8 +132,10 @@ class DatabaseBook:
         return True
 
     def delete(self):
+        from database.database_book_catalog import book_catalog
         if os.path.exists(self.local_path()):
             shutil.rmtree(self.local_path())
+        book_catalog.invalidate(self)
 
     def get_meta(self):
         from database.database_book_meta import DatabaseBookMeta
@@ -0,0 +1,94 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
+import os
+import threading
+import logging
+
+import ommr4all.settings as settings
+from database.database_book import DatabaseBook
+from database.database_permissions import DatabaseBookPermissions, DatabaseBookPermissionFlag, BookPermissionFlags, \
+    _permissions_file
+
+if TYPE_CHECKING:
+    from django.contrib.auth.models import User
+    from database.database_book_meta import DatabaseBookMeta
+
+logger = logging.getLogger(__name__)
+
+
+def _file_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+class BookCatalogEntry(NamedTuple):
+    book: DatabaseBook
+    meta: 'DatabaseBookMeta'
+    permissions: DatabaseBookPermissions
+    key: Tuple
+
+
+class DatabaseBookCatalog:
+    """
+    Cache of the metas and permissions of all books that is used to list the available books.
+
+    Entries are invalidated when the meta or the permissions of a book are written, and are validated by the
+    modification times of the files in case they were changed by another process. The cached metas and permissions
+    are shared and must not be modified, use DatabaseBook.get_meta() or DatabaseBook.get_permissions() instead.
+    """
+    def __init__(self):
+        self.entries: Dict[str, BookCatalogEntry] = {}
+        self.mutex = threading.Lock()
+
+    @staticmethod
+    def _entry_key(book: DatabaseBook) -> Tuple:
+        return _file_key(book.local_path('book_meta.json')), _file_key(book.local_path(_permissions_file))
+
+    def invalidate(self, book: DatabaseBook):
+        with self.mutex:
+            self.entries.pop(book.book, None)
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+
+    def books(self) -> List[BookCatalogEntry]:
+        from database.database_book_meta import DatabaseBookMeta
+        names = os.listdir(settings.PRIVATE_MEDIA_ROOT)
+        with self.mutex:
+            entries = {}
+            for name in names:
+                entry = self.entries.get(name)
+                if entry is None:
+                    book = DatabaseBook(name, skip_validation=True)
+                    if not book.is_valid_name() or not os.path.isdir(book.local_path()):
+                        continue
+                else:
+                    book = entry.book
+
+                key = DatabaseBookCatalog._entry_key(book)
+                if entry is None or entry.key != key:
+                    entry = BookCatalogEntry(book, DatabaseBookMeta.load(book), DatabaseBookPermissions.load(book), key)
+
+                entries[name] = entry
+
+            self.entries = entries
+            return list(entries.values())
+
+    def books_for_user(self, user: 'User', flag: DatabaseBookPermissionFlag) \
+            -> List[Tuple['DatabaseBookMeta', BookPermissionFlags]]:
+        # resolve the groups of the user once for all books
+        groups = [g.name for g in user.groups.all()] if not user.is_superuser else []
+        out = []
+        for entry in self.books():
+            flags = entry.permissions.resolve_user_permissions(user, groups)
+            if flags.has(flag):
+                out.append((entry.meta, flags))
+
+        return out
+
+
+book_catalog = DatabaseBookCatalog()
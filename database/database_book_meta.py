@@ -67,10 +67,12 @@ class DatabaseBookMeta(DataClassJSONMixin):
         return meta
 
     def to_file(self, book: DatabaseBook):
+        from database.database_book_catalog import book_catalog
         self.id = book.book
         s = self.to_json(indent=2)
         with open(book.local_path('book_meta.json'), 'w') as f:
             f.write(s)
+        book_catalog.invalidate(book)
 
 
 if __name__ == '__main__':
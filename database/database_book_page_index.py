@@ -0,0 +1,134 @@
+from typing import Dict, List, TYPE_CHECKING
+from threading import Lock
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+import time
+import logging
+
+from database.file_formats.performance.pageprogress import PageProgress
+
+if TYPE_CHECKING:
+    from database.database_book import DatabaseBook
+
+logger = logging.getLogger(__name__)
+
+RACY_MODIFICATION_NS = 2 * 10 ** 9
+
+_mutex = Lock()
+_book_mutexes: Dict[str, Lock] = {}
+
+
+def _book_mutex(book: 'DatabaseBook') -> Lock:
+    with _mutex:
+        return _book_mutexes.setdefault(book.local_path(), Lock())
+
+
+@contextmanager
+def _book_lock(book: 'DatabaseBook'):
+    # the index is read, modified, and written by the web server and the task worker processes
+    with _book_mutex(book):
+        with open(book.local_path(DatabaseBookPageIndex.FILENAME + '.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DatabaseBookPageIndex:
+    """
+    Index of the pages of a book and their progress (locks and verification) that is stored in a single file.
+
+    Listing the pages and filtering them by their progress thus requires one file read instead of reading the
+    progress file of every page. The index is updated when the progress of a page is saved. Pages that were added,
+    removed, or renamed are detected by the modification time of the pages directory, then only the progress files
+    of the new pages are read. The index is locked (also against other processes) while it is read and written.
+    """
+    FILENAME = 'page_index.json'
+
+    def __init__(self, book: 'DatabaseBook'):
+        self.book = book
+        self.pages_modified = 0
+        self.progress: Dict[str, PageProgress] = {}
+
+    def path(self) -> str:
+        return self.book.local_path(DatabaseBookPageIndex.FILENAME)
+
+    @staticmethod
+    def load(book: 'DatabaseBook') -> 'DatabaseBookPageIndex':
+        with _book_lock(book):
+            index = DatabaseBookPageIndex._read(book)
+            if index._refresh():
+                index._write()
+
+            return index
+
+    @staticmethod
+    def update_progress(book: 'DatabaseBook', page: str, page_progress: PageProgress):
+        with _book_lock(book):
+            index = DatabaseBookPageIndex._read(book)
+            index._refresh()
+            index.progress[page] = PageProgress.from_dict(page_progress.to_dict())
+            index._write()
+
+    def pages(self) -> List[str]:
+        return sorted(self.progress.keys())
+
+    @staticmethod
+    def _read(book: 'DatabaseBook') -> 'DatabaseBookPageIndex':
+        index = DatabaseBookPageIndex(book)
+        try:
+            with open(index.path()) as f:
+                d = json.load(f)
+
+            index.pages_modified = d.get('pagesModified', 0)
+            index.progress = {page: PageProgress.from_dict(pp) for page, pp in d.get('pages', {}).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error("Exception when parsing the page index of book {}. Rebuilding index".format(book.book))
+            logger.exception(e)
+            index = DatabaseBookPageIndex(book)
+
+        return index
+
+    def _write(self):
+        s = json.dumps({
+            'pagesModified': self.pages_modified,
+            'pages': {page: pp.to_dict() for page, pp in self.progress.items()},
+        })
+        # write to a temporary file first so that readers never see a partially written index
+        tmp_path = self.path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(s)
+        os.replace(tmp_path, self.path())
+
+    def _read_progress(self, page: str) -> PageProgress:
+        from database.database_page import DatabasePage
+        file = DatabasePage(self.book, page).file('page_progress')
+        if not os.path.exists(file.local_path()):
+            return PageProgress()
+
+        return PageProgress.from_json_file(file.local_path())
+
+    def _refresh(self) -> bool:
+        # synchronize the page names with the pages directory, returns True if the index changed
+        pages_path = self.book.local_path('pages')
+        modified = os.stat(pages_path).st_mtime_ns
+        if modified == self.pages_modified:
+            return False
+
+        names = set(os.listdir(pages_path))
+        for page in list(self.progress.keys()):
+            if page not in names:
+                del self.progress[page]
+
+        for page in names:
+            if page not in self.progress and os.path.isdir(os.path.join(pages_path, page)):
+                self.progress[page] = self._read_progress(page)
+
+        # modification times have a coarse resolution, do not trust a recent one (a later change could be missed)
+        self.pages_modified = modified if time.time_ns() - modified > RACY_MODIFICATION_NS else 0
+        return True
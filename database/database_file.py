@@ -1,8 +1,7 @@
 from typing import NamedTuple, List
 from PIL import Image
-from multiprocessing import Lock
+from threading import RLock
 from locked_dict.locked_dict import LockedDict
-import numpy as np
 import os
 from database.database_page import DatabasePage
 import logging
@@ -134,18 +133,20 @@ file_definitions = {
 
     'connected_components_norm': DatabaseFileDefinition(
         'connected_components_norm',
-        ['connected_components_norm.pkl'],
+        ['connected_components_norm_labels.npy', 'connected_components_norm_stats.npz'],
         requires=['binary_norm'],
     ),
 }
 
 mutex_dict = LockedDict()
 
-thumbnail_size = (200, 350)
 
-high_res_max_width = 2000
-low_res_max_width = 1000
-target_staff_line_distance = 10
+def file_lock(path: str) -> RLock:
+    # lock of a local file that is held while the file is created or written
+    with mutex_dict:
+        return mutex_dict.setdefault(path, RLock())
+
+thumbnail_size = (200, 350)
 
 
 class DatabaseFile:
@@ -201,14 +202,21 @@ class DatabaseFile:
             if os.path.exists(self.local_thumbnail_path(file_id=i)):
                 os.remove(self.local_thumbnail_path(file_id=i))
 
-    def _save_and_thumbnail(self, img: Image, idx: int):
+    def save_image_and_thumbnail(self, img: Image, idx: int):
         img.save(self.local_path(idx))
+        img = img.copy()
         img.thumbnail(thumbnail_size)
         img.save(self.local_thumbnail_path(idx))
 
     def create(self):
-
-        with mutex_dict.get(self.local_path(), Lock()):
+        from omr.steps.preprocessing.pipeline import PreprocessingPipeline
+        if self.definition.id in PreprocessingPipeline.PIPELINE_FILES:
+            # derived images are created together with their missing requirements in a single pass, that locks all
+            # files it writes
+            PreprocessingPipeline(self.page).create([self.definition.id], recompute=False)
+            return
+
+        with file_lock(self.local_path()):
             if self.exists():
                 # check if exists
                 return
@@ -221,8 +229,6 @@ class DatabaseFile:
             if self.exists():
                 return
 
-            from omr.steps.preprocessing.preprocessing import Preprocessing
-
             # create local file
             logger.info('Creating local file {}'.format(self.local_path()))
             if self.definition.id == 'statistics' \
@@ -241,12 +247,11 @@ class DatabaseFile:
                     json.dump({}, f)
             elif self.definition.id == 'pcgts':
                 from database.file_formats.pcgts import PcGts, Page, Meta
-                img = Image.open(DatabaseFile(self.page, 'color_original').local_path())
                 pcgts = PcGts(
                     meta=Meta(),
                     page=Page(location=self.page),
                 )
-                pcgts.page.image_width, pcgts.page.image_height = img.size
+                pcgts.page.image_width, pcgts.page.image_height = self.page.image_size('color_original')
                 pcgts.to_file(self.local_path())
             elif self.definition.id == 'pcgts_backup':
                 import zipfile
@@ -255,101 +260,9 @@ class DatabaseFile:
             elif self.definition.id == 'color_original':
                 # create preview
                 img = Image.open(self.local_path())
+                self.page.set_image_size(self.definition.id, img.size)
                 img.thumbnail(thumbnail_size)
                 img.save(self.local_thumbnail_path())
-            elif self.definition.id == 'color_highres_preproc':
-                meta = self.page.meta()
-                preproc = Preprocessing()
-                img = Image.open(self.page.local_file_path('color_original.jpg'))
-                w, h = img.size
-                out_w = min(high_res_max_width, w)
-                out_h = (out_w * h) // w
-                c_hr = img.resize((out_w, out_h), Image.BILINEAR)
-                c_hr, g_hr, b_hr = preproc.preprocess(c_hr)
-                meta.preprocessing.deskewing_degrees = preproc.deskewed_angle
-                meta.save(self.page)
-                self._save_and_thumbnail(c_hr, 0)
-                self._save_and_thumbnail(g_hr, 1)
-                self._save_and_thumbnail(b_hr, 2)
-            elif self.definition.id == 'color_lowres_preproc':
-                c_hr = Image.open(self.page.local_file_path('color_highres_preproc.jpg'))
-                b_hr = Image.open(self.page.local_file_path('binary_highres_preproc.png'))
-                g_hr = Image.open(self.page.local_file_path('gray_highres_preproc.jpg'))
-                w, h = c_hr.size
-                out_w = min(low_res_max_width, w)
-                out_h = (out_w * h) // w
-                size = (out_w, out_h)
-                c_hr = c_hr.resize(size, Image.BILINEAR)
-                g_hr = g_hr.resize(size, Image.BILINEAR)
-                b_hr = b_hr.resize(size, Image.NEAREST)
-
-                self._save_and_thumbnail(c_hr, 0)
-                self._save_and_thumbnail(g_hr, 1)
-                self._save_and_thumbnail(b_hr, 2)
-            elif self.definition.id == 'color_norm':
-                meta = self.page.meta()
-                c_hr = Image.open(self.page.local_file_path('color_highres_preproc.jpg'))
-                if meta.preprocessing.auto_line_distance:
-                    from omr.steps.preprocessing.scale.scale import LineDistanceComputer
-                    ldc = LineDistanceComputer()
-                    low_binary = Image.open(self.page.local_file_path('binary_highres_preproc.png'))
-                    line_distance = ldc.get_line_distance(np.array(low_binary) / 255).line_distance
-                    meta.preprocessing.average_line_distance = line_distance
-                    meta.save(self.page)
-                else:
-                    # average_line_distance is expected to be computed on the original image
-                    c_orig = Image.open(self.page.local_file_path('color_original.jpg'))
-                    line_distance = int(np.round(meta.preprocessing.average_line_distance * c_hr.size[0] / c_orig.size[0]))
-
-                assert(line_distance > 0)
-
-                # rescale original image
-                scaling = line_distance / target_staff_line_distance
-                size = (int(c_hr.size[0] / scaling), int(c_hr.size[1] / scaling))
-                c_hr = c_hr.resize(size, Image.BILINEAR)
-
-                # compute gray and binary based on normalized color image
-                preproc = Preprocessing()
-                g_hr = preproc.im2gray(c_hr)
-                b_hr = preproc.binarize(c_hr)
-
-                # save output
-                self._save_and_thumbnail(c_hr, 0)
-                self._save_and_thumbnail(g_hr, 1)
-                self._save_and_thumbnail(b_hr, 2)
-            elif self.definition.id == 'color_norm_x2':
-                meta = self.page.meta()
-                line_distance = meta.preprocessing.average_line_distance
-                if line_distance <= 0:
-                    nf = self.page.file('color_norm')
-                    nf.delete()
-                    nf.create()
-                    meta = self.page.meta()
-                    line_distance = meta.preprocessing.average_line_distance
-
-                assert(line_distance > 0)
-                c_hr = Image.open(self.page.local_file_path('color_highres_preproc.jpg'))
-
-                # rescale original image
-                scaling = line_distance / (target_staff_line_distance * 2)
-                size = (int(c_hr.size[0] / scaling), int(c_hr.size[1] / scaling))
-                c_hr = c_hr.resize(size, Image.BILINEAR)
-
-                # compute gray and binary based on normalized color image
-                preproc = Preprocessing()
-                g_hr = preproc.im2gray(c_hr)
-                b_hr = preproc.binarize(c_hr)
-
-                # save output
-                self._save_and_thumbnail(c_hr, 0)
-                self._save_and_thumbnail(g_hr, 1)
-                self._save_and_thumbnail(b_hr, 2)
-            elif self.definition.id == 'connected_components_norm':
-                import pickle
-                from omr.steps.preprocessing.util.connected_compontents import connected_compontents_with_stats
-                binary = np.array(Image.open(DatabaseFile(self.page, 'binary_norm').local_path()))
-                with open(self.local_path(), 'wb') as f:
-                    pickle.dump(connected_compontents_with_stats(binary), f)
             else:
                 raise Exception("Cannot create file for {}".format(self.definition.id))
 
@@ -3,7 +3,7 @@ from json import JSONDecodeError
 from database.database_book import DatabaseBook, file_name_validator, InvalidFileNameException, FileExistsException
 from django.core.exceptions import EmptyResultSet
 from database.database_permissions import DatabaseBookPermissionFlag
-from typing import Optional
+from typing import Optional, Tuple
 import os
 import shutil
 from typing import TYPE_CHECKING
@@ -45,6 +45,7 @@ class DatabasePage:
     def delete(self):
         if os.path.exists(self.local_path()):
             shutil.rmtree(self.local_path())
+            self._update_page_index()
 
     def rename(self, new_name):
         if not file_name_validator.fullmatch(new_name):
@@ -58,6 +59,12 @@ class DatabasePage:
             raise FileExistsException(new_name, new_path)
 
         shutil.move(old_path, new_path)
+        self._update_page_index()
+
+    def _update_page_index(self):
+        # synchronize the page index of the book with the pages directory
+        from database.database_book_page_index import DatabaseBookPageIndex
+        DatabaseBookPageIndex.load(self.book)
 
     def file(self, fileId, create_if_not_existing=False):
         from database.database_file import DatabaseFile
@@ -111,7 +118,9 @@ class DatabasePage:
         if not self._page_progress:
             return
 
+        from database.database_book_page_index import DatabaseBookPageIndex
         self._page_progress.to_json_file(self.file('page_progress').local_path())
+        DatabaseBookPageIndex.update_progress(self.book, self.page, self._page_progress)
         logger.debug('Successfully saved page progress file to {}'.format(self.file('page_progress').local_path()))
 
     def pcgts(self, create_if_not_existing=True) -> 'PcGts':
@@ -135,6 +144,29 @@ class DatabasePage:
         if self._meta:
             self._meta.save(self)
 
+    def image_size(self, file_id: str = 'color_original', create_if_not_existing=True) -> Tuple[int, int]:
+        # (width, height) of an image of the page, recorded in the page meta to avoid opening the image
+        # raises a FileNotFoundError if the image does not exist and shall not be created
+        file = self.file(file_id, create_if_not_existing=create_if_not_existing)
+        size = self.meta().image_sizes.get(file.definition.id)
+        modified = os.stat(file.local_path()).st_mtime_ns
+        if size is not None and size.modified == modified:
+            return size.width, size.height
+
+        # legacy page or image was changed, the size is only updated in memory and stored with the next write of the
+        # page meta (e.g. by the preprocessing), a lookup does not write the meta
+        from PIL import Image
+        with Image.open(file.local_path()) as img:
+            self.set_image_size(file_id, img.size, save=False)
+            return img.size
+
+    def set_image_size(self, file_id: str, size: Tuple[int, int], save: bool = True):
+        from database.database_page_meta import ImageSize
+        file = self.file(file_id)
+        self.meta().image_sizes[file.definition.id] = ImageSize(size[0], size[1], os.stat(file.local_path()).st_mtime_ns)
+        if save:
+            self.save_meta()
+
     def is_valid(self):
         if not os.path.exists(self.local_path()):
             return True
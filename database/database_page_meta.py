@@ -1,5 +1,7 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Dict
 from database.database_page import DatabasePage
+from database.file_formats.filecache import page_meta_cache
 from mashumaro import DataClassJSONMixin
 
 
@@ -10,13 +12,25 @@ class Preprocessing(DataClassJSONMixin):
     deskewing_degrees: float = 0
 
 
+@dataclass
+class ImageSize(DataClassJSONMixin):
+    width: int
+    height: int
+    modified: int = 0   # modification time (ns) of the image file when the size was recorded
+
+
 @dataclass
 class DatabasePageMeta(DataClassJSONMixin):
     preprocessing: Preprocessing
+    image_sizes: Dict[str, ImageSize] = field(default_factory=dict)     # by the DatabaseFile id
 
     @staticmethod
     def load(page: DatabasePage):
         path = page.file('meta').local_path()
+        return page_meta_cache.get(path, lambda: DatabasePageMeta._load(path))
+
+    @staticmethod
+    def _load(path: str):
         try:
             with open(path) as f:
                 return DatabasePageMeta.from_json(f.read())
@@ -26,6 +40,10 @@ class DatabasePageMeta(DataClassJSONMixin):
             )
 
     def save(self, page: DatabasePage):
+        from database.database_file import file_lock
         dump = self.to_json(indent=2)
-        with open(page.file('meta').local_path(), 'w') as f:
-            f.write(dump)
+        path = page.file('meta').local_path()
+        with file_lock(path):
+            page_meta_cache.invalidate(path)
+            with open(path, 'w') as f:
+                f.write(dump)
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Dict, NamedTuple, TYPE_CHECKING, Union
+from typing import Dict, NamedTuple, TYPE_CHECKING, Union, List, Optional
 from enum import IntEnum
 import pickle
 
@@ -81,8 +81,10 @@ class BookPermissionData(NamedTuple):
 
 class DatabaseBookPermissions:
     def write(self):
+        from database.database_book_catalog import book_catalog
         with open(self.book.local_path(_permissions_file), 'wb') as f:
             pickle.dump(self.permissions, f)
+        book_catalog.invalidate(self.book)
 
     @staticmethod
     def load(book: 'DatabaseBook'):
@@ -98,7 +100,8 @@ class DatabaseBookPermissions:
         self.book = book
         self.permissions = permissions
 
-    def resolve_user_permissions(self, user: 'User'):
+    def resolve_user_permissions(self, user: 'User', groups: Optional[List[str]] = None):
+        # groups: names of the groups of the user if already known (saves a database query)
         if user.is_superuser:
             # superuser has full access, always
             return BookPermissionFlags.full_access_flags()
@@ -109,9 +112,12 @@ class DatabaseBookPermissions:
         if un in self.permissions.users:
             flags = flags | self.permissions.users[un]
 
-        for group in user.groups.all():
-            if group.name in self.permissions.groups:
-                flags = flags | self.permissions.groups[group.name]
+        if groups is None:
+            groups = [group.name for group in user.groups.all()]
+
+        for group in groups:
+            if group in self.permissions.groups:
+                flags = flags | self.permissions.groups[group]
 
         return flags
 
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Callable, Dict, Optional, Tuple, TypeVar, Generic
+import os
+import threading
+import logging
+
+from ommr4all.settings import FILE_CACHE_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class ParsedFileCache(Generic[T]):
+    """
+    Process-wide LRU cache of objects that were parsed from files.
+
+    The memory of the cache is bounded by max_bytes, the size of a parsed object is estimated by the size of its file
+    (the objects themselves need a multiple of that). Files that are larger than the bound are not cached.
+
+    An entry is valid as long as modification time and size of its file did not change, writers should call
+    invalidate nevertheless. The cached instance is never handed out, every read returns a (deep) copy so that
+    callers may modify the result freely. Objects that must not be copied (e.g. the DatabasePage of a PcGts) are
+    passed as shared and replaced by the instances of the caller.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: 'OrderedDict[str, Tuple[Tuple[int, int], T, Tuple]]' = OrderedDict()
+        self.mutex = threading.Lock()
+
+    @staticmethod
+    def _file_key(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _copy(obj: T, shared_old: Tuple, shared_new: Tuple) -> T:
+        memo: Dict[int, object] = {id(o): n for o, n in zip(shared_old, shared_new) if o is not None}
+        return deepcopy(obj, memo)
+
+    def get(self, path: str, load: Callable[[], T], shared: Tuple = ()) -> T:
+        if self.max_bytes <= 0:
+            return load()
+
+        path = os.path.abspath(path)
+        file_key = ParsedFileCache._file_key(path)
+        if file_key is None:
+            # let the loader handle missing files
+            return load()
+        if file_key[1] > self.max_bytes:
+            return load()
+
+        with self.mutex:
+            entry = self.entries.get(path)
+            if entry is not None and entry[0] == file_key:
+                self.entries.move_to_end(path)
+                return ParsedFileCache._copy(entry[1], entry[2], shared)
+
+        obj = load()
+        cached = ParsedFileCache._copy(obj, shared, shared)
+        with self.mutex:
+            # the file might have been modified while loading, only cache if the file key did not change
+            if ParsedFileCache._file_key(path) == file_key:
+                self._remove(path)
+                self.entries[path] = (file_key, cached, shared)
+                self.size += file_key[1]
+                while self.size > self.max_bytes:
+                    self._remove(next(iter(self.entries)))
+
+        return obj
+
+    def _remove(self, path: str):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.size -= entry[0][1]
+
+    def invalidate(self, path: str):
+        with self.mutex:
+            self._remove(os.path.abspath(path))
+
+    def clear(self):
+        with self.mutex:
+            self.entries.clear()
+            self.size = 0
+
+
+pcgts_cache: ParsedFileCache['PcGts'] = ParsedFileCache(FILE_CACHE_SETTINGS.max_pcgts_mb * 1024 ** 2)
+page_progress_cache: ParsedFileCache['PageProgress'] = ParsedFileCache(FILE_CACHE_SETTINGS.max_page_meta_mb * 1024 ** 2)
+page_meta_cache: ParsedFileCache['DatabasePageMeta'] = ParsedFileCache(FILE_CACHE_SETTINGS.max_page_meta_mb * 1024 ** 2)
@@ -5,4 +5,4 @@ from .page.musicsymbol import MusicSymbol, MusicSymbolPositionInStaff, create_ac
 from .page.staffline import StaffLines, StaffLine
 from .page.line import Line
 from .page.block import Block, BlockType
-from .page.page import Page, PageScaleReference
+from .page.page import Page, PageScaleReference, PageScaleNotAvailable
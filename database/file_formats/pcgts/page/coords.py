@@ -5,7 +5,20 @@ from typing import Type, Union
 from mashumaro.types import SerializableType
 
 
+def _rotate_points(points: np.ndarray, degree, origin) -> np.ndarray:
+    # rotate the points (N x 2) around the origin
+    radians = degree / 180 * np.pi
+    offset_x, offset_y = origin
+    adjusted_x, adjusted_y = points[:, 0] - offset_x, points[:, 1] - offset_y
+    cos_rad, sin_rad = np.cos(radians), np.sin(radians)
+    qx = offset_x + cos_rad * adjusted_x + sin_rad * adjusted_y
+    qy = offset_y + -sin_rad * adjusted_x + cos_rad * adjusted_y
+    return np.stack([qx, qy], axis=1)
+
+
 class Point:
+    __slots__ = ('p', )
+
     def __init__(self, x: Union[int, float, np.ndarray, 'Size', 'Point'] = 0, y=0):
         if isinstance(x, np.ndarray):
             self.p = x
@@ -18,17 +31,7 @@ class Point:
         return Point(self.x, self.y)
 
     def rotate(self, degree, origin):
-        def rotate_point(xy, radians, origin=(0, 0)):
-            x, y = xy
-            offset_x, offset_y = origin
-            adjusted_x, adjusted_y = (x - offset_x), (y - offset_y)
-            cos_rad, sin_rad = np.cos(radians), np.sin(radians)
-            qx = offset_x + cos_rad * adjusted_x + sin_rad * adjusted_y
-            qy = offset_y + -sin_rad * adjusted_x + cos_rad * adjusted_y
-
-            return qx, qy
-
-        self.p = np.array(rotate_point(self.p, degree / 180 * np.pi, origin))
+        self.p = _rotate_points(self.p.reshape(1, 2), degree, origin)[0]
 
     @property
     def x(self):
@@ -77,10 +80,11 @@ class Point:
 
     @staticmethod
     def from_string(s):
-        return Point(*tuple(map(float, s.split(","))))
+        x, y = s.split(",")
+        return Point(float(x), float(y))
 
     def to_string(self):
-        return ",".join(map(str, [self.x, self.y]))
+        return "{!r},{!r}".format(*self.p.tolist())
 
     @staticmethod
     def from_json(json):
@@ -91,6 +95,8 @@ class Point:
 
 
 class Size:
+    __slots__ = ('p', )
+
     def __init__(self, w: Union[int, float, np.ndarray, 'Size', 'Point'] = 0, h=0):
         if isinstance(w, np.ndarray):
             self.p = w
@@ -136,10 +142,11 @@ class Size:
 
     @staticmethod
     def from_string(s):
-        return Size(*tuple(map(float, s.split(","))))
+        w, h = s.split(",")
+        return Size(float(w), float(h))
 
     def to_string(self):
-        return ",".join(map(str, [self.w, self.h]))
+        return "{!r},{!r}".format(*self.p.tolist())
 
     @staticmethod
     def from_json(json):
@@ -160,27 +167,24 @@ class Coords(SerializableType):
         return Coords(self.points * factor)
 
     def rotate(self, degree, origin):
-        def rotate_point(xy, radians, origin=(0, 0)):
-            x, y = xy
-            offset_x, offset_y = origin
-            adjusted_x, adjusted_y = (x - offset_x), (y - offset_y)
-            cos_rad, sin_rad = np.cos(radians), np.sin(radians)
-            qx = offset_x + cos_rad * adjusted_x + sin_rad * adjusted_y
-            qy = offset_y + -sin_rad * adjusted_x + cos_rad * adjusted_y
-
-            return qx, qy
-
-        self.points = np.array([rotate_point(p, degree / 180 * np.pi, origin) for p in self.points])
+        self.points = _rotate_points(self.points.reshape(-1, 2), degree, origin)
 
     @staticmethod
     def from_string(s):
         if len(s) == 0:
             return Coords()
 
-        return Coords(np.array([list(map(float, p.split(','))) for p in s.split(" ")]))
+        # parse all numbers at once, the (slow) per point parsing is only used to raise errors for invalid strings
+        n_points = s.count(' ') + 1
+        values = np.fromstring(s.replace(' ', ','), sep=',')
+        if values.shape[0] != 2 * n_points or s.count(',') != n_points:
+            return Coords(np.array([list(map(float, p.split(','))) for p in s.split(" ")]))
+
+        return Coords(values.reshape(n_points, 2))
 
     def to_string(self):
-        return " ".join(",".join(map(str, self.points[i])) for i in range(self.points.shape[0]))
+        # the representation of floats is the same as str of numpy floats
+        return " ".join(["{!r},{!r}".format(x, y) for x, y in self.points.tolist()])
 
     @staticmethod
     def from_json(json):
@@ -220,15 +224,7 @@ class Coords(SerializableType):
         if len(self.points) == 0:
             return Rect()
 
-        tl = self.points[0]
-        br = self.points[0]
-        for p in self.points[1:]:
-            tl = np.min([tl, p], axis=0)
-            br = np.max([br, p], axis=0)
-
-        Point(tl)
-
-        return Rect(Point(tl), Point(br))
+        return Rect(Point(self.points.min(axis=0)), Point(self.points.max(axis=0)))
 
     def extract_from_image(self, image: np.ndarray):
         aabb = self.aabb()
@@ -237,6 +233,8 @@ class Coords(SerializableType):
 
 
 class Rect:
+    __slots__ = ('origin', 'size')
+
     def __init__(self, origin: Point = None, size: Union[Point, Size] = None):
         self.origin = origin if origin else Point()
         if size and isinstance(size, Point):
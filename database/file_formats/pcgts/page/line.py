@@ -1,4 +1,5 @@
 from typing import List, Optional, Dict
+import numpy as np
 from .region import Region, Coords
 from .definitions import BlockType
 from .coords import Point
@@ -196,6 +197,9 @@ class Line(Region):
     def compute_position_in_staff(self, coord: Point) -> MusicSymbolPositionInStaff:
         return self.staff_lines.compute_position_in_staff(coord)
 
+    def compute_positions_in_staff(self, coords: np.ndarray) -> List[MusicSymbolPositionInStaff]:
+        return self.staff_lines.compute_positions_in_staff(coords)
+
     def update_note_names(self, initial_clef: MusicSymbol = None):
         current_clef = initial_clef if initial_clef else create_clef(ClefType.F, position_in_staff=MusicSymbolPositionInStaff.LINE_0)
 
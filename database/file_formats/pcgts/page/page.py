@@ -31,6 +31,10 @@ class PageScaleReference(IntEnum):
             return color + "_norm_x2"
 
 
+class PageScaleNotAvailable(Exception):
+    pass
+
+
 class Page:
     def __init__(self,
                  blocks: List[Block]=None,
@@ -225,12 +229,25 @@ class Page:
             staff.draw(canvas, color, thickness)
 
     def page_scale_size(self, ref: PageScaleReference):
-        if ref not in self.page_scale_ratios:
-            from PIL import Image
-            img = Image.open(self.location.file(ref.file(), create_if_not_existing=True).local_path())
-            self.page_scale_ratios[ref] = img.size
-
-        return self.page_scale_ratios[ref]
+        # size of the image of the scale reference, the sizes are recorded in the page meta when the images are created
+        # (the images are not created here, they must be created, e.g. loaded for a dataset, before converting coords)
+        size = self.page_scale_ratios.get(ref)
+        if size is not None:
+            return size
+
+        if ref == PageScaleReference.ORIGINAL and self.image_width > 0 and self.image_height > 0:
+            size = (self.image_width, self.image_height)
+        elif self.location is None:
+            raise PageScaleNotAvailable("Page has no location to look up the size of the {} image".format(ref.file()))
+        else:
+            try:
+                size = self.location.image_size(ref.file(), create_if_not_existing=False)
+            except FileNotFoundError:
+                raise PageScaleNotAvailable("Image {} of page {} does not exist. Create the derived images of the page "
+                                            "(preprocessing) first.".format(ref.file(), self.location.local_path()))
+
+        self.page_scale_ratios[ref] = size
+        return size
 
     def _scale(self, p: Union[Coords, Point, float, int], scale: float):
         if isinstance(p, Coords):
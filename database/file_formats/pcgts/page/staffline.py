@@ -1,8 +1,7 @@
 from .coords import Coords, Rect, Point
-from typing import List, Tuple
+from typing import List, Tuple, NamedTuple
 import numpy as np
 from .definitions import MusicSymbolPositionInStaff
-from dataclasses import dataclass
 
 
 class StaffLine:
@@ -77,6 +76,7 @@ class StaffLine:
         fit = [np.mean(target[i:i+bot-top, :] * search) for i in range(offset * 2)]
         shift = np.argmin(fit) - offset
         self.coords.points[:, 1] += shift
+        self.update()
 
         # debug output
         if debug:
@@ -89,6 +89,15 @@ class StaffLine:
             print(shift)
 
 
+class StaffPositions(NamedTuple):
+    # staff lines sorted from top to bottom, the coords of the lines, and the position in staff of each line
+    key: Tuple
+    lines: List[StaffLine]
+    points: List[np.ndarray]
+    spaces: np.ndarray
+    positions: np.ndarray
+
+
 class StaffLines(List[StaffLine]):
     @staticmethod
     def from_json(json):
@@ -118,6 +127,11 @@ class StaffLines(List[StaffLine]):
     def compute_position_in_staff(self, coord: Point) -> MusicSymbolPositionInStaff:
         return self.position_in_staff(coord)
 
+    def compute_positions_in_staff(self, coords: np.ndarray) -> List[MusicSymbolPositionInStaff]:
+        # positions in staff of multiple coords (N x 2)
+        coords = np.reshape(coords, (-1, 2))
+        return list(map(MusicSymbolPositionInStaff, self.positions_in_staff(coords[:, 0], coords[:, 1])))
+
     def compute_coord_by_position_in_staff(self, x: float, pis: MusicSymbolPositionInStaff) -> Point:
         line = pis.value - MusicSymbolPositionInStaff.LINE_1
         if line < 0:
@@ -137,89 +151,88 @@ class StaffLines(List[StaffLine]):
         d = max(ys) - min(ys)
         return d / (len(self) - 1)
 
+    def _staff_positions(self) -> StaffPositions:
+        # the sorted lines and their positions are cached, the cache is invalid if a line is added, removed, or
+        # replaced, if the coords of a line are replaced, or if a line was edited (see StaffLine.update)
+        key = tuple((id(sl.coords.points), sl.space, sl.center_y()) for sl in self)
+        cache: StaffPositions = getattr(self, '_staff_positions_cache', None)
+        if cache is not None and cache.key == key:
+            return cache
+
+        lines = self.sorted()
+        spaces = np.array([sl.space for sl in lines], dtype=bool)
+        positions = np.zeros(len(lines), dtype=int)
+        if len(lines) > 0:
+            positions[-1] = MusicSymbolPositionInStaff.SPACE_1 if spaces[-1] else MusicSymbolPositionInStaff.LINE_1
+        for i in reversed(range(0, len(lines) - 1)):
+            positions[i] = positions[i + 1] + (2 if spaces[i + 1] == spaces[i] else 1)
+
+        # the points are referenced by the cache, so that their ids in the key can not be reused
+        cache = StaffPositions(key, lines, [sl.coords.points for sl in self], spaces, positions)
+        self._staff_positions_cache = cache
+        return cache
+
     # Following code taken from ommr4all-client
     # ==================================================================
     @staticmethod
-    def _round_to_staff_pos(x: float):
+    def _round_to_staff_pos(x: np.ndarray):
         rounded = np.round(x)
         even = (rounded + 2000) % 2 == 0
-        if not even:
-            if abs(x - rounded) < 0.4:
-                return rounded
-            else:
-                return rounded + 1 if x - rounded > 0 else rounded - 1
-        else:
-            return rounded
+        return np.where(even | (np.abs(x - rounded) < 0.4), rounded, np.where(x - rounded > 0, rounded + 1, rounded - 1))
 
     @staticmethod
-    def _interp_staff_pos(y: float, top: float, bot: float, top_space: bool, bot_space: bool,
-                          top_pos: MusicSymbolPositionInStaff, bot_pos: MusicSymbolPositionInStaff,
-                          offset: int) -> Tuple[float, MusicSymbolPositionInStaff]:
+    def _interp_staff_pos(y: np.ndarray, top: np.ndarray, bot: np.ndarray, top_space: np.ndarray, bot_space: np.ndarray,
+                          top_pos: np.ndarray, bot_pos: np.ndarray,
+                          offset: int) -> Tuple[np.ndarray, np.ndarray]:
         ld = bot - top
-        if top_space and not bot_space:
-            top -= ld
-            top_pos += 1
-        elif not top_space and bot_space:
-            bot += ld
-            bot_pos -= 1
-        elif top_space and bot_space:
-            center = (top + bot) / 1
-            if center > y:
-                top -= ld / 2
-                bot = center
-                top_pos += 1
-                bot_pos = top_pos - 2
-            else:
-                top = center
-                bot += ld / 2
-                top_pos -= 1
-                top_pos = bot_pos + 2
-
-        d = y -top
-        rel = d / (bot - top)
+        top_only = top_space & ~bot_space
+        bot_only = ~top_space & bot_space
+        both = top_space & bot_space
+        center = (top + bot) / 1
+        above = center > y
+
+        top = np.where(top_only, top - ld, top)
+        top_pos = np.where(top_only, top_pos + 1, top_pos)
+        bot = np.where(bot_only, bot + ld, bot)
+
+        top = np.where(both, np.where(above, top - ld / 2, center), top)
+        bot = np.where(both, np.where(above, center, bot + ld / 2), bot)
+        top_pos = np.where(both, np.where(above, top_pos + 1, bot_pos + 2), top_pos)
+
+        d = y - top
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rel = d / (bot - top)
         snapped = -offset + StaffLines._round_to_staff_pos(2 * rel)
-        return top + snapped * (bot - top) / 2, \
-               MusicSymbolPositionInStaff(max(MusicSymbolPositionInStaff.SPACE_0,
-                                              min(MusicSymbolPositionInStaff.SPACE_7, int(top_pos - snapped))))
+        pos = np.clip(np.trunc(top_pos - snapped), MusicSymbolPositionInStaff.SPACE_0, MusicSymbolPositionInStaff.SPACE_7)
+        pos = np.where(np.isfinite(pos), pos, MusicSymbolPositionInStaff.UNDEFINED).astype(int)
+        return top + snapped * (bot - top) / 2, pos
 
-    def _staff_pos(self, p: Point, offset: int = 0) -> Tuple[float, MusicSymbolPositionInStaff]:
-        @dataclass
-        class StaffPos:
-            line: StaffLine
-            y: float
-            pos: MusicSymbolPositionInStaff
+    def staff_positions(self, xs: np.ndarray, ys: np.ndarray, offset: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        # snapped y coordinates and the positions in staff (values of MusicSymbolPositionInStaff) of multiple points
+        xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        cache = self._staff_positions()
+        if len(cache.lines) <= 1:
+            return ys, np.full(ys.shape, MusicSymbolPositionInStaff.UNDEFINED, dtype=int)
 
-        if len(self) <= 1:
-            return p.y, MusicSymbolPositionInStaff.UNDEFINED
-
-        y_on_staff: List[StaffPos] = []
-        for staffLine in self.sorted():
-            y_on_staff.append(StaffPos(staffLine, staffLine.coords.interpolate_y(p.x), MusicSymbolPositionInStaff.UNDEFINED))
-
-        y_on_staff[-1].pos = MusicSymbolPositionInStaff.SPACE_1 if y_on_staff[-1].line.space else MusicSymbolPositionInStaff.LINE_1
-        for i in reversed(range(0, len(y_on_staff) - 1)):
-            if y_on_staff[i + 1].line.space == y_on_staff[i].line.space:
-                y_on_staff[i].pos = y_on_staff[i + 1].pos + 2
-            else:
-                y_on_staff[i].pos = y_on_staff[i + 1].pos + 1
-
-        pre_line_idx = -1
-        l = [i for i, l in enumerate(y_on_staff) if l.y > p.y]
-        if len(l) > 0:
-            pre_line_idx = l[0]
-
-        if pre_line_idx == -1:
-            # bot
-            last = y_on_staff[-1]
-            prev = y_on_staff[-2]
-        elif pre_line_idx == 0:
-            last = y_on_staff[pre_line_idx + 1]
-            prev = y_on_staff[pre_line_idx]
-        else:
-            last = y_on_staff[pre_line_idx]
-            prev = y_on_staff[pre_line_idx - 1]
+        y_on_staff = np.stack([np.interp(xs, sl.coords.points[:, 0], sl.coords.points[:, 1]) for sl in cache.lines])
+
+        # the first line below the point, the bottom line if there is none, the second line if it is the first line
+        below = y_on_staff > ys
+        last_idx = np.where(below.any(axis=0), np.argmax(below, axis=0), len(cache.lines) - 1)
+        last_idx = np.maximum(last_idx, 1)
+        prev_idx = last_idx - 1
 
-        return StaffLines._interp_staff_pos(p.y, prev.y, last.y, prev.line.space, last.line.space, prev.pos, last.pos, offset)
+        cols = np.arange(len(xs))
+        return StaffLines._interp_staff_pos(ys, y_on_staff[prev_idx, cols], y_on_staff[last_idx, cols],
+                                            cache.spaces[prev_idx], cache.spaces[last_idx],
+                                            cache.positions[prev_idx], cache.positions[last_idx], offset)
+
+    def positions_in_staff(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        return self.staff_positions(xs, ys)[1]
+
+    def _staff_pos(self, p: Point, offset: int = 0) -> Tuple[float, MusicSymbolPositionInStaff]:
+        y, pos = self.staff_positions(np.array([p.x]), np.array([p.y]), offset)
+        return y[0], MusicSymbolPositionInStaff(pos[0])
 
     def position_in_staff(self, p: Point) -> MusicSymbolPositionInStaff:
         return self._staff_pos(p)[1]
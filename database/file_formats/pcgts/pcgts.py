@@ -2,7 +2,6 @@ from database.file_formats.pcgts.meta import Meta, MEIheadMeta
 from database.file_formats.pcgts.page import Page
 from typing import Optional, TYPE_CHECKING
 import logging
-from PIL import Image
 
 if TYPE_CHECKING:
     from database import DatabaseFile, DatabasePage
@@ -29,6 +28,11 @@ class PcGts:
 
     @staticmethod
     def from_file(file: 'DatabaseFile'):
+        from database.file_formats.filecache import pcgts_cache
+        return pcgts_cache.get(file.local_path(), lambda: PcGts._from_file(file), shared=(file.page,))
+
+    @staticmethod
+    def _from_file(file: 'DatabaseFile'):
         from database import DatabaseFile
         filename = file.local_path()
         try:
@@ -49,10 +53,18 @@ class PcGts:
     def to_file(self, filename):
         if filename.endswith(".json"):
             import json
+            from database.file_formats.filecache import pcgts_cache
             # first dump to keep file if an error occurs
             s = json.dumps(self.to_json(), indent=2)
+            pcgts_cache.invalidate(filename)
             with open(filename, 'w') as f:
                 f.write(s)
+
+            if self.page.location is not None:
+                from omr.dewarping.dewarp_cache import dewarp_cache
+                from omr.dataset.dataset_cache import dataset_cache
+                dewarp_cache.invalidate(self.page)
+                dataset_cache.invalidate(self.page)
         else:
             raise Exception("Invalid file extension of file '{}'".format(filename))
 
@@ -69,8 +81,7 @@ class PcGts:
             json.get('version', None),
         )
         if location:
-            image_shape = Image.open(location.file('color_original', True).local_path()).size
-            pcgts.page.image_width, pcgts.page.image_height = image_shape
+            pcgts.page.image_width, pcgts.page.image_height = location.image_size('color_original')
         return pcgts
 
     def to_json(self):
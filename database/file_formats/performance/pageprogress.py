@@ -30,6 +30,11 @@ class PageProgress(DataClassJSONMixin):
 
     @staticmethod
     def from_json_file(file: str):
+        from database.file_formats.filecache import page_progress_cache
+        return page_progress_cache.get(file, lambda: PageProgress._from_json_file(file))
+
+    @staticmethod
+    def _from_json_file(file: str):
         with open(file) as f:
             try:
                pp = PageProgress.from_json(f.read())
@@ -44,6 +49,8 @@ class PageProgress(DataClassJSONMixin):
     def to_json_file(self, filename: str):
         self.consistency_check()
         s = json.dumps(self.to_dict(), indent=2)
+        from database.file_formats.filecache import page_progress_cache
+        page_progress_cache.invalidate(filename)
         with open(filename, 'w') as f:
             f.write(s)
 
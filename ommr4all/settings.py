@@ -235,6 +235,59 @@ LOGGING = {
 }
 
 
+# CACHES
+
+class FileCacheSettings(NamedTuple):
+    max_pcgts_mb: int
+    max_page_meta_mb: int
+
+
+FILE_CACHE_SETTINGS = FileCacheSettings(
+    32,     # Size (MB, on disk) of the parsed PcGts files kept in memory by each process, set to <= 0 to disable
+    4,      # Size (MB, on disk) of the parsed page progress and page meta files kept in memory, <= 0 to disable
+)
+
+
+class DewarpCacheSettings(NamedTuple):
+    max_dewarpers: int
+    max_entries_per_page: int
+
+
+DEWARP_CACHE_SETTINGS = DewarpCacheSettings(
+    100,    # Number of dewarpers (meshes) kept in memory by each process, set to <= 0 to disable
+    4,      # Number of dewarped images stored in the directory of each page, set to <= 0 to disable
+)
+
+
+class DatasetCacheSettings(NamedTuple):
+    max_entries_per_page: int
+
+
+DATASET_CACHE_SETTINGS = DatasetCacheSettings(
+    4,      # Number of extracted line datasets (e.g. of different dataset params) stored in the directory of each page, <= 0 to disable
+)
+
+
+class DatasetLoadingSettings(NamedTuple):
+    processes: int
+
+
+DATASET_LOADING_SETTINGS = DatasetLoadingSettings(
+    4,      # Number of processes that load the pages of a dataset in parallel, <= 1 to load all pages in the calling process
+)
+
+
+class PreprocessingSettings(NamedTuple):
+    approximate_skew_estimation: bool
+    reuse_whitelevel: bool
+
+
+PREPROCESSING_SETTINGS = PreprocessingSettings(
+    False,  # Estimate the skew of pages faster on an approximate binarization, the angles may differ slightly
+    False,  # Binarize deskewed pages with the whitelevel of the downscaled page, the binary images differ slightly
+)
+
+
 # RESOURCES
 
 class GPUSettings(NamedTuple):
@@ -251,3 +304,40 @@ class TaskOperationWatcherSettings(NamedTuple):
 TASK_OPERATION_WATCHER_SETTINGS = TaskOperationWatcherSettings(
     -1,  # Default off, set to time > 0 to enable
 )
+
+
+class TaskQueueSettings(NamedTuple):
+    aging_interval: float
+    pages_per_shard: int
+
+
+TASK_QUEUE_SETTINGS = TaskQueueSettings(
+    300,    # Raise the priority of a queued task by one level each time it waited this long (s), <= 0 to disable
+    10,     # Split book predictions into subtasks of this many pages that run in parallel, <= 0 to disable
+)
+
+
+class TaskWorkerPoolSettings(NamedTuple):
+    max_tasks_per_worker: int
+    max_memory_mb: int
+    max_cached_predictors: int
+
+
+TASK_WORKER_POOL_SETTINGS = TaskWorkerPoolSettings(
+    50,     # Restart a worker process after it ran this many tasks, set to <= 0 to disable
+    8000,   # Restart a worker process if its peak memory usage (MB) exceeds this value, set to <= 0 to disable
+    4,      # Number of predictors (loaded models) kept warm in each worker process, set to <= 0 to disable
+)
+
+
+class PredictionSettings(NamedTuple):
+    max_lines_per_batch: int
+    max_fcn_batch_size: int
+    fcn_bucket_width: int
+
+
+PREDICTION_SETTINGS = PredictionSettings(
+    32,     # Number of lines (of consecutive pages) that are loaded and predicted at once, <= 0 to load all pages first
+    16,     # Number of line images that are passed through a pixel classifier at once, <= 0 for no limit
+    128,    # Line images are padded to a multiple of this width (px) to be batched with images of a similar width
+)
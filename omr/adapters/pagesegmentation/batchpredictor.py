@@ -0,0 +1,98 @@
+from typing import List, Tuple, Optional, Generator
+from ocr4all_pixel_classifier.lib.dataset import Dataset, SingleData
+from ocr4all_pixel_classifier.lib.predictor import Predictor, Prediction
+import numpy as np
+
+
+def round_up(value: int, multiple: int) -> int:
+    return -(-value // multiple) * multiple
+
+
+def bucket_batches(shapes: List[Tuple[int, int]], max_batch_size: int, bucket_width: int,
+                   pad_power_of_2: Optional[int] = None) -> List[Tuple[Tuple[int, int], List[int]]]:
+    """
+    Group images (given by their shapes (h, w)) into batches of images of similar size.
+
+    The height of an image is padded to a multiple of 2 ** pad_power_of_2 (if given), the width additionally to a
+    multiple of bucket_width. All images with the same padded shape form a bucket, that is split into batches of at
+    most max_batch_size (<= 0 for no limit) images. Returns the padded shape and the indices of the images of each
+    batch, the buckets are ordered by their first image.
+    """
+    step = 2 ** pad_power_of_2 if pad_power_of_2 else 1
+    bucket_width = max(step, round_up(bucket_width, step))
+    buckets = {}
+    for i, (h, w) in enumerate(shapes):
+        buckets.setdefault((round_up(h, step), round_up(w, bucket_width)), []).append(i)
+
+    if max_batch_size <= 0:
+        return list(buckets.items())
+
+    return [(shape, indices[i:i + max_batch_size]) for shape, indices in buckets.items()
+            for i in range(0, len(indices), max_batch_size)]
+
+
+def pad_to_shape(image: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+    # pad at the bottom right, thus positions do not change (see ImagePadToPowerOf2)
+    pad = ((0, shape[0] - image.shape[0]), (0, shape[1] - image.shape[1])) + ((0, 0), ) * (image.ndim - 2)
+    if not any(p for _, p in pad):
+        return image
+
+    return np.pad(image, pad, 'edge')
+
+
+class BatchPredictor:
+    """
+    Runs the network of a pixel classifier Predictor on batches of images instead of one image at a time.
+
+    Images are bucketed by their padded size (see bucket_batches), padded to the shape of their bucket and predicted
+    at once. The probabilities are cropped to the original size of each image, so the predictions are yielded in the
+    order of the dataset as if they were predicted by Predictor.predict.
+    """
+    def __init__(self, predictor: Predictor, max_batch_size: int, bucket_width: int,
+                 pad_power_of_2: Optional[int] = None):
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.bucket_width = bucket_width
+        self.pad_power_of_2 = pad_power_of_2
+
+    def predict(self, dataset: Dataset) -> Generator[Prediction, None, None]:
+        data = dataset.data
+        predictions: List[Optional[Prediction]] = [None] * len(data)
+        for shape, indices in bucket_batches([d.image.shape[:2] for d in data], self.max_batch_size,
+                                             self.bucket_width, self.pad_power_of_2):
+            for i, prediction in zip(indices, self.predict_batch([data[i] for i in indices], shape)):
+                predictions[i] = prediction
+
+        yield from predictions
+
+    def predict_batch(self, data: List[SingleData], shape: Tuple[int, int]) -> List[Prediction]:
+        from scipy.special import softmax
+        from ocr4all_pixel_classifier.lib.model import Architecture
+        from ocr4all_pixel_classifier.lib.output import scale_to_original_shape
+        from ocr4all_pixel_classifier.lib.util import gray_to_rgb
+        network = self.predictor.network
+        settings = self.predictor.settings
+        architecture = network.architecture if network.model.name == 'model' else network.model.name
+        preprocess, rgb = Architecture(architecture).preprocess()
+
+        images = np.stack([pad_to_shape(gray_to_rgb(d.image) if rgb else d.image, shape) for d in data])
+        if images.ndim == 3:
+            images = np.expand_dims(images, axis=-1)
+        binaries = np.expand_dims(np.stack([pad_to_shape(d.binary, shape) for d in data]), axis=-1)
+        logits = np.asarray(network.model.predict_on_batch([preprocess(images), binaries]))
+
+        predictions = []
+        for d, logit in zip(data, logits):
+            logit = logit[:d.image.shape[0], :d.image.shape[1]]
+            prob = softmax(logit, -1)
+            pred = np.argmax(logit, -1)
+            if settings.high_res_output:
+                d, pred = scale_to_original_shape(d, pred)
+
+            if settings.post_process:
+                for processor in settings.post_process:
+                    pred = processor(pred, d)
+
+            predictions.append(Prediction(pred, prob, d))
+
+        return predictions
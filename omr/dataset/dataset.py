@@ -10,12 +10,18 @@ import logging
 
 from omr.dataset.datastructs import CalamariCodec
 from omr.imageoperations import ImageOperationList, ImageOperationData
+from omr.dataset.dataset_cache import dataset_cache, encode_lines, decode_lines
 from omr.dewarping.dummy_dewarper import NoStaffLinesAvailable, NoStaffsAvailable
 from dataclasses import dataclass, field
 from mashumaro import DataClassJSONMixin
 from enum import Enum
+from ommr4all.settings import DATASET_LOADING_SETTINGS
+import ommr4all.settings as settings
 
+from collections import deque
 import json
+import multiprocessing
+import pickle
 
 
 logger = logging.getLogger(__name__)
@@ -143,12 +149,20 @@ class Dataset(ABC):
         self.params = params
         self.files = pcgts
         self.loaded: Optional[List[Tuple[Line, np.ndarray]]] = None
+        # store the loaded lines in the dataset cache, enabled for the datasets of trainers (see AlgorithmTrainer)
+        self.use_cache = False
         self.image_ops = self.__class__.create_image_operation_list(self.params)
 
     def local_to_global_pos(self, p: Point, params: List[Any]) -> Point:
         return self.image_ops.local_to_global_pos(p, params)
 
-    def to_page_segmentation_dataset(self, callback: Optional[DatasetCallback] = None):
+    def local_to_global_points(self, points: np.ndarray, params: List[Any]) -> np.ndarray:
+        return self.image_ops.local_to_global_points(points, params)
+
+    def to_page_segmentation_dataset(self, callback: Optional[DatasetCallback] = None,
+                                     lines: Optional[List[RegionLineMaskData]] = None):
+        # lines: use the given lines instead of all lines of the dataset
+        lines = self.load(callback) if lines is None else lines
         if self.params.origin_staff_line_distance == self.params.target_staff_line_distance:
             from ocr4all_pixel_classifier.lib.dataset import Dataset, SingleData
             return Dataset([SingleData(image=d.line_image if self.params.image_input == ImageInput.LINE_IMAGE else d.region,
@@ -156,16 +170,17 @@ class Dataset(ABC):
                                        mask=d.mask,
                                        line_height_px=self.params.origin_staff_line_distance if self.params.origin_staff_line_distance is not None else d.operation.page.avg_staff_line_distance(),
                                        original_shape=d.line_image.shape,
-                                       user_data=d) for d in self.load(callback)], {})
+                                       user_data=d) for d in lines], {})
         else:
             raise NotImplementedError()
 
     def to_line_detection_dataset(self, callback: Optional[DatasetCallback] = None) -> List[RegionLineMaskData]:
         return self.load(callback)
 
-    def to_calamari_dataset(self, train=False, callback: Optional[DatasetCallback] = None):
+    def to_calamari_dataset(self, train=False, callback: Optional[DatasetCallback] = None,
+                            lines: Optional[List[RegionLineMaskData]] = None):
         from calamari_ocr.ocr.datasets.dataset import RawDataSet, DataSetMode
-        marked_symbols = self.load(callback)
+        marked_symbols = self.load(callback) if lines is None else lines
 
         def get_input_image(d: RegionLineMaskData):
             if self.params.cut_region:
@@ -184,9 +199,10 @@ class Dataset(ABC):
             gts = [d.calamari_sequence(self.params.calamari_codec).calamari_str for d in marked_symbols]
         return RawDataSet(DataSetMode.TRAIN if train else DataSetMode.PREDICT, images=images, texts=gts)
 
-    def to_text_line_calamari_dataset(self, train=False, callback: Optional[DatasetCallback] = None):
+    def to_text_line_calamari_dataset(self, train=False, callback: Optional[DatasetCallback] = None,
+                                      lines: Optional[List[RegionLineMaskData]] = None):
         from calamari_ocr.ocr.datasets.dataset import RawDataSet, DataSetMode
-        lines = self.load(callback)
+        lines = self.load(callback) if lines is None else lines
 
         def get_input_image(d: RegionLineMaskData):
             if self.params.cut_region:
@@ -211,19 +227,111 @@ class Dataset(ABC):
 
         return self.loaded
 
+    def load_pages(self, callback: Optional[DatasetCallback] = None) -> Generator[Tuple[PcGts, List[RegionLineMaskData]], None, None]:
+        # lines of each page, in the order of the files
+        # if the dataset is not loaded, yet, the pages are loaded one after another and are not stored in the dataset
+        if self.loaded is None:
+            yield from self._load_pages(callback)
+            return
+
+        lines_of_page = {id(f): [] for f in self.files}
+        for d in self.loaded:
+            lines_of_page[id(d.operation.pcgts)].append(d)
+
+        for f in self.files:
+            yield f, lines_of_page[id(f)]
+
     def _load(self, callback: Optional[DatasetCallback]) -> Generator[RegionLineMaskData, None, None]:
+        for f, lines in self._load_pages(callback):
+            yield from lines
+
+    def _load_pages(self, callback: Optional[DatasetCallback]) -> Generator[Tuple[PcGts, List[RegionLineMaskData]], None, None]:
         def wrapper(g):
             if callback:
                 return callback.apply(g, total=len(self.files))
             return g
 
-        for f in tqdm(wrapper(self.files), total=len(self.files), desc="Loading Dataset"):
-            try:
-                input = ImageOperationData([], self.params.page_scale_reference, page=f.page, pcgts=f)
-                for outputs in self.image_ops.apply_single(input):
-                    yield RegionLineMaskData(outputs)
-            except (NoStaffsAvailable, NoStaffLinesAvailable):
-                pass
-            except Exception as e:
-                logger.exception("Exception during processing of page: {}".format(f.page.location.local_path()))
-                raise e
+        processes = min(DATASET_LOADING_SETTINGS.processes, len(self.files))
+        if processes <= 1 or multiprocessing.current_process().daemon or self.params.apply_fcn_model is not None:
+            # daemonic processes (e.g. of a pool) may not create child processes, FCNs are applied in this process
+            for f in tqdm(wrapper(self.files), total=len(self.files), desc="Loading Dataset"):
+                yield f, self._load_page(f)
+            return
+
+        # the pages are sent as json and the lines are returned without the references to the page, that are
+        # restored for the PcGts of this dataset. Pages that can not be sent or restored are loaded in this process.
+        # At most window pages are submitted ahead of the consumer, so that only the lines of those pages are kept in
+        # memory. Workers are not forked, the calling process may hold loaded models (e.g. of a task worker).
+        window = 2 * processes
+        context = _worker_context()
+        with context.Pool(processes=processes, initializer=_init_worker, initargs=(settings.PRIVATE_MEDIA_ROOT, )) as pool:
+            def results():
+                pending = deque()
+                for f in self.files:
+                    args = (self.__class__, self.params, self.use_cache, f.to_json(), f.page.location) if f.page.location else None
+                    pending.append((f, pool.apply_async(_load_encoded_page, (args, ))))
+                    if len(pending) >= window:
+                        page, result = pending.popleft()
+                        yield page, result.get()
+
+                while len(pending) > 0:
+                    page, result = pending.popleft()
+                    yield page, result.get()
+
+            for f, encoded in tqdm(wrapper(results()), total=len(self.files), desc="Loading Dataset"):
+                out = None
+                if encoded is not None:
+                    arrays, lines = pickle.loads(encoded)
+                    out = decode_lines(arrays, lines, ImageOperationData([], self.params.page_scale_reference, page=f.page, pcgts=f))
+
+                yield f, [RegionLineMaskData(o) for o in out] if out is not None else self._load_page(f)
+
+    def _load_page(self, f: PcGts) -> List[RegionLineMaskData]:
+        try:
+            input = ImageOperationData([], self.params.page_scale_reference, page=f.page, pcgts=f)
+            return [RegionLineMaskData(outputs) for outputs in dataset_cache.apply(self, input)]
+        except (NoStaffsAvailable, NoStaffLinesAvailable):
+            return []
+        except Exception as e:
+            logger.exception("Exception during processing of page: {}".format(f.page.location.local_path()))
+            raise e
+
+
+_worker_datasets = {}
+
+
+def _worker_context():
+    # processes that load pages are started from a fresh process (forkserver, if available) instead of a fork
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+
+    context = multiprocessing.get_context('forkserver')
+    # the server imports this module once (on its start), the workers are forked from it
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def _init_worker(private_media_root: str):
+    # the storage of the calling process (it may be changed at runtime, e.g. by tests)
+    settings.PRIVATE_MEDIA_ROOT = private_media_root
+
+
+def _load_encoded_page(args: Optional[Tuple[type, DatasetParams, bool, dict, Any]]) -> Optional[bytes]:
+    # load the lines of a page in a worker process, see Dataset._load_pages
+    if args is None:
+        return None
+
+    dataset_class, params, use_cache, pcgts_json, location = args
+    key = (dataset_class, params.to_json(), use_cache)
+    if key not in _worker_datasets:
+        _worker_datasets.clear()
+        _worker_datasets[key] = dataset_class([], params)
+        _worker_datasets[key].use_cache = use_cache
+
+    pcgts = PcGts.from_json(pcgts_json, location)
+    try:
+        return pickle.dumps(encode_lines([d.operation for d in _worker_datasets[key]._load_page(pcgts)]),
+                            protocol=pickle.HIGHEST_PROTOCOL)
+    except (ValueError, pickle.PicklingError, TypeError, AttributeError) as e:
+        logger.debug("Lines of page {} can not be sent: {}".format(location.local_path(), e))
+        return None
@@ -0,0 +1,284 @@
+from typing import List, Optional, Tuple, Any, Dict, TYPE_CHECKING
+import hashlib
+import io
+import json
+import os
+import pickle
+import threading
+import logging
+
+import numpy as np
+
+from omr.imageoperations import ImageOperationData, ImageData
+from ommr4all.settings import DATASET_CACHE_SETTINGS
+
+if TYPE_CHECKING:
+    from database.file_formats.pcgts import Page
+    from omr.dataset.dataset import Dataset
+
+logger = logging.getLogger(__name__)
+
+OperationOutput = List[ImageOperationData]
+
+
+class _EntryUnpickler(pickle.Unpickler):
+    # entries are stored in the page directories, that can be populated by importing a book, thus only the classes
+    # of the params of the image operations (and numpy arrays) may be loaded, but no arbitrary callables
+    ALLOWED_MODULES = ('database.file_formats.pcgts.', 'omr.dewarping.', 'omr.imageoperations.')
+    ALLOWED_NUMPY = {('numpy', 'dtype'), ('numpy', 'ndarray'),
+                     ('numpy.core.multiarray', '_reconstruct'), ('numpy.core.multiarray', 'scalar')}
+
+    def find_class(self, module, name):
+        if (module, name) in _EntryUnpickler.ALLOWED_NUMPY:
+            return super().find_class(module, name)
+
+        if module.startswith(_EntryUnpickler.ALLOWED_MODULES):
+            cls = super().find_class(module, name)
+            if isinstance(cls, type) and cls.__module__ == module:
+                return cls
+
+        raise pickle.UnpicklingError("Global {}.{} is not allowed in a dataset cache entry".format(module, name))
+
+
+def _loads_entry(data: bytes):
+    return _EntryUnpickler(io.BytesIO(data)).load()
+
+
+def page_digest(page: 'Page') -> str:
+    # hash of the content (blocks, annotations, ...) of a page
+    return hashlib.sha1(json.dumps(page.to_json(), sort_keys=True).encode()).hexdigest()
+
+
+def _element_id(page: 'Page', element) -> Optional[str]:
+    # id of a block or line of the page, that is used to find the element in the page on decoding
+    if element is None:
+        return None
+
+    if page.block_by_id(element.id) is not element and page.line_by_id(element.id) is not element:
+        raise ValueError("Element {} can not be identified by its id".format(element.id))
+
+    return element.id
+
+
+def encode_lines(out: OperationOutput) -> Tuple[List[np.ndarray], List[Dict[str, Any]]]:
+    """
+    Split the output of the image operations of a page into its arrays and the remaining data (params and the ids of
+    the referenced blocks and lines of the page), see decode_lines.
+    Raises a ValueError if a referenced element can not be identified by its id.
+    """
+    arrays: List[np.ndarray] = []
+    array_indices: Dict[int, int] = {}
+
+    def array_index(a: Optional[np.ndarray]) -> Optional[int]:
+        # arrays that are shared by multiple lines (e.g. the page image) are stored only once
+        if a is None:
+            return None
+        if id(a) not in array_indices:
+            array_indices[id(a)] = len(arrays)
+            arrays.append(a)
+        return array_indices[id(a)]
+
+    lines = []
+    for d in out:
+        page = d.page
+        lines.append({
+            'images': [(array_index(i.image), i.nearest_neighbour_rescale) for i in d.images],
+            'params': d.params,
+            'scale_reference': d.scale_reference,
+            'page_image': array_index(d.page_image),
+            'music_region': _element_id(page, d.music_region),
+            'music_line': _element_id(page, d.music_line),
+            'music_lines': None if d.music_lines is None else [_element_id(page, l) for l in d.music_lines],
+            'text_line': _element_id(page, d.text_line),
+        })
+
+    return arrays, lines
+
+
+def decode_lines(arrays: List[np.ndarray], lines: List[Dict[str, Any]], data: ImageOperationData) -> Optional[OperationOutput]:
+    # output of the image operations that references the pcgts and page of data, None if the page does not match
+    page = data.page
+
+    def element(id: Optional[str]):
+        if id is None:
+            return None
+        e = page.block_by_id(id) or page.line_by_id(id)
+        if e is None:
+            raise KeyError(id)
+        return e
+
+    out = []
+    for line in lines:
+        try:
+            out.append(ImageOperationData(
+                images=[ImageData(arrays[i], nn) for i, nn in line['images']],
+                scale_reference=line['scale_reference'],
+                params=line['params'],
+                pcgts=data.pcgts,
+                page=page,
+                page_image=None if line['page_image'] is None else arrays[line['page_image']],
+                music_region=element(line['music_region']),
+                music_line=element(line['music_line']),
+                music_lines=None if line['music_lines'] is None else [element(l) for l in line['music_lines']],
+                text_line=element(line['text_line']),
+            ))
+        except KeyError:
+            return None
+
+    return out
+
+
+class DatasetCache:
+    """
+    Cache of the lines that the image operations of a dataset extract from a page (line image, region, mask and
+    the parameters of the operations).
+
+    Entries are stored in the directory of the page and are keyed by the content of the page, the class and the
+    DatasetParams of the dataset and the (derived) image files of the page, so that e.g. repeated trainings and the
+    folds of experiments skip loading, dewarping, cropping and rescaling the lines.
+    All arrays of an entry are stored in a single .npy file that is memory mapped (copy on write) when loaded.
+    The parameters of the operations and references to the blocks and lines of the page are pickled, only the classes
+    of the parameters may be loaded from the pickle (see _EntryUnpickler).
+    Only the datasets of trainers use the cache (see Dataset.use_cache).
+    Stored entries are removed when the page changes (see invalidate, called when a PcGts is written), and only the
+    most recent entries of a page are kept.
+    """
+    DIRECTORY = 'dataset_cache'
+    VERSION = 2
+
+    def __init__(self, max_entries_per_page: int):
+        self.max_entries_per_page = max_entries_per_page
+
+    @staticmethod
+    def _directory(page: 'Page') -> Optional[str]:
+        if page is None or page.location is None:
+            return None
+
+        return os.path.join(page.location.local_path(), DatasetCache.DIRECTORY)
+
+    @staticmethod
+    def _dataset_digest(dataset: 'Dataset', page: 'Page') -> str:
+        # the lines also depend on the (derived) images of the page that the operations read (not their previews),
+        # that are identified by their size and mtime
+        from database.database_file import file_definitions
+        directory = page.location.local_path()
+        files = []
+        for f in sorted(d.output[d.default] for d in file_definitions.values()):
+            path = os.path.join(directory, f)
+            if not f.endswith('.json') and os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((f, stat.st_size, stat.st_mtime_ns))
+
+        key = (DatasetCache.VERSION, dataset.__class__.__module__, dataset.__class__.__qualname__,
+               dataset.params.to_json(), files)
+        return hashlib.sha1(repr(key).encode()).hexdigest()
+
+    def apply(self, dataset: 'Dataset', data: ImageOperationData) -> OperationOutput:
+        # apply the image operations of the dataset on the page of data or load the stored lines
+        directory = DatasetCache._directory(data.page)
+        if directory is None or not dataset.use_cache or self.max_entries_per_page <= 0 \
+                or dataset.params.apply_fcn_model is not None:
+            # the output of an applied FCN depends on the content of the model, that is not part of the key
+            return dataset.image_ops.apply_single(data)
+
+        path = os.path.join(directory, '{}_{}'.format(page_digest(data.page), DatasetCache._dataset_digest(dataset, data.page)))
+        try:
+            out = self._read(path, data)
+            if out is not None:
+                os.utime(path + '.pkl')
+                return out
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Could not read dataset cache file {}: {}".format(path, e))
+
+        out = dataset.image_ops.apply_single(data)
+        try:
+            self._write(path, out)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.warning("Could not write dataset cache file {}: {}".format(path, e))
+
+        return out
+
+    def _write(self, path: str, out: OperationOutput):
+        try:
+            arrays, lines = encode_lines(out)
+        except ValueError as e:
+            logger.debug("Not caching lines of page {}: {}".format(path, e))
+            return
+
+        # align the arrays in the file, so that the memory mapped arrays are aligned
+        offsets, total = [], 0
+        for a in arrays:
+            offsets.append(total)
+            total += -(-a.nbytes // 64) * 64
+
+        # pickle first, the params of the operations may not be picklable or may not be loaded again
+        meta = pickle.dumps({'arrays': [(o, a.dtype.str, a.shape) for a, o in zip(arrays, offsets)], 'lines': lines},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            _loads_entry(meta)
+        except pickle.UnpicklingError as e:
+            logger.debug("Not caching lines of page {}: {}".format(path, e))
+            return
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # write to temporary files first so that readers never see partially written files, the .pkl is written last
+        tmp = '.{}.{}.tmp'.format(os.getpid(), threading.get_ident())
+        buffer = np.lib.format.open_memmap(path + '.npy' + tmp, mode='w+', dtype=np.uint8, shape=(max(1, total), ))
+        for a, offset in zip(arrays, offsets):
+            buffer[offset:offset + a.nbytes] = np.ascontiguousarray(a).reshape(-1).view(np.uint8)
+        buffer.flush()
+        del buffer
+        os.replace(path + '.npy' + tmp, path + '.npy')
+
+        with open(path + '.pkl' + tmp, 'wb') as f:
+            f.write(meta)
+        os.replace(path + '.pkl' + tmp, path + '.pkl')
+        self._remove_old_entries(directory)
+
+    def _read(self, path: str, data: ImageOperationData) -> Optional[OperationOutput]:
+        with open(path + '.pkl', 'rb') as f:
+            entry = _loads_entry(f.read())
+
+        # copy on write, operations of the datasets may modify the images in place
+        buffer = np.load(path + '.npy', mmap_mode='c')
+        arrays = []
+        for offset, dtype, shape in entry['arrays']:
+            dtype = np.dtype(dtype)
+            n_bytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+            arrays.append(buffer[offset:offset + n_bytes].view(dtype).reshape(shape))
+
+        return decode_lines(arrays, entry['lines'], data)
+
+    def _remove_old_entries(self, directory: str):
+        entries = [os.path.join(directory, f[:-len('.pkl')]) for f in os.listdir(directory) if f.endswith('.pkl')]
+        entries.sort(key=lambda f: os.stat(f + '.pkl').st_mtime_ns, reverse=True)
+        for entry in entries[self.max_entries_per_page:]:
+            self._remove_entry(entry)
+
+    @staticmethod
+    def _remove_entry(path: str):
+        for ext in ['.pkl', '.npy']:
+            try:
+                os.remove(path + ext)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, page: 'Page'):
+        # remove all stored entries that were not created with the current content of the page
+        directory = DatasetCache._directory(page)
+        if directory is None or not os.path.isdir(directory):
+            return
+
+        digest = page_digest(page)
+        for f in os.listdir(directory):
+            if not f.startswith(digest):
+                try:
+                    os.remove(os.path.join(directory, f))
+                except FileNotFoundError:
+                    pass
+
+
+dataset_cache = DatasetCache(DATASET_CACHE_SETTINGS.max_entries_per_page)
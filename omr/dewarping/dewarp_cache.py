@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from typing import List, Optional, Tuple, TYPE_CHECKING
+import hashlib
+import os
+import threading
+import logging
+
+import numpy as np
+from PIL import Image
+
+from database.file_formats.pcgts import Coords, PageScaleReference
+from omr.dewarping.dummy_dewarper import Dewarper
+from ommr4all.settings import DEWARP_CACHE_SETTINGS
+
+if TYPE_CHECKING:
+    from database.file_formats.pcgts import Page
+
+logger = logging.getLogger(__name__)
+
+
+def staff_lines_digest(page: 'Page') -> str:
+    # hash of the staff line coordinates (page scale) of all music lines
+    h = hashlib.sha1()
+    for ml in page.all_music_lines():
+        h.update(b'l')
+        for sl in ml.staff_lines.sorted():
+            h.update(np.ascontiguousarray(sl.coords.points, dtype=np.float64).tobytes())
+            h.update(b's')
+
+    return h.hexdigest()
+
+
+class DewarpCache:
+    """
+    Cache of the dewarpers (grid, transform and mesh) and of the dewarped images of pages.
+
+    Dewarpers are kept in memory, keyed by the staff lines of the page, the scale reference and the image size.
+    Dewarped images are stored in the directory of the page, keyed additionally by the content of the input images,
+    so that e.g. datasets of subsequent trainings or predictions skip warping the images.
+    Stored entries are removed when the staff lines of the page change (see invalidate, called when a PcGts is
+    written), and only the most recent entries of a page are kept.
+    """
+    DIRECTORY = 'dewarp_cache'
+
+    def __init__(self, max_dewarpers: int, max_entries_per_page: int):
+        self.max_dewarpers = max_dewarpers
+        self.max_entries_per_page = max_entries_per_page
+        self.dewarpers: 'OrderedDict[Tuple, Dewarper]' = OrderedDict()
+        self.mutex = threading.Lock()
+
+    @staticmethod
+    def _directory(page: 'Page') -> Optional[str]:
+        if page is None or page.location is None:
+            return None
+
+        return os.path.join(page.location.local_path(), DewarpCache.DIRECTORY)
+
+    def _dewarper(self, key: Tuple, staves: List[List[Coords]]) -> Dewarper:
+        if self.max_dewarpers <= 0:
+            return Dewarper(key[2], staves)
+
+        with self.mutex:
+            dewarper = self.dewarpers.get(key)
+            if dewarper is not None:
+                self.dewarpers.move_to_end(key)
+                return dewarper
+
+        dewarper = Dewarper(key[2], staves)
+        with self.mutex:
+            self.dewarpers[key] = dewarper
+            while len(self.dewarpers) > self.max_dewarpers:
+                self.dewarpers.popitem(last=False)
+
+        return dewarper
+
+    def dewarp(self, page: 'Page', staves: List[List[Coords]], scale_reference: PageScaleReference,
+               images: List[Image.Image], resamples: List[int] = None) -> Tuple[Dewarper, List[np.ndarray]]:
+        # dewarp the images (all of the same size) of a page with the given staves (in the scale of the scale reference)
+        if page is None:
+            dewarper = Dewarper(images[0].size, staves)
+            return dewarper, list(map(np.array, dewarper.dewarp(images, resamples)))
+
+        key = (staff_lines_digest(page), scale_reference.value, tuple(images[0].size))
+        dewarper = self._dewarper(key, staves)
+        directory = DewarpCache._directory(page)
+        if directory is None or self.max_entries_per_page <= 0:
+            return dewarper, list(map(np.array, dewarper.dewarp(images, resamples)))
+
+        h = hashlib.sha1(repr((key[1:], resamples)).encode())
+        for image in images:
+            h.update(repr((image.mode, image.size)).encode())
+            h.update(image.tobytes())
+
+        path = os.path.join(directory, '{}_{}.npz'.format(key[0], h.hexdigest()))
+        try:
+            with np.load(path) as f:
+                out = [f['arr_{}'.format(i)] for i in range(len(images))]
+            os.utime(path)
+            return dewarper, out
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Could not read dewarp cache file {}: {}".format(path, e))
+
+        out = list(map(np.array, dewarper.dewarp(images, resamples)))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # write to a temporary file first so that readers never see a partially written file
+            tmp_path = path + '.{}.tmp'.format(threading.get_ident())
+            with open(tmp_path, 'wb') as f:
+                np.savez_compressed(f, *out)
+            os.replace(tmp_path, path)
+            self._remove_old_entries(directory)
+        except OSError as e:
+            logger.warning("Could not write dewarp cache file {}: {}".format(path, e))
+
+        return dewarper, out
+
+    def _remove_old_entries(self, directory: str):
+        entries = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.npz')]
+        entries.sort(key=lambda f: os.stat(f).st_mtime_ns, reverse=True)
+        for f in entries[self.max_entries_per_page:]:
+            try:
+                os.remove(f)
+            except FileNotFoundError:
+                pass
+
+    def invalidate(self, page: 'Page'):
+        # remove all stored entries that were not created with the current staff lines of the page
+        directory = DewarpCache._directory(page)
+        if directory is None or not os.path.isdir(directory):
+            return
+
+        digest = staff_lines_digest(page)
+        for f in os.listdir(directory):
+            if not f.startswith(digest):
+                try:
+                    os.remove(os.path.join(directory, f))
+                except FileNotFoundError:
+                    pass
+
+
+dewarp_cache = DewarpCache(DEWARP_CACHE_SETTINGS.max_dewarpers, DEWARP_CACHE_SETTINGS.max_entries_per_page)
@@ -57,53 +57,97 @@ def griddify(rect, w_div, h_div):
     return np.array(grid_vertex_matrix)
 
 
-def transform(point, staffs: List[List[Coords]]):
-    if len(staffs) == 0:
-        raise NoStaffsAvailable
-
-    x, y = point[0], point[1]
-    top_staff_line_d = 10000000
-    top_staff_line: Optional[Coords] = None
-    bot_staff_line_d = 10000000
-    bot_staff_line: Optional[Coords] = None
-    for staff in staffs:
-        for staff_line in staff:
-            o_y = staff_line.interpolate_y(x)
-            if o_y < y and y - o_y < top_staff_line_d:
-                top_staff_line = staff_line
-                top_staff_line_d = y - o_y
-
-            if o_y > y and o_y - y < bot_staff_line_d:
-                bot_staff_line = staff_line
-                bot_staff_line_d = o_y - y
-
-    if top_staff_line_d > 1000000:
-        top_staff_line_d = bot_staff_line_d
-        top_staff_line = bot_staff_line
-    elif bot_staff_line_d > 1000000:
-        bot_staff_line_d = top_staff_line_d
-        bot_staff_line = top_staff_line
-
-    if top_staff_line is None or bot_staff_line is None:
-        raise NoStaffLinesAvailable
+class StaffLineInterpolation:
+    """
+    Vectorized evaluation of the staff lines of all staves, see transform_points
+
+    The points of all staff lines are concatenated (shifted in x by a large offset per line) into one sorted array,
+    so that the interpolation of all staff lines at all x positions is a single searchsorted.
+    Results are equal to Coords.interpolate_y (np.interp) of each line.
+    """
+    def __init__(self, staffs: List[List[Coords]]):
+        if len(staffs) == 0:
+            raise NoStaffsAvailable
+
+        lines = [staff_line.points for staff in staffs for staff_line in staff if len(staff_line.points) > 0]
+        self.n_lines = len(lines)
+        if self.n_lines == 0:
+            return
+
+        self.center_y = np.array([np.mean(l[:, 1]) for l in lines])
+        self.x_min = np.array([l[0, 0] for l in lines], dtype=float)
+        self.x_max = np.array([l[-1, 0] for l in lines], dtype=float)
+        lengths = np.array([len(l) for l in lines])
+        self.start = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        self.end = self.start + lengths - 1
+
+        all_points = np.concatenate(lines).astype(float)
+        x_range = max(1.0, np.max(self.x_max) - np.min(self.x_min))
+        self.offset = np.arange(self.n_lines) * x_range * 4 - np.min(self.x_min)
+        self.xs = all_points[:, 0] + np.repeat(self.offset, lengths)
+        self.ys = all_points[:, 1]
+
+    def interpolate_y(self, x: np.ndarray) -> np.ndarray:
+        # y of all staff lines (rows) at all x (columns)
+        x = np.clip(np.asarray(x, dtype=float)[np.newaxis, :], self.x_min[:, np.newaxis], self.x_max[:, np.newaxis])
+        shifted = x + self.offset[:, np.newaxis]
+        idx = np.searchsorted(self.xs, shifted, side='right') - 1
+        idx = np.clip(idx, self.start[:, np.newaxis], np.maximum(self.start, self.end - 1)[:, np.newaxis])
+        nxt = np.minimum(idx + 1, self.end[:, np.newaxis])
+        dx = self.xs[nxt] - self.xs[idx]
+        t = np.divide(shifted - self.xs[idx], dx, out=np.zeros(shifted.shape), where=dx != 0)
+        return self.ys[idx] + np.clip(t, 0, 1) * (self.ys[nxt] - self.ys[idx])
+
+    def transform(self, points: np.ndarray) -> np.ndarray:
+        # transform all points (N x 2) with the closest staff line above and below each point
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if self.n_lines == 0:
+            raise NoStaffLinesAvailable
+
+        x, y = points[:, 0], points[:, 1]
+        line_y = self.interpolate_y(x)
+        top_d = np.where(line_y < y, y - line_y, np.inf)
+        bot_d = np.where(line_y > y, line_y - y, np.inf)
+        top = np.argmin(top_d, axis=0)
+        bot = np.argmin(bot_d, axis=0)
+        cols = np.arange(len(points))
+        has_top = np.isfinite(top_d[top, cols])
+        has_bot = np.isfinite(bot_d[bot, cols])
+        if not np.all(has_top | has_bot):
+            raise NoStaffLinesAvailable
+
+        # use the same line if there is none above or below
+        top = np.where(has_top, top, bot)
+        bot = np.where(has_bot, bot, top)
+
+        top_y, bot_y = line_y[top, cols], line_y[bot, cols]
+        top_offset = self.center_y[top] - top_y
+        bot_offset = self.center_y[bot] - bot_y
+        dy = bot_y - top_y
+        t = np.clip(np.divide(y - top_y, dy, out=np.zeros(len(points)), where=dy != 0), 0, 1)
+        interp_y = top_offset + t * (bot_offset - top_offset)
+
+        return np.stack([x, y - interp_y], axis=1)
+
+
+def transform_points(points, staffs: List[List[Coords]]) -> np.ndarray:
+    return StaffLineInterpolation(staffs).transform(points)
 
-    top_offset = top_staff_line.center_y() - top_staff_line.interpolate_y(x)
-    bot_offset = bot_staff_line.center_y() - bot_staff_line.interpolate_y(x)
 
-    interp_y = np.interp(y, [top_staff_line.interpolate_y(x), bot_staff_line.interpolate_y(x)], [top_offset, bot_offset])
-
-    #return x, np.rint(y - interp_y)
-    return x, y - interp_y
+def transform(point, staffs: List[List[Coords]]):
+    x, y = transform_points([point[:2]], staffs)[0]
+    return x, y
 
 
-def transform_grid(dst_grid, staves: List[List[Coords]], shape):
+def transform_grid(dst_grid, staves: List[List[Coords]], shape, staff_lines: StaffLineInterpolation = None):
     src_grid = dst_grid.copy()
+    inner = (shape[0] - 1 > src_grid[:, :, 0]) & (src_grid[:, :, 0] > 0) & \
+            (shape[1] - 1 > src_grid[:, :, 1]) & (src_grid[:, :, 1] > 0)
+    if np.any(inner):
+        if staff_lines is None:
+            staff_lines = StaffLineInterpolation(staves)
 
-    for idx in np.ndindex(src_grid.shape[:2]):
-        p = src_grid[idx]
-        if shape[0] - 1 > p[0] > 0 and shape[1] - 1 > p[1] > 0:
-            out = transform(p, staves)
-            src_grid[idx][1] = out[1]
+        src_grid[inner, 1] = staff_lines.transform(src_grid[inner])[:, 1]
 
     return src_grid
 
@@ -126,13 +170,53 @@ def grid_to_mesh(src_grid, dst_grid):
     return mesh
 
 
+def map_points_between_grids(ps, grid, target_grid) -> np.ndarray:
+    # map points from the cells of grid to the cells of target_grid (both of the same shape, the columns of grid must
+    # have constant and increasing x coordinates). The cell of a point is given by the first vertex (row-major) that
+    # is greater in x and y, points outside of the grid are not changed.
+    ps = np.asarray(ps, dtype=float).reshape(-1, 2)
+    px, py = ps[:, 0], ps[:, 1]
+    n_rows, n_cols = grid.shape[:2]
+    grid_y = grid[:, :, 1]
+
+    # first column with a greater x
+    col = np.searchsorted(grid[0, :, 0], px, side='right')
+
+    # first row with a greater y in any column right of col: search in the maximum of y for all subsequent columns,
+    # accumulated over the rows to make it sorted
+    max_y = np.maximum.accumulate(np.maximum.accumulate(grid_y[:, ::-1], axis=1)[:, ::-1], axis=0)
+    row = np.full(len(ps), n_rows)
+    for c in np.unique(col[col < n_cols]):
+        m = col == c
+        row[m] = np.searchsorted(max_y[:, c], py[m], side='right')
+
+    found = (col < n_cols) & (row < n_rows)
+    out = ps.copy()
+    if not np.any(found):
+        return out
+
+    # first column (not left of col) in the found row with a greater y
+    i, c, y = row[found], col[found], py[found]
+    j = np.argmax((grid_y[i] > y[:, np.newaxis]) & (np.arange(n_cols) >= c[:, np.newaxis]), axis=1)
+
+    cell_origin = grid[i - 1, j - 1]
+    rel = (ps[found] - cell_origin) / (grid[i, j] - cell_origin)
+
+    target_cell_origin = target_grid[i - 1, j - 1]
+    target_cell_extend = target_grid[i, j] - target_cell_origin
+
+    out[found] = target_cell_origin + rel * target_cell_extend
+    return out
+
+
 class Dewarper:
     def __init__(self, shape, staves: List[List[Coords]]):
         logger.info("Creating dewarper based on {} staves with shape {}".format(len(staves), shape))
         self.shape = shape
         self.dst_grid = griddify(shape_to_rect(self.shape), 10, 30)
         logger.debug("Transforming grid)")
-        self.src_grid = transform_grid(self.dst_grid, staves, self.shape)
+        self.staff_lines = StaffLineInterpolation(staves)
+        self.src_grid = transform_grid(self.dst_grid, staves, self.shape, self.staff_lines)
         logger.debug("Creating mesh")
         self.mesh = grid_to_mesh(self.src_grid, self.dst_grid)
 
@@ -146,40 +230,16 @@ class Dewarper:
         return out
 
     def inv_transform_point(self, p):
-        p = np.asarray(p)
-        for i, row in enumerate(self.dst_grid):
-            for j, cell in enumerate(row):
-                if (cell > p).all():
-                    cell_origin = self.dst_grid[i - 1, j - 1]
-                    rel = (p - cell_origin) / (cell - cell_origin)
-
-                    target_cell_origin = self.src_grid[i - 1, j - 1]
-                    target_cell_extend = self.src_grid[i, j] - target_cell_origin
-
-                    return target_cell_origin + rel * target_cell_extend
-
-        return p
+        return self.inv_transform_points([p])[0]
 
     def inv_transform_points(self, ps):
-        return np.array([self.inv_transform_point(p) for p in ps])
+        return map_points_between_grids(ps, self.dst_grid, self.src_grid)
 
     def transform_point(self, p):
-        p = np.asarray(p)
-        for i, row in enumerate(self.src_grid):
-            for j, cell in enumerate(row):
-                if (cell > p).all():
-                    cell_origin = self.src_grid[i - 1, j - 1]
-                    rel = (p - cell_origin) / (cell - cell_origin)
-
-                    target_cell_origin = self.dst_grid[i - 1, j - 1]
-                    target_cell_extend = self.dst_grid[i, j] - target_cell_origin
-
-                    return target_cell_origin + rel * target_cell_extend
-
-        return p
+        return self.transform_points([p])[0]
 
     def transform_points(self, ps):
-        return np.array([self.transform_point(p) for p in ps])
+        return map_points_between_grids(ps, self.src_grid, self.dst_grid)
 
 
 if __name__ == '__main__':
@@ -27,3 +27,6 @@ class ImageApplyFCN(ImageOperation):
 
     def local_to_global_pos(self, p, params):
         return p
+
+    def local_to_global_points(self, points, params):
+        return points
@@ -1,6 +1,7 @@
 from .image_operation import ImageOperation, ImageOperationData, OperationOutput, ImageData, Point
-from typing import Tuple, List, NamedTuple, Any
+from typing import Tuple, List, NamedTuple, Any, Optional
 import numpy as np
+from scipy.ndimage import find_objects
 
 
 class Rect(NamedTuple):
@@ -48,11 +49,32 @@ class ImageCropToSmallestBoxOperation(ImageOperation):
         data.params = r
         return [data]
 
+    def padded_rect(self, box: Tuple[slice, slice], shape: Tuple[int, int]) -> Rect:
+        # rect of a bounding box (rows, cols) with the padding applied, like the box of apply_single
+        m, n = shape
+        return Rect(max(0, box[0].start - self.pad[0]), min(m, box[0].stop + self.pad[2]),
+                    max(0, box[1].start - self.pad[3]), min(n, box[1].stop + self.pad[1]))
+
+    def apply_label(self, data: ImageOperationData, labels: np.ndarray, label: int, box: Tuple[slice, slice]) -> OperationOutput:
+        # same as apply_single with the mask (labels == label) prepended to the images, where box is the bounding box
+        # of the label (see label_bounding_boxes). Only the crop of the mask is computed, the images are cropped as views.
+        r = self.padded_rect(box, labels.shape)
+        data.images = [ImageData(labels[r.t:r.b, r.l:r.r] == label, True)] + \
+                      [ImageData(d.image[r.t:r.b, r.l:r.r], d.nearest_neighbour_rescale) for d in data]
+        data.params = r
+        return [data]
+
     def local_to_global_pos(self, p: Point, params: Any) -> Point:
         r: Rect = params
         return Point(p.x + r.l, p.y + p.t)
 
 
+def label_bounding_boxes(labels: np.ndarray, max_label: int) -> List[Optional[Tuple[slice, slice]]]:
+    # bounding boxes (rows, cols) of the labels 1 to max_label (at index label - 1) computed in a single pass over
+    # the label image, None if a label is not present
+    return find_objects(labels, max_label=max_label)
+
+
 def calculate_padding(image: np.ndarray, scaling_factor: int) -> Tuple[Tuple[int, int], Tuple[int, int]]:
     def scale(i: int, f: int) -> int:
         return (f - i % f) % f
@@ -89,3 +111,6 @@ class ImagePadToPowerOf2(ImageOperation):
 
     def local_to_global_pos(self, p: Point, params: Any) -> Point:
         return p  # added at bottom right, thus position does not change
+
+    def local_to_global_points(self, points: np.ndarray, params: Any) -> np.ndarray:
+        return points
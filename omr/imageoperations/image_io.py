@@ -28,3 +28,6 @@ class ImageLoadFromPageOperation(ImageOperation):
 
     def local_to_global_pos(self, p, params):
         return p
+
+    def local_to_global_points(self, points, params):
+        return points
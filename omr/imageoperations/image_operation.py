@@ -44,6 +44,10 @@ class ImageOperation(ABC):
     def local_to_global_pos(self, p: Point, params: Any) -> Point:
         return p
 
+    def local_to_global_points(self, points: np.ndarray, params: Any) -> np.ndarray:
+        # local_to_global_pos of multiple points (N x 2), override for a vectorized implementation
+        return np.array([self.local_to_global_pos(Point(*p), params).xy() for p in points], dtype=float).reshape(-1, 2)
+
 
 class ImageOperationList(ImageOperation):
     def __init__(self, operations: List[ImageOperation]):
@@ -70,5 +74,11 @@ class ImageOperationList(ImageOperation):
 
         return p
 
+    def local_to_global_points(self, points: np.ndarray, params: List[Any]) -> np.ndarray:
+        for op, param in zip(reversed(self.operations), reversed(params)):
+            points = op.local_to_global_points(points, param)
+
+        return points
+
 
 
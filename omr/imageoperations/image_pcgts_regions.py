@@ -34,3 +34,6 @@ class ImageDrawRegions(ImageOperation):
 
     def local_to_global_pos(self, p, params):
         return p
+
+    def local_to_global_points(self, points, params):
+        return points
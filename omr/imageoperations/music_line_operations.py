@@ -1,12 +1,12 @@
 from omr.imageoperations.image_operation import ImageOperation, ImageOperationData, OperationOutput, ImageData, Point
-from omr.imageoperations.image_crop import ImageCropToSmallestBoxOperation
+from omr.imageoperations.image_crop import ImageCropToSmallestBoxOperation, label_bounding_boxes
 from typing import Tuple, List, Any, Optional
 from database.file_formats.pcgts import Page, PageScaleReference, Line, MusicSymbol, ClefType, AccidType, GraphicalConnectionType, Coords, SymbolType
 import numpy as np
 from PIL import Image
 from copy import copy
 from enum import IntEnum
-from omr.dewarping.dummy_dewarper import Dewarper, transform
+from omr.dewarping.dewarp_cache import dewarp_cache
 import logging
 import cv2
 
@@ -80,20 +80,17 @@ class ImageExtractStaffLineImages(ImageOperation):
             out.append(image_data)
         else:
             i = 1
-
-            for mr in data.page.music_regions:
-                for ml in mr.staffs:
-                    mask = marked_regions == i
-                    if np.sum(mask) == 0:  # empty mask, skip
-                        continue
-                    else:
+            boxes = label_bounding_boxes(marked_regions, len(s))
+            for mr in data.page.music_blocks():
+                for ml in mr.lines:
+                    if boxes[i - 1] is not None:  # skip empty masks
                         img_data = copy(data)
                         img_data.page_image = image
                         img_data.music_region = mr
                         img_data.music_line = ml
                         img_data.music_lines = [ml]
-                        img_data.images = [ImageData(mask, True), ImageData(image, False), ImageData(marked_staff_lines, True)]
-                        cropped = self.cropper.apply_single(img_data)[0]
+                        img_data.images = [ImageData(image, False), ImageData(marked_staff_lines, True)]
+                        cropped = self.cropper.apply_label(img_data, marked_regions, i, boxes[i - 1])[0]
                         self._extract_image_op(img_data)
 
                         img_data.params = (i, cropped.params)
@@ -117,6 +114,13 @@ class ImageExtractStaffLineImages(ImageOperation):
             # default operations
             return Point(p.x + l, t + p.y)
 
+    def local_to_global_points(self, points: np.ndarray, params: Any) -> np.ndarray:
+        if self.full_page:
+            return points
+        else:
+            i, (t, b, l, r) = params
+            return np.asarray(points) + (l, t)
+
 
 class ImageExtractDewarpedStaffLineImages(ImageOperation):
     def __init__(self, dewarp, cut_region, pad, center, staff_lines_only):
@@ -157,8 +161,7 @@ class ImageExtractDewarpedStaffLineImages(ImageOperation):
 
         if self.dewarp:
             images = [Image.fromarray(image), Image.fromarray(labels), Image.fromarray(marked_symbols)]
-            dewarper = Dewarper(images[0].size, s)
-            dew_page, dew_labels, dew_symbols = tuple(map(np.array, dewarper.dewarp(images, None)))
+            dewarper, (dew_page, dew_labels, dew_symbols) = dewarp_cache.dewarp(data.page, s, data.scale_reference, images)
         else:
             dewarper = None
             dew_page, dew_labels, dew_symbols = image, labels, marked_symbols
@@ -172,16 +175,16 @@ class ImageExtractDewarpedStaffLineImages(ImageOperation):
 
         i = 1
         out = []
+        boxes = label_bounding_boxes(dew_labels, len(s))
         for mr in data.page.music_blocks():
             for ml in mr.lines:
-                mask = dew_labels == i
-                if np.sum(mask) != 0:  # empty mask, skip
+                if boxes[i - 1] is not None:  # skip empty masks
                     img_data = copy(data)
                     img_data.page_image = image
                     img_data.music_region = mr
                     img_data.music_line = ml
-                    img_data.images = [ImageData(mask, True), ImageData(dew_page, False), ImageData(dew_symbols, True)]
-                    cropped = self.cropper.apply_single(img_data)[0]
+                    img_data.images = [ImageData(dew_page, False), ImageData(dew_symbols, True)]
+                    cropped = self.cropper.apply_label(img_data, dew_labels, i, boxes[i - 1])[0]
                     self._extract_image_op(img_data)
                     if self.center:
                         coords = extract_transformed_coords(ml)
@@ -298,10 +301,18 @@ class ImageExtractDewarpedStaffLineImages(ImageOperation):
         p = Point(p.x + l, t + p.y - top)
         # dewarp
         if self.dewarp:
-            return Point(*transform(p.xy(), mls))
+            return Point(*dewarper.staff_lines.transform([p.xy()])[0])
         else:
             return p
 
+    def local_to_global_points(self, points: np.ndarray, params: Any) -> np.ndarray:
+        i, (t, b, l, r), (top, ), mls, dewarper = params
+        points = np.asarray(points, dtype=float) + (l, t - top)
+        if self.dewarp:
+            return dewarper.staff_lines.transform(points)
+        else:
+            return points
+
 
 if __name__ == "__main__":
     print(len(SymbolLabel))
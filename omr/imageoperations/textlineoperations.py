@@ -1,13 +1,13 @@
 from database.file_formats.pcgts import Coords
 from omr.imageoperations.image_operation import ImageOperation, ImageOperationData, OperationOutput, ImageData, Point, ImageOperationList
-from omr.imageoperations.image_crop import ImageCropToSmallestBoxOperation
+from omr.imageoperations.image_crop import ImageCropToSmallestBoxOperation, label_bounding_boxes
 from typing import Tuple, List, NamedTuple, Any, Optional, Set
 from database.file_formats.pcgts.page import BlockType, Block, Line
 import numpy as np
 from PIL import Image
 from copy import copy
 from enum import IntEnum
-from omr.dewarping.dummy_dewarper import Dewarper
+from omr.dewarping.dewarp_cache import dewarp_cache
 import logging
 
 logger = logging.getLogger(__name__)
@@ -33,8 +33,7 @@ class ImageExtractDeskewedLyrics(ImageOperation):
 
         # dewarp
         images = [Image.fromarray(image)]
-        dewarper = Dewarper(images[0].size, s)
-        dew_page, = tuple(map(np.array, dewarper.dewarp(images)))
+        dewarper, (dew_page, ) = dewarp_cache.dewarp(data.page, s, data.scale_reference, images)
         out = []
 
         for tl in all_tls:
@@ -72,6 +71,10 @@ class ImageExtractDeskewedLyrics(ImageOperation):
         (dewarper, aabb) = params
         return Point(dewarper.transform_point(p.p + aabb.tl.p))
 
+    def local_to_global_points(self, points: np.ndarray, params: Any) -> np.ndarray:
+        (dewarper, aabb) = params
+        return dewarper.transform_points(np.asarray(points) + aabb.tl.p)
+
 
 # extract image of a text from the binary image
 class ImageExtractTextLineImages(ImageOperation):
@@ -96,23 +99,24 @@ class ImageExtractTextLineImages(ImageOperation):
                 p2i(tl.coords).draw(marked_regions, i, 0, fill=True)
                 i += 1
 
+        i_max = i - 1
         out = []
 
         i = 1
+        boxes = label_bounding_boxes(marked_regions, i_max)
         for tr in text_blocks:
             for tl in tr.lines:
-                mask = marked_regions == i
                 if len(tl.text()) == 0:
                     continue
 
-                if np.sum(mask) == 0:  # empty mask, skip
+                if boxes[i - 1] is None:  # empty mask, skip
                     continue
                 else:
                     img_data = copy(data)
                     img_data.page_image = image
                     img_data.text_line = tl
-                    img_data.images = [ImageData(mask, True), ImageData(image, True)]
-                    cropped = self.cropper.apply_single(img_data)[0]
+                    img_data.images = [ImageData(image, True)]
+                    cropped = self.cropper.apply_label(img_data, marked_regions, i, boxes[i - 1])[0]
                     self._extract_image_op(img_data)
 
                     img_data.params = (i, cropped.params)
@@ -132,3 +136,7 @@ class ImageExtractTextLineImages(ImageOperation):
         i, (t, b, l, r) = params
         # default operations
         return Point(p.x + l, t + p.y)
+
+    def local_to_global_points(self, points: np.ndarray, params: Any) -> np.ndarray:
+        i, (t, b, l, r) = params
+        return np.asarray(points) + (l, t)
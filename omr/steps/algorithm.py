@@ -2,8 +2,8 @@ from abc import ABC, abstractmethod
 from database import DatabaseBook, DatabasePage
 from database.file_formats import PcGts
 from database.file_formats.performance import LockState
-from omr.dataset import DatasetCallback, Dataset
-from typing import Optional, List, Type, Union, Generator
+from omr.dataset import DatasetCallback, Dataset, RegionLineMaskData
+from typing import Optional, List, Type, Union, Generator, Iterable, Tuple, Callable, TypeVar
 from omr.experimenter.experimenter import Experimenter
 from .algorithmtrainerparams import AlgorithmTrainerSettings, AlgorithmTrainerParams, DatasetParams
 from .algorithmpreditorparams import AlgorithmPredictorSettings, AlgorithmPredictorParams
@@ -53,6 +53,22 @@ class PredictionCallback(ABC):
         pass
 
 
+class PredictionDatasetCallback(DatasetCallback):
+    # reports the pages of a dataset that were loaded as the progress of a prediction
+    def __init__(self, callback: PredictionCallback):
+        super().__init__()
+        self.callback = callback
+
+    def loading(self, n: int, total: int):
+        self.callback.progress_updated(n / total if total > 0 else 1, n_pages=total, n_processed_pages=n)
+
+    def loading_started(self, total: int):
+        pass
+
+    def loading_finished(self, total: int):
+        pass
+
+
 class AlgorithmTrainer(ABC):
     @staticmethod
     @abstractmethod
@@ -91,6 +107,9 @@ class AlgorithmTrainer(ABC):
         self.params: AlgorithmTrainerParams = self.settings.params
         self.train_dataset = self.meta().dataset_class()(self.settings.train_data, self.settings.dataset_params)
         self.validation_dataset = self.meta().dataset_class()(self.settings.validation_data, self.settings.dataset_params)
+        # the lines are loaded again by repeated trainings and the folds of experiments
+        self.train_dataset.use_cache = True
+        self.validation_dataset.use_cache = True
 
     def train(self, target_book: Optional[DatabaseBook] = None, callback: Optional[TrainerCallback] = None):
         class CallbackInterception(TrainerCallback):
@@ -177,6 +196,50 @@ class AlgorithmPredictionResult(ABC):
 AlgorithmPredictionResultGenerator = Generator[AlgorithmPredictionResult, None, None]
 
 
+LineResult = TypeVar('LineResult')
+
+
+def predict_lines_of_pages(pages: Iterable[Tuple[PcGts, List[RegionLineMaskData]]],
+                           predict_lines: Callable[[List[RegionLineMaskData]], Iterable[LineResult]],
+                           max_lines_per_batch: int) -> Generator[Tuple[PcGts, List[LineResult]], None, None]:
+    """
+    Predict the lines of (lazily loaded) pages in batches and yield the results of each page.
+
+    The lines of consecutive pages are collected until a batch is full, thus only the lines of the current batch are
+    kept in memory. A page is yielded (in the order of the pages) as soon as all of its lines are predicted, pages
+    without lines are yielded immediately. predict_lines must return one result for each line in the same order.
+    """
+    pending: List[Tuple[PcGts, List[LineResult], int]] = []     # pages with the results and the number of lines
+    batch: List[Tuple[List[LineResult], RegionLineMaskData]] = []
+
+    def finished_pages():
+        while len(pending) > 0 and len(pending[0][1]) == pending[0][2]:
+            pcgts, results, _ = pending.pop(0)
+            yield pcgts, results
+
+    def predict_batch(n: int):
+        lines, batch[:] = batch[:n], batch[n:]
+        results = list(predict_lines([line for _, line in lines]))
+        if len(results) != len(lines):
+            raise ValueError("Expected {} results, but got {}".format(len(lines), len(results)))
+        for (page_results, _), result in zip(lines, results):
+            page_results.append(result)
+
+    for pcgts, lines in pages:
+        page_results = []
+        pending.append((pcgts, page_results, len(lines)))
+        batch.extend((page_results, line) for line in lines)
+        while 0 < max_lines_per_batch <= len(batch):
+            predict_batch(max_lines_per_batch)
+
+        yield from finished_pages()
+
+    if len(batch) > 0:
+        predict_batch(len(batch))
+
+    yield from finished_pages()
+
+
 class AlgorithmPredictor(ABC):
     @staticmethod
     @abstractmethod
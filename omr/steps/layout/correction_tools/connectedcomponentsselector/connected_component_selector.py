@@ -1,7 +1,7 @@
 from database.file_formats.pcgts import *
-from omr.steps.preprocessing.util.connected_compontents import ConnectedComponents
+from omr.steps.preprocessing.util.connected_compontents import ConnectedComponents, ConnectedComponentsStore
 import numpy as np
-from typing import List
+from typing import List, Union
 import cv2
 from scipy import spatial
 from skimage.measure import approximate_polygon
@@ -154,44 +154,28 @@ def reduceImageCC(cc: ConnectedComponents, central_text_line: np.ndarray, filter
     central_text_line = np.int32(central_text_line[np.lexsort((central_text_line[:, 0],))])
     num_labels, labels, stats, centroids = cc
 
-
-    intersections = set()
-
+    # only the labels along the line are read (the labels might be memory mapped)
     x_s = np.arange(max(0, central_text_line[0][0]), min(cc.labels.shape[1], central_text_line[-1][0]))
     y_s = np.interp(x_s, central_text_line[:,0], central_text_line[:, 1])
-    for x, y in zip(x_s, y_s):
-        x, y = int(x), int(y)
-        if 0 <= x < labels.shape[1] and 0 <= y < labels.shape[0] and labels[y, x] > 0:
-            intersections.add(labels[y, x])
+    intersections = np.unique(ConnectedComponentsStore(cc).labels_at(x_s, y_s))
+    intersections = intersections[intersections > 0]
 
     if len(intersections) == 0:
         return None
 
-    min_x, min_y, max_x, max_y = 10000, 10000, 0, 0
-    for cp in intersections:
-        w = stats[cp, cv2.CC_STAT_WIDTH]
-        h = stats[cp, cv2.CC_STAT_HEIGHT]
-        a = stats[cp, cv2.CC_STAT_AREA]
-        y = stats[cp, cv2.CC_STAT_TOP]
-        l = stats[cp, cv2.CC_STAT_LEFT]
-
-        min_x = min(min_x, l)
-        min_y = min(min_y, y)
-        max_x = max(max_x, l + w)
-        max_y = max(max_y, y + h)
+    s = stats[intersections]
+    min_x = min(10000, s[:, cv2.CC_STAT_LEFT].min())
+    min_y = min(10000, s[:, cv2.CC_STAT_TOP].min())
+    max_x = max(0, (s[:, cv2.CC_STAT_LEFT] + s[:, cv2.CC_STAT_WIDTH]).max())
+    max_y = max(0, (s[:, cv2.CC_STAT_TOP] + s[:, cv2.CC_STAT_HEIGHT]).max())
 
     min_x = max(0, min_x - 2)
     max_x = min(labels.shape[1], max_x + 2)
     min_y = max(0, min_y - 2)
     max_y = min(labels.shape[0], max_y + 2)
 
-    cc_image = labels[min_y:max_y, min_x:max_x]
-    intersection_image = np.zeros(cc_image.shape, dtype=bool)
-
-    for cp in intersections:
-        intersection_image |= cc_image == cp
-
-    intersection_image = intersection_image.astype(np.uint8)
+    cc_image = np.asarray(labels[min_y:max_y, min_x:max_x])
+    intersection_image = np.isin(cc_image, intersections).astype(np.uint8)
     cv2.polylines(intersection_image, [(central_text_line - (min_x, min_y)).astype(np.int32)], False, (1, ), 8)
 
     non_intersection_image = (cc_image > 0) ^ intersection_image
@@ -202,13 +186,22 @@ def reduceImageCC(cc: ConnectedComponents, central_text_line: np.ndarray, filter
     return intersection_image, (min_x, min_y)
 
 
-def extract_components(cc: ConnectedComponents, central_text_line: Coords, staff_lines: List[Coords] = None, debug=False) -> List[Coords]:
+def extract_components(cc: Union[ConnectedComponents, ConnectedComponentsStore], central_text_line: Coords,
+                       staff_lines: List[Coords] = None, debug=False) -> List[Coords]:
     if staff_lines is None:
         staff_lines = []
 
     central_text_line = central_text_line.points
-    canvas = (cc.labels > 0) * 255
+    if isinstance(cc, ConnectedComponentsStore):
+        # skip lines that do not pass any component
+        l, t = np.floor(central_text_line.min(axis=0)).astype(int)
+        r, b = np.ceil(central_text_line.max(axis=0)).astype(int) + 1
+        if len(cc.components_in_rect(l, t, r, b)) == 0:
+            return []
+
+        cc = cc.cc
 
+    page_cc = cc
     result = reduceImageCC(cc, central_text_line, filter_sigma=0 if len(staff_lines) > 0 else 2)
     offset = np.array((0, 0))
     if result is None:
@@ -244,7 +237,7 @@ def extract_components(cc: ConnectedComponents, central_text_line: Coords, staff
 
     if debug:
         import matplotlib.pyplot as plt
-        canvas = np.stack(((canvas).astype(np.uint8),) * 3, -1)
+        canvas = np.stack((((page_cc.labels > 0) * 255).astype(np.uint8),) * 3, -1)
         cv2.polylines(canvas, [central_text_line.astype(np.int32)], False, [255, 0, 0], thickness=4)
         cv2.polylines(canvas, polys, True, [0, 255, 0])
         cv2.polylines(canvas, contours, True, [0, 0, 255])
@@ -256,11 +249,9 @@ def extract_components(cc: ConnectedComponents, central_text_line: Coords, staff
 
 if __name__ == '__main__':
     from database import DatabaseBook
-    import pickle
     book = DatabaseBook('demo')
     page = book.pages()[0]
-    with open(page.file('connected_components_norm', create_if_not_existing=True).local_path(), 'rb') as f:
-        cc = pickle.load(f)
+    cc = ConnectedComponentsStore.from_file(page.file('connected_components_norm', create_if_not_existing=True))
     line = Coords(np.array([[100, 740], [900, 738]]))
     staff_lines = []
     for mr in PcGts.from_file(page.file('pcgts')).page.music_regions:
@@ -40,16 +40,16 @@ class Predictor(AlgorithmPredictor):
             yield self.predict_single(page)
 
     def predict_single(self, page: DatabasePage) -> Result:
+        from omr.steps.preprocessing.util.connected_compontents import ConnectedComponentsStore
         pcgts = page.pcgts()
-        import pickle
+        # creates the normalized images (if missing) that define the scale of the staff lines
+        cc = ConnectedComponentsStore.from_file(page.file('connected_components_norm', create_if_not_existing=True))
         staff_lines: List[Coords] = []
-        pcgts = pcgts
         for mr in pcgts.page.music_blocks():
             for ml in mr.lines:
                 staff_lines += [pcgts.page.page_to_image_scale(s.coords, PageScaleReference.NORMALIZED) for s in ml.staff_lines]
 
-        with open(page.file('connected_components_norm', create_if_not_existing=True).local_path(), 'rb') as pkl:
-            polys = extract_components(pickle.load(pkl), pcgts.page.page_to_image_scale(self.initial_line, PageScaleReference.NORMALIZED), staff_lines)
-            polys = [pcgts.page.image_to_page_scale(c, PageScaleReference.NORMALIZED) for c in polys]
+        polys = extract_components(cc, pcgts.page.page_to_image_scale(self.initial_line, PageScaleReference.NORMALIZED), staff_lines)
+        polys = [pcgts.page.image_to_page_scale(c, PageScaleReference.NORMALIZED) for c in polys]
 
         return Result(polys)
@@ -1,4 +1,6 @@
 from abc import ABC, abstractmethod
+from typing import Optional
+import numpy as np
 
 
 def default_binarizer():
@@ -11,8 +13,15 @@ class Binarizer(ABC):
         super().__init__()
 
     @abstractmethod
-    def binarize(self, image):
+    def binarize(self, image, whitelevel: Optional[np.ndarray] = None, approximate=False):
+        # approximate: faster binarization that is only sufficient for estimations on the binary image (e.g. of the
+        # skew), the binary image differs slightly from the exact binarization
         return image
 
+    def estimate_whitelevel(self, image) -> Optional[np.ndarray]:
+        # whitelevel (page background) of an image that can be reused to binarize a rotated or resized version of it,
+        # None if not supported
+        return None
+
 
 
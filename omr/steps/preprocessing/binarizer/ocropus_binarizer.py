@@ -1,3 +1,4 @@
+from typing import Optional
 import numpy as np
 from scipy.ndimage import filters, interpolation, morphology
 from skimage.transform import resize
@@ -8,8 +9,8 @@ from omr.image_util import normalize_raw_image
 from .binarize import Binarizer
 
 
-def estimate_local_whitelevel(image, zoom=0.5, perc=80, range=20, debug=0):
-    '''flatten it by estimating the local whitelevel
+def estimate_whitelevel(image, zoom=0.5, perc=80, range=20):
+    '''estimate the local whitelevel (page background) at the resolution of the zoomed image
     zoom for page background estimation, smaller=faster, default: %(default)s
     percentage for filters, default: %(default)s
     range for filters, default: %(default)s
@@ -17,9 +18,24 @@ def estimate_local_whitelevel(image, zoom=0.5, perc=80, range=20, debug=0):
     m = interpolation.zoom(image,zoom)
     m = filters.percentile_filter(m,perc,size=(range,2))
     m = filters.percentile_filter(m,perc,size=(2,range))
-    m = interpolation.zoom(m,1.0/zoom)
-    if m.shape != image.shape:
-        m = resize((m * 255).astype(np.uint8), image.shape, preserve_range=True) / 255
+    return m
+
+
+def estimate_local_whitelevel(image, zoom=0.5, perc=80, range=20, debug=0, whitelevel=None):
+    '''flatten it by estimating the local whitelevel
+    zoom for page background estimation, smaller=faster, default: %(default)s
+    percentage for filters, default: %(default)s
+    range for filters, default: %(default)s
+    whitelevel: precomputed whitelevel of any resolution (e.g. of a smaller version of the image), it is resized
+    to the shape of the image
+    '''
+    if whitelevel is None:
+        m = estimate_whitelevel(image, zoom, perc, range)
+        m = interpolation.zoom(m,1.0/zoom)
+        if m.shape != image.shape:
+            m = resize((m * 255).astype(np.uint8), image.shape, preserve_range=True) / 255
+    else:
+        m = np.array(Image.fromarray(whitelevel.astype(np.float32), 'F').resize(image.shape[::-1], Image.BILINEAR))
 
     w,h = np.minimum(np.array(image.shape),np.array(m.shape))
     flat = np.clip(image[:w,:h]-m[:w,:h]+1,0,1)
@@ -30,12 +46,13 @@ def estimate_local_whitelevel(image, zoom=0.5, perc=80, range=20, debug=0):
     return flat
 
 
-def estimate_thresholds(flat, bignore=0.1, escale=1.0, lo=5, hi=90, debug=0):
+def estimate_thresholds(flat, bignore=0.1, escale=1.0, lo=5, hi=90, debug=0, mask_zoom=1):
     '''# estimate low and high thresholds
     ignore this much of the border for threshold estimation, default: %(default)s
     scale for estimating a mask over the text region, default: %(default)s
     lo percentile for black estimation, default: %(default)s
     hi percentile for white estimation, default: %(default)s
+    zoom for estimating the mask over the text region, smaller=faster but approximate, default: %(default)s
     '''
     d0,d1 = flat.shape
     o0,o1 = int(bignore*d0),int(bignore*d1)
@@ -44,21 +61,25 @@ def estimate_thresholds(flat, bignore=0.1, escale=1.0, lo=5, hi=90, debug=0):
         # by default, we use only regions that contain
         # significant variance; this makes the percentile
         # based low and high estimates more reliable
-        e = escale
-        v = est-filters.gaussian_filter(est,e*20.0)
+        # the mask is smooth, so it is estimated on a zoomed image and resized to the full image afterwards
+        e = escale * mask_zoom
+        z = interpolation.zoom(est,mask_zoom,order=1) if mask_zoom != 1 else est
+        v = z-filters.gaussian_filter(z,e*20.0)
         v = filters.gaussian_filter(v**2,e*20.0)**0.5
         v = (v>0.3*np.amax(v))
         v = morphology.binary_dilation(v,structure=np.ones((int(e*50),1)))
         v = morphology.binary_dilation(v,structure=np.ones((1,int(e*50))))
+        if v.shape != est.shape:
+            v = np.array(Image.fromarray(v).resize(est.shape[::-1], Image.NEAREST))
         est = est[v]
     lo = stats.scoreatpercentile(est.ravel(),lo)
     hi = stats.scoreatpercentile(est.ravel(),hi)
     return lo, hi
 
 
-def binarize(image):
-    flat = estimate_local_whitelevel(image)
-    lo, hi = estimate_thresholds(flat)
+def binarize(image, whitelevel=None, mask_zoom=1):
+    flat = estimate_local_whitelevel(image, whitelevel=whitelevel)
+    lo, hi = estimate_thresholds(flat, mask_zoom=mask_zoom)
 
     flat -= lo
     flat /= (hi-lo)
@@ -72,6 +93,16 @@ class OCRopusBin(Binarizer):
     def __init__(self):
         super().__init__()
 
-    def binarize(self, image: Image):
-        return Image.fromarray(binarize(normalize_raw_image(np.array(image.convert('L')))).astype(np.uint8) * 255)
+    def binarize(self, image: Image, whitelevel: Optional[np.ndarray] = None, approximate=False):
+        raw = np.array(image.convert('L'))
+        if whitelevel is not None:
+            # the whitelevel is stored in gray values, normalize it like the image
+            whitelevel = (whitelevel - np.amin(raw)) / np.amax(raw)
+
+        mask_zoom = 0.5 if approximate else 1
+        return Image.fromarray(binarize(normalize_raw_image(raw), whitelevel, mask_zoom).astype(np.uint8) * 255)
+
+    def estimate_whitelevel(self, image: Image) -> Optional[np.ndarray]:
+        raw = np.array(image.convert('L'))
+        return estimate_whitelevel(normalize_raw_image(raw)) * np.amax(raw) + np.amin(raw)
 
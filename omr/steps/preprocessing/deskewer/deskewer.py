@@ -20,9 +20,11 @@ class Deskewer(ABC):
                             original_image: Image,
                             gray_image: Image,
                             binary_image: Image,
+                            approximate=False,
                             ):
-        return self._estimate_skew_angle(original_image, gray_image, binary_image)
+        # approximate: faster estimation, the angle may differ slightly from the exact estimation
+        return self._estimate_skew_angle(original_image, gray_image, binary_image, approximate)
 
     @abstractmethod
-    def _estimate_skew_angle(self, color_image, gray_image, binary_image):
+    def _estimate_skew_angle(self, color_image, gray_image, binary_image, approximate=False):
         return 0
@@ -6,6 +6,7 @@ from omr.steps.preprocessing.deskewer import Deskewer
 
 
 def estimate_skew_angle(image,angles):
+    # rotates the full image for every angle, see estimate_skew_angle_by_profile for a faster approximation
     image = interpolation.rotate(image, -1, order=0, mode='constant')
 
     estimates = []
@@ -32,7 +33,65 @@ def estimate_skew_angle(image,angles):
     return a
 
 
-def estimate_skew(flat, bignore=0.1, maxskew=2, skewsteps=8):
+def rotated_shape(shape, angle):
+    # shape of the output of interpolation.rotate(image, angle) with reshape=True
+    a = np.deg2rad(angle)
+    c, s = np.abs(np.cos(a)), np.abs(np.sin(a))
+    h, w = shape
+    return int(s * w + c * h + 0.5), int(c * w + s * h + 0.5)
+
+
+class ProjectionProfiles:
+    """
+    Variance of the horizontal projection profile of an image for arbitrary rotation angles.
+
+    Equivalent to the variance of the row means of interpolation.rotate(image, angle, order=0, mode='constant'),
+    but the coordinates of the foreground pixels are projected instead of rotating the full image. Groups of
+    columns are pooled first (this barely changes the profile of small angles) to reduce the number of points.
+    """
+    def __init__(self, image: np.ndarray, pre_rotation: float = 0, column_pooling: int = 4):
+        h, w = image.shape
+        self.pre_rotation = pre_rotation
+        self.pre_rotated_shape = rotated_shape(image.shape, pre_rotation)
+
+        pooled_w = w // column_pooling * column_pooling
+        pooled = image[:, :pooled_w].reshape(h, pooled_w // column_pooling, column_pooling).sum(axis=2)
+        rows, cols = np.nonzero(pooled)
+        self.weights = pooled[rows, cols].astype(np.float64)
+        # coordinates relative to the (integral) center, a zero rotation maps every pixel exactly onto its row
+        self.rows = rows - h // 2
+        self.cols = cols * column_pooling + (column_pooling - 1) / 2 - w // 2
+
+    def variance(self, angle: float) -> float:
+        a = np.deg2rad(angle + self.pre_rotation)
+        out_h, out_w = rotated_shape(self.pre_rotated_shape, angle)
+        rows = np.round(self.rows * np.cos(a) - self.cols * np.sin(a)).astype(np.int64) + out_h // 2
+        profile = np.bincount(np.clip(rows, 0, out_h - 1), self.weights, minlength=out_h) / out_w
+        return np.var(profile)
+
+
+def estimate_skew_angle_by_profile(image, angles, coarse_step=4):
+    # fast approximation of estimate_skew_angle, the angles are searched coarse to fine (every coarse_step-th angle
+    # first, then all angles around the best one). The estimated angle may differ slightly from estimate_skew_angle.
+    # The image is (virtually) rotated by -1 degree first as in estimate_skew_angle, so that the angles of both
+    # versions agree
+    profiles = ProjectionProfiles(image, pre_rotation=-1)
+    variances = {}
+
+    def best(indices):
+        for i in indices:
+            if i not in variances:
+                variances[i] = profiles.variance(angles[i])
+
+        return max(indices, key=lambda i: (variances[i], angles[i]))
+
+    n = len(angles)
+    i = best(sorted(set(range(0, n, coarse_step)) | {n - 1}))
+    i = best(range(max(0, i - coarse_step + 1), min(n, i + coarse_step)))
+    return angles[i]
+
+
+def estimate_skew(flat, bignore=0.1, maxskew=2, skewsteps=8, by_profile=False):
     d0, d1 = flat.shape
     o0, o1 = int(bignore*d0), int(bignore*d1)  # border ignore
     flat = np.amax(flat)-flat
@@ -40,7 +99,11 @@ def estimate_skew(flat, bignore=0.1, maxskew=2, skewsteps=8):
     est = flat[o0:d0-o0, o1:d1-o1]
     ma = maxskew
     ms = int(2*maxskew*skewsteps)
-    angle = estimate_skew_angle(est,np.linspace(-ma, ma, ms+1))
+    angles = np.linspace(-ma, ma, ms+1)
+    if by_profile:
+        angle = estimate_skew_angle_by_profile(est, angles)
+    else:
+        angle = estimate_skew_angle(est, angles)
     return angle
 
 
@@ -50,8 +113,8 @@ class OcropusDeskewer(Deskewer):
                  ):
         super().__init__(binarizer)
 
-    def _estimate_skew_angle(self, color_image, gray_image, binary_image):
-        return estimate_skew(np.array(binary_image))
+    def _estimate_skew_angle(self, color_image, gray_image, binary_image, approximate=False):
+        return estimate_skew(np.array(binary_image), by_profile=approximate)
 
 
 if __name__ == '__main__':
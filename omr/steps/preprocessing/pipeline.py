@@ -0,0 +1,203 @@
+from typing import Dict, Iterable, NamedTuple, Optional, Set, TYPE_CHECKING
+from contextlib import contextmanager, ExitStack
+from PIL import Image
+import numpy as np
+import logging
+import os
+
+from omr.steps.preprocessing.preprocessing import Preprocessing
+from ommr4all.settings import PREPROCESSING_SETTINGS
+
+if TYPE_CHECKING:
+    from database import DatabasePage
+    from omr.steps.preprocessing.util.connected_compontents import ConnectedComponents
+
+logger = logging.getLogger(__name__)
+
+high_res_max_width = 2000
+low_res_max_width = 1000
+target_staff_line_distance = 10
+
+
+class ImageTriple(NamedTuple):
+    color: Image.Image
+    gray: Image.Image
+    binary: Image.Image
+
+
+class PreprocessingPipeline:
+    """
+    Creates the derived images of a page (see PIPELINE_FILES) in a single pass.
+
+    The original image is decoded once, and every product (the preprocessed images of each resolution, the line
+    distance, and the connected components) is computed at most once from the in-memory products it depends on.
+    Products that are not requested are read from disk if they exist or are computed otherwise. All computed
+    products are written at the end (including the page meta), while the locks of all written files are held.
+    """
+    # files that are created by the pipeline, in the order of their dependencies
+    PIPELINE_FILES = ['color_highres_preproc', 'color_lowres_preproc', 'color_norm', 'color_norm_x2',
+                      'connected_components_norm']
+    LEGACY_CONNECTED_COMPONENTS_FILE = 'connected_components_norm.pkl'
+
+    def __init__(self, page: 'DatabasePage'):
+        self.page = page
+        self.meta = page.meta()
+        self.recompute: Set[str] = set()
+        self.computed: Dict[str, object] = {}
+        self.loaded: Dict[str, object] = {}
+        self._original: Optional[Image.Image] = None
+        self._preprocessing: Optional[Preprocessing] = None
+
+    def preprocessing(self) -> Preprocessing:
+        if self._preprocessing is None:
+            self._preprocessing = Preprocessing(
+                approximate_skew_estimation=PREPROCESSING_SETTINGS.approximate_skew_estimation,
+                reuse_whitelevel=PREPROCESSING_SETTINGS.reuse_whitelevel,
+            )
+        return self._preprocessing
+
+    def create(self, file_ids: Iterable[str], recompute: bool = True):
+        # create the given files (and all missing files they depend on) and write all of them at the end
+        # if not recompute, only missing files are created
+        file_ids = list(file_ids)
+        with self.lock():
+            if recompute:
+                self.recompute.update(file_ids)
+
+            for file_id in PreprocessingPipeline.PIPELINE_FILES:
+                if file_id in file_ids and (recompute or not self.page.file(file_id).exists()):
+                    self.product(file_id)
+
+            self.save()
+
+    @contextmanager
+    def lock(self):
+        # hold the locks of all files that may be written (see DatabaseFile.create), always in the same order
+        from database.database_file import file_lock
+        paths = [self.page.file(file_id).local_path() for file_id in PreprocessingPipeline.PIPELINE_FILES]
+        paths.append(self.page.file('meta').local_path())
+        with ExitStack() as stack:
+            for path in paths:
+                stack.enter_context(file_lock(path))
+            yield
+
+    def product(self, file_id: str):
+        if file_id in self.computed:
+            return self.computed[file_id]
+
+        if file_id in self.loaded:
+            return self.loaded[file_id]
+
+        if file_id not in self.recompute and self.page.file(file_id).exists():
+            self.loaded[file_id] = self._load(file_id)
+            return self.loaded[file_id]
+
+        logger.info('Creating local file {}'.format(self.page.file(file_id).local_path()))
+        self.computed[file_id] = getattr(self, '_compute_' + file_id)()
+        return self.computed[file_id]
+
+    def original(self) -> Image.Image:
+        if self._original is None:
+            original = self.page.file('color_original', create_if_not_existing=True)
+            self._original = Image.open(original.local_path())
+        return self._original
+
+    def _load(self, file_id: str):
+        file = self.page.file(file_id)
+        if file_id == 'connected_components_norm':
+            from omr.steps.preprocessing.util.connected_compontents import ConnectedComponentsStore
+            return ConnectedComponentsStore.from_file(file).cc
+
+        return ImageTriple(*[Image.open(file.local_path(i)) for i in range(3)])
+
+    def _compute_color_highres_preproc(self) -> ImageTriple:
+        img = self.original()
+        w, h = img.size
+        out_w = min(high_res_max_width, w)
+        out_h = (out_w * h) // w
+        c_hr = img.resize((out_w, out_h), Image.BILINEAR)
+        preproc = self.preprocessing()
+        c_hr, g_hr, b_hr = preproc.preprocess(c_hr)
+        self.meta.preprocessing.deskewing_degrees = preproc.deskewed_angle
+        return ImageTriple(c_hr, g_hr, b_hr)
+
+    def _compute_color_lowres_preproc(self) -> ImageTriple:
+        hr: ImageTriple = self.product('color_highres_preproc')
+        w, h = hr.color.size
+        out_w = min(low_res_max_width, w)
+        out_h = (out_w * h) // w
+        size = (out_w, out_h)
+        return ImageTriple(
+            hr.color.resize(size, Image.BILINEAR),
+            hr.gray.resize(size, Image.BILINEAR),
+            hr.binary.resize(size, Image.NEAREST),
+        )
+
+    def _rescaled(self, color: Image.Image, scaling: float) -> ImageTriple:
+        size = (int(color.size[0] / scaling), int(color.size[1] / scaling))
+        color = color.resize(size, Image.BILINEAR)
+
+        # compute gray and binary based on normalized color image
+        preproc = self.preprocessing()
+        return ImageTriple(color, preproc.im2gray(color), preproc.binarize(color))
+
+    def _compute_color_norm(self) -> ImageTriple:
+        hr: ImageTriple = self.product('color_highres_preproc')
+        if self.meta.preprocessing.auto_line_distance:
+            from omr.steps.preprocessing.scale.scale import LineDistanceComputer
+            ldc = LineDistanceComputer()
+            line_distance = ldc.get_line_distance(np.array(hr.binary) / 255).line_distance
+            self.meta.preprocessing.average_line_distance = line_distance
+        else:
+            # average_line_distance is expected to be computed on the original image
+            line_distance = int(np.round(self.meta.preprocessing.average_line_distance * hr.color.size[0] / self.page.image_size('color_original')[0]))
+
+        assert(line_distance > 0)
+
+        # rescale original image
+        return self._rescaled(hr.color, line_distance / target_staff_line_distance)
+
+    def _compute_color_norm_x2(self) -> ImageTriple:
+        line_distance = self.meta.preprocessing.average_line_distance
+        if line_distance <= 0:
+            self.recompute.add('color_norm')
+            self.computed.pop('color_norm', None)
+            self.product('color_norm')
+            line_distance = self.meta.preprocessing.average_line_distance
+
+        assert(line_distance > 0)
+        hr: ImageTriple = self.product('color_highres_preproc')
+
+        # rescale original image
+        return self._rescaled(hr.color, line_distance / (target_staff_line_distance * 2))
+
+    def _compute_connected_components_norm(self) -> 'ConnectedComponents':
+        from omr.steps.preprocessing.util.connected_compontents import connected_compontents_with_stats
+        norm: ImageTriple = self.product('color_norm')
+        return connected_compontents_with_stats(np.array(norm.binary))
+
+    def save(self):
+        if len(self.computed) == 0:
+            return
+
+        for file_id in PreprocessingPipeline.PIPELINE_FILES:
+            if file_id not in self.computed:
+                continue
+
+            file = self.page.file(file_id)
+            file.delete()
+            product = self.computed[file_id]
+            if file_id == 'connected_components_norm':
+                from omr.steps.preprocessing.util.connected_compontents import ConnectedComponentsStore
+                ConnectedComponentsStore.save(product, file.local_path(0), file.local_path(1))
+                # the pickled connected components of older versions are replaced by the store
+                legacy = self.page.local_file_path(PreprocessingPipeline.LEGACY_CONNECTED_COMPONENTS_FILE)
+                if os.path.exists(legacy):
+                    os.remove(legacy)
+            else:
+                for i, img in enumerate(product):
+                    file.save_image_and_thumbnail(img, i)
+                self.page.set_image_size(file_id, product.color.size, save=False)
+
+        self.meta.save(self.page)
+        self.computed.clear()
@@ -3,6 +3,7 @@ from database.file_formats.pcgts import *
 import logging
 from typing import List, Optional, Tuple
 from omr.steps.preprocessing.meta import Meta
+from omr.steps.preprocessing.pipeline import PreprocessingPipeline
 from omr.steps.algorithm import AlgorithmPredictor, PredictionCallback, AlgorithmPredictorSettings, AlgorithmPredictorParams, AlgorithmPredictionResult, AlgorithmPredictionResultGenerator
 import multiprocessing
 
@@ -16,18 +17,13 @@ files = ['color_norm', 'color_norm_x2', 'color_highres_preproc', 'color_lowres_p
 def _process_single(args: Tuple[DatabasePage, AlgorithmPredictorParams]):
     page, settings = args
 
-    # update page meta
+    # update page meta, it is saved by the pipeline
     meta = page.meta()
     meta.preprocessing.average_line_distance = settings.avgLd
     meta.preprocessing.auto_line_distance = settings.automaticLd
-    meta.save(page)
-
-    # process all files
-    for file in files:
-        # create or recreate files
-        file = page.file(file)
-        file.delete()
-        file.create()
+
+    # recreate all files in a single pass
+    PreprocessingPipeline(page).create(files)
 
 
 class PreprocessingResult(AlgorithmPredictionResult):
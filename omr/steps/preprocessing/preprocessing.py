@@ -1,12 +1,15 @@
 from PIL import Image
+import numpy as np
 from omr.steps.preprocessing.binarizer import default_binarizer
 from omr.steps.preprocessing.gray.img2gray import im2gray
 from omr.steps.preprocessing.deskewer import default_deskewer
 
 
 class Preprocessing:
-    def __init__(self, operation_max_width=1000):
+    def __init__(self, operation_max_width=1000, approximate_skew_estimation=False, reuse_whitelevel=False):
         self.operation_max_width = operation_max_width
+        self.approximate_skew_estimation = approximate_skew_estimation
+        self.reuse_whitelevel = reuse_whitelevel
         self.binarizer = default_binarizer()
         self.deskewer = default_deskewer(self.binarizer)
         self.deskewed_angle = -1
@@ -25,13 +28,19 @@ class Preprocessing:
         else:
             working_image = original
 
-        working_bin = self.binarize(working_image)
+        # optionally, the whitelevel of the working image is reused for the rotated original
+        whitelevel = self.binarizer.estimate_whitelevel(working_image) if self.reuse_whitelevel else None
+        working_bin = self.binarizer.binarize(working_image, whitelevel, self.approximate_skew_estimation)
         working_gray = self.im2gray(working_image)
 
-        self.deskewed_angle = self.deskewer.estimate_skew_angle(working_image, working_gray, working_bin)
+        self.deskewed_angle = self.deskewer.estimate_skew_angle(working_image, working_gray, working_bin,
+                                                                self.approximate_skew_estimation)
         working_image = original.rotate(self.deskewed_angle)
         working_gray = self.im2gray(working_image)
-        working_bin = self.binarizer.binarize(working_image)
+        if whitelevel is not None:
+            whitelevel = Image.fromarray(whitelevel.astype(np.float32), 'F')
+            whitelevel = np.array(whitelevel.rotate(self.deskewed_angle, Image.BILINEAR))
+        working_bin = self.binarizer.binarize(working_image, whitelevel)
 
         return working_image, working_gray, working_bin
 
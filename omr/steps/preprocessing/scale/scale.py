@@ -1,15 +1,16 @@
 import numpy as np
-from itertools import tee
 from skimage.transform import resize
 from scipy.ndimage import gaussian_filter
 from scipy.signal import convolve2d
-from typing import NamedTuple
+from typing import Iterable, List, NamedTuple, Sequence, Tuple
 
 
 class LineDistanceResult(NamedTuple):
     line_thickness: float
     white_space_distance: float
     line_distance: float
+    # agreement of the line distances estimated at multiple scales, 1 if only a single scale was used
+    confidence: float = 1.0
 
 
 class LineDistanceComputer:
@@ -18,14 +19,49 @@ class LineDistanceComputer:
         self.max_width = max_width
         self.threshold = threshold
 
-    def get_line_distance(self, binary_image: np.array) -> LineDistanceResult:
-        o_height, o_width = binary_image.shape
-        factor = o_width / self.max_width
-        height = int(o_height / factor)
-        image = 1 - binary_image
-        image_resized = resize(image, (height, self.max_width), preserve_range=True, anti_aliasing=True, order=1) > self.threshold
-        wr, br = np.array(vertical_runs(1 - image_resized)) * factor
-        return LineDistanceResult(br, wr, br + wr)
+    def get_line_distance(self, binary_image: np.array, confidence_scales: Sequence[float] = ()) -> LineDistanceResult:
+        return self.get_line_distances([binary_image], confidence_scales)[0]
+
+    def get_line_distances(self, binary_images: Iterable[np.array], confidence_scales: Sequence[float] = ()) \
+            -> List[LineDistanceResult]:
+        # estimate the line distances of multiple pages, the run length histograms of all pages are computed at once.
+        # If confidence_scales are given (e.g. (0.75, 1.25)), the line distance is additionally estimated on images
+        # scaled by these factors and their agreement with the actual result is returned as confidence
+        binary_images = list(binary_images)
+        if len(binary_images) == 0:
+            return []
+
+        results = [self._line_distances(binary_images, self.max_width)]
+        results += [self._line_distances(binary_images, int(self.max_width * s)) for s in confidence_scales]
+
+        out = []
+        for page_results in zip(*results):
+            r = page_results[0]
+            if len(page_results) > 1:
+                distances = np.array([pr.line_distance for pr in page_results])
+                r = r._replace(confidence=float(np.clip(1 - np.std(distances) / np.mean(distances), 0, 1)))
+            out.append(r)
+
+        return out
+
+    def _line_distances(self, binary_images: List[np.array], max_width: int) -> List[LineDistanceResult]:
+        images, factors = [], []
+        for binary_image in binary_images:
+            o_height, o_width = binary_image.shape
+            factor = o_width / max_width
+            height = int(o_height / factor)
+            image = 1 - binary_image
+            image_resized = resize(image, (height, max_width), preserve_range=True, anti_aliasing=True, order=1) > self.threshold
+            images.append(1 - image_resized)
+            factors.append(factor)
+
+        white_runs, black_runs = vertical_run_histograms(images)
+        out = []
+        for w_hist, b_hist, factor in zip(white_runs, black_runs, factors):
+            wr, br = np.array(most_frequent_runs(w_hist, b_hist)) * factor
+            out.append(LineDistanceResult(br, wr, br + wr))
+
+        return out
 
 
 def enhance(image):
@@ -36,43 +72,41 @@ def enhance(image):
     return weight
 
 
-def vertical_runs(img: np.array) -> [int, int]:
+def vertical_run_lengths(img: np.array) -> Tuple[np.array, np.array]:
+    # lengths of all vertical runs and whether they are white (1), the first and the last run of every column are
+    # always counted (i.e. columns without any transition are counted twice)
     img = np.transpose(img)
-    h = img.shape[0]
     w = img.shape[1]
-    transitions = np.transpose(np.nonzero(np.diff(img)))
-    white_runs = [0] * (w + 1)
-    black_runs = [0] * (w + 1)
-    a, b = tee(transitions)
-    next(b, [])
-    for f, g in zip(a, b):
-        if f[0] != g[0]:
-            continue
-        tlen = g[1] - f[1]
-        if img[f[0], f[1] + 1] == 1:
-            white_runs[tlen] += 1
-        else:
-            black_runs[tlen] += 1
-
-    for y in range(h):
-        x = 1
-        col = img[y, 0]
-        while x < w and img[y, x] == col:
-            x += 1
-        if col == 1:
-            white_runs[x] += 1
-        else:
-            black_runs[x] += 1
-
-        x = w - 2
-        col = img[y, w - 1]
-        while x >= 0 and img[y, x] == col:
-            x -= 1
-        if col == 1:
-            white_runs[w - 1 - x] += 1
-        else:
-            black_runs[w - 1 - x] += 1
+    transitions = img[:, 1:] != img[:, :-1]
+    cols, rows = np.nonzero(transitions)
 
+    # runs between two transitions of the same column
+    inner = cols[1:] == cols[:-1]
+    inner_lengths = (rows[1:] - rows[:-1])[inner]
+    inner_colors = img[cols[:-1][inner], rows[:-1][inner] + 1]
+
+    # first and last run of every column
+    has_transitions = np.any(transitions, axis=1)
+    head_lengths = np.where(has_transitions, np.argmax(transitions, axis=1) + 1, w)
+    tail_lengths = np.where(has_transitions, np.argmax(transitions[:, ::-1], axis=1) + 1, w)
+
+    lengths = np.concatenate([inner_lengths, head_lengths, tail_lengths])
+    colors = np.concatenate([inner_colors, img[:, 0], img[:, -1]])
+    return lengths, colors == 1
+
+
+def vertical_run_histograms(imgs: List[np.array]) -> Tuple[np.array, np.array]:
+    # histograms of the white and black vertical run lengths of multiple images (one row per image)
+    runs = [vertical_run_lengths(img) for img in imgs]
+    n_bins = max([img.shape[0] for img in imgs]) + 1
+    lengths = np.concatenate([l + i * n_bins for i, (l, _) in enumerate(runs)])
+    white = np.concatenate([c for _, c in runs])
+    white_runs = np.bincount(lengths[white], minlength=len(imgs) * n_bins).reshape(len(imgs), n_bins)
+    black_runs = np.bincount(lengths[~white], minlength=len(imgs) * n_bins).reshape(len(imgs), n_bins)
+    return white_runs, black_runs
+
+
+def most_frequent_runs(white_runs: np.array, black_runs: np.array) -> Tuple[int, int]:
     black_r = np.argmax(black_runs) + 1
     # on pages with a lot of text the staffspaceheigth can be falsified.
     # --> skip the first elements of the array, we expect the staff lines distance to be at least twice the line height
@@ -88,6 +122,11 @@ def vertical_runs(img: np.array) -> [int, int]:
     return white_r, black_r
 
 
+def vertical_runs(img: np.array) -> Tuple[int, int]:
+    white_runs, black_runs = vertical_run_histograms([img])
+    return most_frequent_runs(white_runs[0], black_runs[0])
+
+
 if __name__ == '__main__':
     from ommr4all.settings import PRIVATE_MEDIA_ROOT
     import os
@@ -1,5 +1,6 @@
 import cv2
 from collections import namedtuple
+from typing import Tuple
 import numpy as np
 
 ConnectedComponents = namedtuple('ConnectedComponents', ['num_labels', 'labels', 'stats', 'centroids'])
@@ -8,3 +9,102 @@ ConnectedComponents = namedtuple('ConnectedComponents', ['num_labels', 'labels',
 def connected_compontents_with_stats(binary: np.ndarray):
     return ConnectedComponents(*cv2.connectedComponentsWithStats(255 - binary, 8, cv2.CV_32S))
 
+
+class BoundingBoxIndex:
+    """
+    Grid of tiles over the label image that lists the components (labels > 0) whose bounding box overlaps a tile.
+    The lists of all tiles are stored in a single array (ordered by the tile), starts holds the offset of each tile.
+    """
+    def __init__(self, stats: np.ndarray, shape: Tuple[int, int], tile_size: int = 64):
+        self.stats = stats
+        self.tile_size = tile_size
+        self.n_tiles_x = max(1, (shape[1] + tile_size - 1) // tile_size)
+        self.n_tiles_y = max(1, (shape[0] + tile_size - 1) // tile_size)
+
+        labels = np.arange(1, len(stats))
+        x0, y0, x1, y1 = self._tile_range(stats[1:, cv2.CC_STAT_LEFT], stats[1:, cv2.CC_STAT_TOP],
+                                          stats[1:, cv2.CC_STAT_LEFT] + stats[1:, cv2.CC_STAT_WIDTH],
+                                          stats[1:, cv2.CC_STAT_TOP] + stats[1:, cv2.CC_STAT_HEIGHT])
+        # one entry for every tile of every component
+        tiles_w, tiles_h = x1 - x0 + 1, y1 - y0 + 1
+        counts = tiles_w * tiles_h
+        tile_labels = np.repeat(labels, counts)
+        k = np.arange(len(tile_labels)) - np.repeat(np.cumsum(counts) - counts, counts)
+        tiles_w, x0, y0 = np.repeat(tiles_w, counts), np.repeat(x0, counts), np.repeat(y0, counts)
+        tile_ids = (y0 + k // tiles_w) * self.n_tiles_x + x0 + k % tiles_w
+
+        order = np.argsort(tile_ids, kind='stable')
+        self.labels = tile_labels[order]
+        self.starts = np.searchsorted(tile_ids[order], np.arange(self.n_tiles_x * self.n_tiles_y + 1))
+
+    def _tile_range(self, left, top, right, bottom):
+        # inclusive tile range of the (exclusive) pixel range
+        def clip(v, n):
+            return np.clip(v // self.tile_size, 0, n - 1)
+
+        return (clip(left, self.n_tiles_x), clip(top, self.n_tiles_y),
+                clip(np.maximum(left, right - 1), self.n_tiles_x), clip(np.maximum(top, bottom - 1), self.n_tiles_y))
+
+    def components_in_rect(self, left: int, top: int, right: int, bottom: int) -> np.ndarray:
+        # labels of the components whose bounding box overlaps the rect (right and bottom are exclusive)
+        x0, y0, x1, y1 = map(int, self._tile_range(left, top, right, bottom))
+        candidates = np.concatenate([self.labels[self.starts[y * self.n_tiles_x + x0]:self.starts[y * self.n_tiles_x + x1 + 1]]
+                                     for y in range(y0, y1 + 1)])
+        candidates = np.unique(candidates)
+        s = self.stats[candidates]
+        m = (s[:, cv2.CC_STAT_LEFT] < right) & (s[:, cv2.CC_STAT_LEFT] + s[:, cv2.CC_STAT_WIDTH] > left) \
+            & (s[:, cv2.CC_STAT_TOP] < bottom) & (s[:, cv2.CC_STAT_TOP] + s[:, cv2.CC_STAT_HEIGHT] > top)
+        return candidates[m]
+
+
+class ConnectedComponentsStore:
+    """
+    Connected components of a page stored as a label image (.npy) and a table of the stats and centroids (.npz).
+
+    The label image is memory mapped on loading, so that reading the labels of a region only reads the rows of the
+    region from disk, instead of unpickling the whole label image. The spatial index of the bounding boxes of the
+    components is created on first use.
+    """
+    def __init__(self, cc: ConnectedComponents):
+        self.cc = cc
+        self._index = None
+
+    @staticmethod
+    def save(cc: ConnectedComponents, labels_path: str, stats_path: str):
+        labels = cc.labels
+        if cc.num_labels <= np.iinfo(np.uint16).max:
+            labels = labels.astype(np.uint16)
+
+        np.save(labels_path, labels, allow_pickle=False)
+        with open(stats_path, 'wb') as f:
+            np.savez(f, stats=cc.stats.astype(np.int32), centroids=cc.centroids)
+
+    @staticmethod
+    def load(labels_path: str, stats_path: str, mmap: bool = True) -> 'ConnectedComponentsStore':
+        labels = np.load(labels_path, mmap_mode='r' if mmap else None, allow_pickle=False)
+        with np.load(stats_path, allow_pickle=False) as f:
+            stats, centroids = f['stats'], f['centroids']
+
+        return ConnectedComponentsStore(ConnectedComponents(len(stats), labels, stats, centroids))
+
+    @staticmethod
+    def from_file(file) -> 'ConnectedComponentsStore':
+        # load the connected components of a DatabaseFile (connected_components_norm)
+        return ConnectedComponentsStore.load(file.local_path(0), file.local_path(1))
+
+    def index(self) -> BoundingBoxIndex:
+        if self._index is None:
+            self._index = BoundingBoxIndex(self.cc.stats, self.cc.labels.shape)
+        return self._index
+
+    def components_in_rect(self, left: int, top: int, right: int, bottom: int) -> np.ndarray:
+        return self.index().components_in_rect(left, top, right, bottom)
+
+    def labels_at(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        # labels at the given pixel positions, 0 for positions outside of the image
+        labels = self.cc.labels
+        xs, ys = np.asarray(xs, dtype=int), np.asarray(ys, dtype=int)
+        valid = (xs >= 0) & (xs < labels.shape[1]) & (ys >= 0) & (ys < labels.shape[0])
+        out = np.zeros(xs.shape, dtype=labels.dtype)
+        out[valid] = labels[ys[valid], xs[valid]]
+        return out
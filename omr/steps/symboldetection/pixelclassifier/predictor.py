@@ -15,6 +15,8 @@ import numpy as np
 from omr.steps.symboldetection.pixelclassifier.meta import Meta
 from omr.imageoperations.music_line_operations import SymbolLabel
 from omr.steps.symboldetection.predictor import SymbolsPredictor, SingleLinePredictionResult
+from omr.adapters.pagesegmentation.batchpredictor import BatchPredictor
+from ommr4all.settings import PREDICTION_SETTINGS
 
 
 def render_prediction_labels(labels, img=None):
@@ -60,11 +62,14 @@ class PCPredictor(SymbolsPredictor):
             n_classes=len(SymbolLabel),
             network=os.path.join(settings.model.local_file('model.h5'))
         )
-        self.predictor = Predictor(settings)
-
-    def _predict(self, pcgts_files: List[PcGts], callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
-        dataset = SymbolDetectionDataset(pcgts_files, self.dataset_params)
-        for p in self.predictor.predict(dataset.to_page_segmentation_dataset()):
+        self.predictor = BatchPredictor(Predictor(settings),
+                                        PREDICTION_SETTINGS.max_fcn_batch_size,
+                                        PREDICTION_SETTINGS.fcn_bucket_width,
+                                        self.dataset_params.pad_power_of_2)
+
+    def _predict(self, dataset: SymbolDetectionDataset, lines: List[RegionLineMaskData],
+                 callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
+        for p in self.predictor.predict(dataset.to_page_segmentation_dataset(lines=lines)):
             m: RegionLineMaskData = p.data.user_data
             symbols = SingleLinePredictionResult(self.exract_symbols(p.probabilities, p.labels, m, dataset), p.data.user_data)
             if False:
@@ -89,27 +94,29 @@ class PCPredictor(SymbolsPredictor):
         # n_labels, cc, stats, centroids = cv2.connectedComponentsWithStats(((probs[:, :, 0] < 0.5) | (p > 0)).astype(np.uint8))
         p = (np.argmax(probs[:,:,1:], axis=-1) + 1) * (probs[:,:,0] < 0.5)
         n_labels, cc, stats, centroids = cv2.connectedComponentsWithStats(p.astype(np.uint8))
-        symbols = []
-        sorted_labels = sorted(range(1, n_labels), key=lambda i: (centroids[i, 0], -centroids[i, 1]))
+
+        # compute label this the label with the hightest frequency of the connected component
+        # (histograms of the labels of all components in a single pass)
+        n_symbol_labels = len(SymbolLabel)
+        histograms = np.bincount((cc * n_symbol_labels + p).ravel(), minlength=n_labels * n_symbol_labels).reshape(n_labels, n_symbol_labels)
+        component_labels = np.argmax(histograms[:, 1:], axis=-1) + 1
+
+        sorted_labels = np.arange(1, n_labels)
+        sorted_labels = sorted_labels[np.lexsort((-centroids[1:, 1], centroids[1:, 0]))]
+        sorted_labels = sorted_labels[stats[sorted_labels, cv2.CC_STAT_AREA] > 4]
+
         centroids_canvas = np.zeros(p.shape, dtype=np.uint8)
-        for i in sorted_labels:
-            w = stats[i, cv2.CC_STAT_WIDTH]
-            h = stats[i, cv2.CC_STAT_HEIGHT]
-            a = stats[i, cv2.CC_STAT_AREA]
-            if a <= 4:
-                continue
-            y = stats[i, cv2.CC_STAT_TOP]
-            x = stats[i, cv2.CC_STAT_LEFT]
-            c = Point(x=centroids[i, 0], y=centroids[i, 1])
-            coord = dataset.local_to_global_pos(c, m.operation.params)
-            coord = m.operation.page.image_to_page_scale(coord, m.operation.scale_reference)
-            #coord = coord.round().astype(int)
-
-            # compute label this the label with the hightest frequency of the connected component
-            area = p[y:y+h, x:x+w] * (cc[y:y+h, x:x+w] == i)
-            label = SymbolLabel(int(np.argmax([np.sum(area == v + 1) for v in range(len(SymbolLabel) - 1)])) + 1)
-            centroids_canvas[int(np.round(c.y)), int(np.round(c.x))] = label
-            position_in_staff = m.operation.music_line.compute_position_in_staff(coord)
+        c = centroids[sorted_labels]
+        centroids_canvas[np.round(c[:, 1]).astype(int), np.round(c[:, 0]).astype(int)] = component_labels[sorted_labels]
+
+        coords = dataset.local_to_global_points(c, m.operation.params)
+        coords = m.operation.page.image_to_page_scale(coords, m.operation.scale_reference)
+        positions_in_staff = m.operation.music_line.compute_positions_in_staff(coords)
+
+        symbols = []
+        for i, (x, y), position_in_staff in zip(sorted_labels, coords, positions_in_staff):
+            coord = Point(x, y)
+            label = SymbolLabel(int(component_labels[i]))
             if label == SymbolLabel.NOTE_START:
                 symbols.append(MusicSymbol(
                     symbol_type=SymbolType.NOTE,
@@ -3,8 +3,11 @@ from typing import List, Generator, NamedTuple, Optional
 from database import DatabasePage
 from database.file_formats.pcgts import *
 from omr.dataset import RegionLineMaskData
-from omr.steps.algorithm import AlgorithmPredictor, AlgorithmPredictorSettings, AlgorithmPredictionResultGenerator, AlgorithmPredictionResult, PredictionCallback
+from omr.steps.algorithm import AlgorithmPredictor, AlgorithmPredictorSettings, AlgorithmPredictionResultGenerator, AlgorithmPredictionResult, PredictionCallback, \
+    PredictionDatasetCallback, predict_lines_of_pages
+from omr.steps.symboldetection.dataset import SymbolDetectionDataset
 from shared.pcgtscanvas import PcGtsCanvas
+from ommr4all.settings import PREDICTION_SETTINGS
 
 
 class SingleLinePredictionResult(NamedTuple):
@@ -46,12 +49,11 @@ class SymbolsPredictor(AlgorithmPredictor, ABC):
 
     def predict(self, pages: List[DatabasePage], callback: Optional[PredictionCallback] = None) -> AlgorithmPredictionResultGenerator:
         pcgts_files = [p.pcgts() for p in pages]
-        page_results = [PredictionResult(pcgts, pcgts.page.location, []) for pcgts in pcgts_files]
-        for line_results in self._predict(pcgts_files, callback):
-            page_result = [p for p in page_results if p.pcgts == line_results.line.operation.pcgts][0]
-            page_result.music_lines.append(line_results)
-
-        for page_result in page_results:
+        dataset = SymbolDetectionDataset(pcgts_files, self.dataset_params)
+        for pcgts, music_lines in predict_lines_of_pages(dataset.load_pages(PredictionDatasetCallback(callback) if callback else None),
+                                                         lambda lines: self._predict(dataset, lines, callback),
+                                                         PREDICTION_SETTINGS.max_lines_per_batch):
+            page_result = PredictionResult(pcgts, pcgts.page.location, music_lines)
             if False:
                 from .evaluator import SymbolDetectionEvaluator, Codec
                 evaluator = SymbolDetectionEvaluator()
@@ -75,5 +77,7 @@ class SymbolsPredictor(AlgorithmPredictor, ABC):
             yield page_result
 
     @abstractmethod
-    def _predict(self, pcgts_files: List[PcGts], callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
+    def _predict(self, dataset: SymbolDetectionDataset, lines: List[RegionLineMaskData],
+                 callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
+        # predict the given lines of the dataset, one result for each line
         pass
@@ -6,7 +6,6 @@ from typing import List, Optional, Generator
 from database.file_formats.pcgts import MusicSymbol, Point
 from database.file_formats.performance.pageprogress import Locks
 from omr.dataset.datastructs import CalamariSequence, RegionLineMaskData
-from database.file_formats import PcGts
 from database import DatabaseBook
 import numpy as np
 from calamari_ocr.utils import glob_all
@@ -31,9 +30,9 @@ class OMRPredictor(SymbolsPredictor):
         voter_params.type = VoterParams.CONFIDENCE_VOTER_DEFAULT_CTC
         self.voter = voter_from_proto(voter_params)
 
-    def _predict(self, pcgts_files: List[PcGts], callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
-        dataset = SymbolDetectionDataset(pcgts_files, self.dataset_params)
-        for marked_symbols, (r, sample) in zip(dataset.load(callback), self.predictor.predict_dataset(dataset.to_calamari_dataset())):
+    def _predict(self, dataset: SymbolDetectionDataset, lines: List[RegionLineMaskData],
+                 callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
+        for marked_symbols, (r, sample) in zip(lines, self.predictor.predict_dataset(dataset.to_calamari_dataset(lines=lines))):
             prediction = self.voter.vote_prediction_result(r)
             yield SingleLinePredictionResult(self.extract_symbols(dataset, prediction, marked_symbols), marked_symbols)
 
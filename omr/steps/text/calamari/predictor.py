@@ -52,17 +52,19 @@ class CalamariPredictor(TextPredictor):
         voter_params = VoterParams()
         voter_params.type = VoterParams.CONFIDENCE_VOTER_DEFAULT_CTC
         self.voter = voter_from_proto(voter_params)
-
-    def _predict(self, dataset: TextDataset, callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
-        hyphen = Pyphenator()
+        self.hyphen = Pyphenator()
         """
-        hyphen = HyphenatorFromDictionary(
+        self.hyphen = HyphenatorFromDictionary(
             dictionary=os.path.join(BASE_DIR, 'internal_storage', 'resources', 'hyphen_dictionary.txt'),
             normalization=dataset.params.lyrics_normalization,
         )
         """
+
+    def _predict(self, dataset: TextDataset, lines: List[RegionLineMaskData],
+                 callback: Optional[PredictionCallback] = None) -> Generator[SingleLinePredictionResult, None, None]:
+        hyphen = self.hyphen
         try:
-            for marked_symbols, (r, sample) in zip(dataset.load(), self.predictor.predict_dataset(dataset.to_text_line_calamari_dataset())):
+            for marked_symbols, (r, sample) in zip(lines, self.predictor.predict_dataset(dataset.to_text_line_calamari_dataset(lines=lines))):
                 prediction = self.voter.vote_prediction_result(r)
                 hyphenated = hyphen.apply_to_sentence(prediction.sentence)
                 yield SingleLinePredictionResult(self.extract_symbols(dataset, prediction, marked_symbols), marked_symbols, hyphenated)
@@ -6,7 +6,8 @@ from database.file_formats.pcgts import *
 from omr.dataset import RegionLineMaskData
 
 from omr.steps.algorithm import AlgorithmPredictor, PredictionCallback, AlgorithmPredictionResultGenerator, \
-    AlgorithmPredictionResult
+    AlgorithmPredictionResult, PredictionDatasetCallback, predict_lines_of_pages
+from ommr4all.settings import PREDICTION_SETTINGS
 from omr.steps.algorithmpreditorparams import AlgorithmPredictorSettings
 from omr.steps.text.dataset import TextDataset
 
@@ -54,14 +55,13 @@ class TextPredictor(AlgorithmPredictor, ABC):
     def predict(self, pages: List[DatabasePage], callback: Optional[PredictionCallback] = None) -> AlgorithmPredictionResultGenerator:
         pcgts_files = [p.pcgts() for p in pages]
         dataset = TextDataset(pcgts_files, self.dataset_params)
-        page_results = [PredictionResult(pcgts, pcgts.page.location, []) for pcgts in pcgts_files]
-        for line_results in self._predict(dataset, callback):
-            page_result = [p for p in page_results if p.pcgts == line_results.line.operation.pcgts][0]
-            page_result.text_lines.append(line_results)
-
-        for page_result in page_results:
-            yield page_result
+        for pcgts, text_lines in predict_lines_of_pages(dataset.load_pages(PredictionDatasetCallback(callback) if callback else None),
+                                                        lambda lines: self._predict(dataset, lines, callback),
+                                                        PREDICTION_SETTINGS.max_lines_per_batch):
+            yield PredictionResult(pcgts, pcgts.page.location, text_lines)
 
     @abstractmethod
-    def _predict(self, dataset: TextDataset, callback: Optional[PredictionCallback]) -> Generator[SingleLinePredictionResult, None, None]:
+    def _predict(self, dataset: TextDataset, lines: List[RegionLineMaskData],
+                 callback: Optional[PredictionCallback]) -> Generator[SingleLinePredictionResult, None, None]:
+        # predict the given lines of the dataset, one result for each line
         pass
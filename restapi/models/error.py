@@ -23,6 +23,7 @@ class ErrorCodes(IntEnum):
     BOOK_EXISTS = 41001
     BOOK_INVALID_NAME = 41002
     BOOK_INSUFFICIENT_RIGHTS = 41003
+    BOOK_INVALID_SORT_KEY = 41004
 
     BOOK_PAGE_UPLOAD_FAILED_PAYLOAD_TOO_LARGE = 41010
     BOOK_IMPORT_FAILED_INVALID_STRUCTURE = 41011
@@ -1,4 +1,4 @@
-from typing import Optional, TYPE_CHECKING
+from typing import Optional, TYPE_CHECKING, List, Tuple
 from .taskqueue import TaskQueue, TaskStatus
 from .taskcommunicator import TaskCommunicator
 from uuid import uuid4
@@ -7,7 +7,7 @@ from .taskrunners.taskrunner import TaskRunner
 import logging
 from .taskcreator import TaskCreator
 from .taskwatcher import TaskWatcher
-from ommr4all.settings import TASK_OPERATION_WATCHER_SETTINGS
+from ommr4all.settings import TASK_OPERATION_WATCHER_SETTINGS, TASK_WORKER_POOL_SETTINGS, TaskWorkerPoolSettings
 
 logger = logging.getLogger(__name__)
 
@@ -21,9 +21,11 @@ class TaskIDGenerator:
 
 
 class OperationWorker:
-    def __init__(self, resources: Resources = None, watcher_interval=TASK_OPERATION_WATCHER_SETTINGS.interval):
+    def __init__(self, resources: Resources = None, watcher_interval=TASK_OPERATION_WATCHER_SETTINGS.interval,
+                 worker_pool_settings: TaskWorkerPoolSettings = TASK_WORKER_POOL_SETTINGS):
         self.queue = TaskQueue()
         self.resources = resources if resources else default_resources()
+        self.worker_pool_settings = worker_pool_settings
         self._task_communicator: Optional[TaskCommunicator] = None
         self._task_creator: Optional[TaskCreator] = None
         self.id_generator = TaskIDGenerator()
@@ -37,7 +39,8 @@ class OperationWorker:
 
     def task_creator(self) -> TaskCreator:
         if not self._task_creator:
-            self._task_creator = TaskCreator(self.queue, self.task_communicator(), self.resources)
+            self._task_creator = TaskCreator(self.queue, self.task_communicator(), self.resources,
+                                             self.worker_pool_settings)
         return self._task_creator
 
     def id_by_task_runner(self, task_runner: TaskRunner):
@@ -46,7 +49,8 @@ class OperationWorker:
     def stop(self, task_id: str):
         task = self.queue.remove(task_id)
         if task is not None:
-            self.task_creator().stop(task)
+            for t in [task] + task.subtasks:
+                self.task_creator().stop(t)
 
     def put(self, task_runner: TaskRunner, creator: 'User') -> str:
         self.task_creator()  # require creation
@@ -60,5 +64,8 @@ class OperationWorker:
     def status(self, task_id) -> Optional[TaskStatus]:
         return self.queue.status_of_task(task_id)
 
+    def partial_results(self, task_id: str, cursor: int = 0) -> Tuple[List[dict], int]:
+        return self.queue.partial_results(task_id, cursor)
+
 
 operation_worker = OperationWorker()
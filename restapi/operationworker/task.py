@@ -1,6 +1,6 @@
 from enum import IntEnum
-from dataclasses import dataclass
-from typing import TYPE_CHECKING, Union
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Union, Optional, List
 from mashumaro import DataClassDictMixin
 
 if TYPE_CHECKING:
@@ -29,6 +29,13 @@ class TaskStatusCodes(IntEnum):
     NOT_FOUND = 4
 
 
+class TaskPriority(IntEnum):
+    # lower values are dispatched first
+    INTERACTIVE = 0
+    BATCH = 1
+    TRAINING = 2
+
+
 class TaskProgressCodes(IntEnum):
     INITIALIZING = 0
     WORKING = 1
@@ -57,3 +64,10 @@ class Task:
     task_status: TaskStatus
     task_result: Union[dict, Exception]
     creator: 'User'
+    priority: TaskPriority = TaskPriority.BATCH
+    queued_time: float = 0
+    # tasks that are split into subtasks (shards) are not run themselves but aggregate the state of their subtasks
+    parent_id: Optional[str] = None
+    subtasks: List['Task'] = field(default_factory=list)
+    # results of the pages that were already processed while the task is still running
+    partial_results: List[dict] = field(default_factory=list)
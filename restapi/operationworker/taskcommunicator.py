@@ -1,4 +1,4 @@
-from typing import NamedTuple, Union
+from typing import NamedTuple, Union, Optional, List
 from .task import Task, TaskStatus, TaskNotFoundException
 from .taskqueue import TaskQueue
 from multiprocessing import Queue
@@ -10,8 +10,9 @@ logger = logging.getLogger(__name__)
 
 class TaskCommunicationData(NamedTuple):
     task: Task
-    status: TaskStatus
+    status: Optional[TaskStatus]      # None to keep the current status
     data: Union[dict, Exception] = None
+    partial_results: Optional[List[dict]] = None
 
 
 class TaskCommunicator:
@@ -28,7 +29,7 @@ class TaskCommunicator:
         while True:
             try:
                 com: TaskCommunicationData = self.queue.get()
-                self.task_queue.update_status(com.task.task_id, com.status, com.data)
+                self.task_queue.update_status(com.task.task_id, com.status, com.data, com.partial_results)
             except TaskNotFoundException:
                 pass
             except EOFError:
@@ -1,14 +1,20 @@
+import atexit
 import threading
-from multiprocessing import Queue
+from multiprocessing import Pipe
+from multiprocessing.connection import wait
 import logging
-from queue import Empty
-import time
+from queue import Queue, Empty
+from collections import deque
 
 from .taskqueue import TaskQueue
+from .task import TaskStatus, TaskStatusCodes
 from .taskcommunicator import TaskCommunicator
-from typing import NamedTuple, List
+from typing import NamedTuple, List, Dict, Deque
 from .taskworkerthread import TaskWorkerThread
-from .taskresources import Resources
+from .taskworkerpool import TaskWorkerPool
+from .taskworkergroup import TaskWorkerGroup
+from .taskresources import Resources, TaskResource
+from ommr4all.settings import TASK_WORKER_POOL_SETTINGS, TaskWorkerPoolSettings
 
 
 logger = logging.getLogger(__name__)
@@ -20,27 +26,42 @@ class IntraComData(NamedTuple):
 
 
 class TaskCreator:
+    """
+    Dispatches queued tasks to free resources.
+
+    The creator thread sleeps until it is woken up, either by a new task in the queue, a stop request, or a worker
+    process that finished (or died). Thus, tasks are dispatched as soon as they are queued or a resource is freed.
+    """
     OP_STOP = 0
 
-    def __init__(self, task_queue: TaskQueue, task_communicator: TaskCommunicator, resources: Resources):
+    def __init__(self, task_queue: TaskQueue, task_communicator: TaskCommunicator, resources: Resources,
+                 worker_pool_settings: TaskWorkerPoolSettings = TASK_WORKER_POOL_SETTINGS):
         self.task_queue: TaskQueue = task_queue
         self.task_communicator: TaskCommunicator = task_communicator
         self.resources: Resources = resources
-        self.sleep = 0.1
+        self.worker_pool = TaskWorkerPool(resources, task_communicator.queue, worker_pool_settings)
+        atexit.register(self.worker_pool.shutdown)     # worker processes are not daemonic
         self.intra_com = Queue()
-        self.thread = threading.Thread(target=self.run, args=(), name='task_communicator')
+        self._wake_reader, self._wake_writer = Pipe(duplex=False)
+        self._wake_mutex = threading.Lock()
+        self.task_queue.add_listener(self.wake)
+        self.task_queue.add_cancel_listener(self.stop)
+        self.thread = threading.Thread(target=self.run, args=(), name='task_creator')
         self.thread.daemon = True       # daemon thread to stop automatically on shutdown
         self.thread.start()
 
     def is_alive(self):
         return self.thread.is_alive()
 
+    def wake(self):
+        with self._wake_mutex:
+            self._wake_writer.send_bytes(b'')
+
     def stop(self, task):
         self.intra_com.put(IntraComData(TaskCreator.OP_STOP, task.task_id))
+        self.wake()
 
     def run(self):
-        from .task import TaskStatusCodes
-
         class TaskList:
             def __init__(self):
                 self.tasks: List[TaskWorkerThread] = []
@@ -74,32 +95,58 @@ class TaskCreator:
                 self.tasks.append(task)
                 logger.debug("Appended new task with id {} of type {}".format(task.task.task_id, type(task.task.task_runner)))
 
+            def wait_handles(self) -> list:
+                return sum([task.worker.wait_handles() for task in self.tasks], [])
+
         logger.info("THREAD TaskCreator: Started")
-        resources = self.resources
         tasks = TaskList()
 
         while True:
-            # check for tasks
+            # handle stop requests
             try:
-                data: IntraComData = self.intra_com.get_nowait()
-                if data.op == TaskCreator.OP_STOP:
-                    tasks.cancel(data.data)
+                while True:
+                    data: IntraComData = self.intra_com.get_nowait()
+                    if data.op == TaskCreator.OP_STOP:
+                        tasks.cancel(data.data)
             except Empty:
                 pass
 
             # cleanup threads that are stopped or do not exist anymore to free resources
             tasks.cleanup()
 
-            # check if new tasks are available
-            queued = self.task_queue.list_queued()
-            for task in queued:
-                for tg in task.task_runner.task_group:
-                    available_resources_for_group = [r for r in resources.resources if r.group == tg and not r.used]
-                    if len(available_resources_for_group) > 0:
-                        task.task_status.code = TaskStatusCodes.RUNNING
-                        r = available_resources_for_group[0]
-                        tasks.append(TaskWorkerThread(r, task, self.task_communicator.queue))
+            # assign queued tasks to free resources
+            self._dispatch(tasks)
+
+            # sleep until a new task was queued, a stop was requested or a running task finished
+            ready = wait([self._wake_reader] + tasks.wait_handles())
+            if self._wake_reader in ready:
+                while self._wake_reader.poll():
+                    self._wake_reader.recv_bytes()
+
+    def _dispatch(self, tasks):
+        free_resources: Dict[TaskWorkerGroup, Deque[TaskResource]] = {}
+        for r in self.resources.free():
+            free_resources.setdefault(r.group, deque()).append(r)
+
+        if len(free_resources) == 0:
+            return
+
+        for task in self.task_queue.list_queued():
+            for tg in task.task_runner.task_group:
+                group_resources = free_resources.get(tg)
+                if group_resources:
+                    if not self.task_queue.mark_running(task):
+                        # removed or canceled since it was listed
                         break
 
-            time.sleep(self.sleep)
-
+                    r = group_resources.popleft()
+                    try:
+                        tasks.append(TaskWorkerThread(self.worker_pool.worker(r), task))
+                    except Exception as e:
+                        logger.exception("Could not start task with id {}: {}".format(task.task_id, e))
+                        group_resources.appendleft(r)
+                        self.task_queue.update_status(task.task_id, TaskStatus(TaskStatusCodes.ERROR), Exception("Internal error"))
+                    break
+
+            if not any(free_resources.values()):
+                break
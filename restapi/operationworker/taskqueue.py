@@ -1,9 +1,13 @@
-from typing import List, Optional, NamedTuple, Dict, TYPE_CHECKING
+from typing import List, Optional, NamedTuple, Dict, TYPE_CHECKING, Any, Tuple
 from .task import Task, \
     TaskAlreadyQueuedException, TaskNotFinishedException, TaskNotFoundException, \
-    TaskStatusCodes, TaskStatus
+    TaskStatusCodes, TaskStatus, TaskPriority, TaskProgressCodes
 from .taskrunners.taskrunner import TaskRunner
-from multiprocessing import Lock
+from collections import OrderedDict, Counter
+from ommr4all.settings import TASK_QUEUE_SETTINGS
+import heapq
+import threading
+import time
 
 if TYPE_CHECKING:
     from django.contrib.auth.models import User
@@ -14,83 +18,272 @@ class TaskQueueStatus(NamedTuple):
     n_in_state: Dict[TaskStatusCodes, int]
 
 
+def _user_key(creator: 'User') -> Any:
+    return getattr(creator, 'pk', creator)
+
+
 class TaskQueue:
-    def __init__(self):
-        self.tasks: List[Task] = []
-        self.mutex = Lock()
-        
+    def __init__(self,
+                 aging_interval: float = TASK_QUEUE_SETTINGS.aging_interval,
+                 pages_per_shard: int = TASK_QUEUE_SETTINGS.pages_per_shard,
+                 ):
+        # all tasks and the subset of queued tasks, both in insertion order and indexed by the task id
+        self.tasks: Dict[str, Task] = OrderedDict()
+        self.queued: Dict[str, Task] = OrderedDict()
+        self.aging_interval = aging_interval
+        self.pages_per_shard = pages_per_shard
+        self.mutex = threading.RLock()
+        self._listeners = []
+        self._cancel_listeners = []
+
+    def add_listener(self, listener):
+        # listeners are called (without arguments) whenever a new task was queued
+        self._listeners.append(listener)
+
+    def add_cancel_listener(self, listener):
+        # listeners are called with a running task that shall be canceled (e.g. a subtask of a failed task)
+        self._cancel_listeners.append(listener)
+
     def status(self) -> TaskQueueStatus:
         with self.mutex:
-            return TaskQueueStatus(
-                len(self.tasks),
-                {c: len([t for t in self.tasks if t.task_status.code == c]) for c in TaskStatusCodes}
-            )
+            n_in_state = {c: 0 for c in TaskStatusCodes}
+            for t in self.tasks.values():
+                n_in_state[t.task_status.code] += 1
+
+            return TaskQueueStatus(len(self.tasks), n_in_state)
+
+    def list_tasks(self) -> List[Task]:
+        # all tasks except for subtasks
+        with self.mutex:
+            return [t for t in self.tasks.values() if t.parent_id is None]
 
     def remove(self, task_id: str) -> Optional[Task]:
+        # removes the task including its subtasks
         with self.mutex:
-            for i, t in enumerate(self.tasks):
-                if t.task_id == task_id:
-                    del self.tasks[i]
-                    return t
+            task = self.tasks.pop(task_id, None)
+            self.queued.pop(task_id, None)
+            if task is not None:
+                for subtask in task.subtasks:
+                    self.tasks.pop(subtask.task_id, None)
+                    self.queued.pop(subtask.task_id, None)
 
-            return None
+            return task
 
     def has(self, task_id: str, task_runner: TaskRunner):
         with self.mutex:
-            for task in self.tasks:
-                if task.task_id == task_id or self._id_by_runner(task_runner) == task.task_id:
-                    return True
-
-        return False
+            return task_id in self.tasks or self._id_by_runner(task_runner) is not None
 
     def put(self, task_id: str, task_runner: TaskRunner, creator: 'User'):
+        shards = task_runner.shards(self.pages_per_shard)
         with self.mutex:
-            for task in self.tasks:
-                if task.task_id == task_id or self._id_by_runner(task_runner) == task.task_id:
-                    raise TaskAlreadyQueuedException(task.task_id)
+            if task_id in self.tasks:
+                raise TaskAlreadyQueuedException(task_id)
+
+            existing_id = self._id_by_runner(task_runner)
+            if existing_id is not None:
+                raise TaskAlreadyQueuedException(existing_id)
 
-            self.tasks.append(Task(task_id, task_runner, TaskStatus(code=TaskStatusCodes.QUEUED),
+            task = Task(task_id, task_runner, TaskStatus(code=TaskStatusCodes.QUEUED),
+                        task_result={},
+                        creator=creator,
+                        priority=task_runner.priority(),
+                        queued_time=time.time(),
+                        )
+            self.tasks[task_id] = task
+            if len(shards) == 0:
+                self.queued[task_id] = task
+            else:
+                for i, shard in enumerate(shards):
+                    subtask = Task('{}:{}'.format(task_id, i), shard, TaskStatus(code=TaskStatusCodes.QUEUED),
                                    task_result={},
                                    creator=creator,
-                                   ))
+                                   priority=task.priority,
+                                   queued_time=task.queued_time,
+                                   parent_id=task_id,
+                                   )
+                    task.subtasks.append(subtask)
+                    self.tasks[subtask.task_id] = subtask
+                    self.queued[subtask.task_id] = subtask
+
+        for listener in self._listeners:
+            listener()
 
     def pop_result(self, task_id: str) -> dict:
         with self.mutex:
-            for i, t in enumerate(self.tasks):
-                if t.task_id == task_id:
-                    if t.task_status.code == TaskStatusCodes.QUEUED or t.task_status.code == TaskStatusCodes.RUNNING:
-                        raise TaskNotFinishedException()
+            t = self.tasks.get(task_id)
+            if t is None:
+                raise TaskNotFoundException()
+
+            if t.task_status.code == TaskStatusCodes.QUEUED or t.task_status.code == TaskStatusCodes.RUNNING:
+                raise TaskNotFinishedException()
 
-                    del self.tasks[i]
-                    return t.task_result
+            self.remove(task_id)
+            if t.task_status.code == TaskStatusCodes.FINISHED:
+                return t.task_runner.final_result(t.task_result, t.partial_results)
 
-            raise TaskNotFoundException()
+            return t.task_result
 
     def status_of_task(self, task_id: str) -> TaskStatus:
         with self.mutex:
-            for task in self.tasks:
-                if task.task_id == task_id:
-                    return task.task_status
+            try:
+                return self.tasks[task_id].task_status
+            except KeyError:
+                raise TaskNotFoundException()
+
+    def update_status(self, task_id: str, status: Optional[TaskStatus], result: dict = None,
+                      partial_results: Optional[List[dict]] = None):
+        with self.mutex:
+            task = self.tasks.get(task_id)
+            if task is None:
+                raise TaskNotFoundException()
+
+            if status is not None:
+                task.task_status = status
+                if status.code != TaskStatusCodes.QUEUED:
+                    self.queued.pop(task_id, None)
+            if result:
+                task.task_result = result
 
-            raise TaskNotFoundException()
+            if task.parent_id is not None:
+                parent = self.tasks.get(task.parent_id)
+                if partial_results and parent is not None:
+                    parent.partial_results.extend(partial_results)
+                self._update_parent(parent)
+            elif partial_results:
+                task.partial_results.extend(partial_results)
 
-    def update_status(self, task_id: str, status: TaskStatus, result: dict = None):
+    def partial_results(self, task_id: str, cursor: int = 0) -> Tuple[List[dict], int]:
+        # results of the pages that were processed since the cursor, and the cursor for the next request
         with self.mutex:
-            for task in self.tasks:
-                if task.task_id == task_id:
-                    task.task_status = status
-                    if result:
-                        task.task_result = result
-                    return
+            task = self.tasks.get(task_id)
+            if task is None:
+                raise TaskNotFoundException()
+
+            cursor = max(0, cursor)
+            return task.partial_results[cursor:], max(cursor, len(task.partial_results))
+
+    def mark_running(self, task: Task) -> bool:
+        # False if the task is not queued anymore (e.g. it was removed or its parent failed)
+        with self.mutex:
+            if self.queued.pop(task.task_id, None) is None:
+                return False
+
+            task.task_status.code = TaskStatusCodes.RUNNING
+            if task.parent_id is not None:
+                self._update_parent(self.tasks.get(task.parent_id))
 
-            raise TaskNotFoundException()
+            return True
+
+    def _update_parent(self, parent: Optional[Task]):
+        if parent is None or parent.task_status.code in (TaskStatusCodes.FINISHED, TaskStatusCodes.ERROR):
+            return
+
+        subtasks = parent.subtasks
+        errors = [t for t in subtasks if t.task_status.code == TaskStatusCodes.ERROR]
+        if len(errors) > 0:
+            # the whole task failed, the remaining subtasks are not started and running subtasks are canceled
+            parent.task_status = TaskStatus(TaskStatusCodes.ERROR)
+            parent.task_result = errors[0].task_result
+            for t in subtasks:
+                if t.task_status.code == TaskStatusCodes.QUEUED:
+                    self.queued.pop(t.task_id, None)
+                elif t.task_status.code == TaskStatusCodes.RUNNING:
+                    for listener in self._cancel_listeners:
+                        listener(t)
+                else:
+                    continue
+
+                t.task_status = TaskStatus(TaskStatusCodes.ERROR)
+                t.task_result = parent.task_result
+            return
+
+        if all(t.task_status.code == TaskStatusCodes.FINISHED for t in subtasks):
+            parent.task_status = TaskStatus(TaskStatusCodes.FINISHED)
+            parent.task_result = parent.task_runner.merge_shard_results([t.task_result for t in subtasks])
+            return
+
+        if all(t.task_status.code == TaskStatusCodes.QUEUED for t in subtasks):
+            return
+
+        # progress in pages, shards that did not report their number of pages yet count with all their candidates
+        n_total, n_processed = 0, 0
+        for t in subtasks:
+            n_candidates = len(t.task_runner.selection.pages)
+            if t.task_status.code == TaskStatusCodes.FINISHED:
+                n_total += n_candidates
+                n_processed += n_candidates
+            else:
+                n_total += t.task_status.n_total if t.task_status.n_total > 0 else n_candidates
+                n_processed += t.task_status.n_processed
+
+        parent.task_status = TaskStatus(
+            TaskStatusCodes.RUNNING,
+            TaskProgressCodes.WORKING,
+            progress=n_processed / n_total if n_total > 0 else -1,
+            n_processed=n_processed,
+            n_total=n_total,
+        )
+
+    def effective_priority(self, task: Task, now: float) -> int:
+        # aging: waiting tasks are raised one priority level per aging interval so that batch jobs still progress
+        if self.aging_interval <= 0:
+            return task.priority
+
+        return max(TaskPriority.INTERACTIVE, task.priority - int((now - task.queued_time) / self.aging_interval))
 
     def list_queued(self) -> List[Task]:
+        """
+        Queued tasks in the order they shall be dispatched.
+
+        Tasks are ordered by their (aged) priority. Within the same priority, users take turns (fair-share),
+        preferring the user with the fewest running tasks, and the tasks of a single user are processed in order.
+        """
         with self.mutex:
-            return [task for task in self.tasks if task.task_status.code == TaskStatusCodes.QUEUED]
+            now = time.time()
+            running = Counter(_user_key(t.creator) for t in self.tasks.values()
+                              if t.task_status.code == TaskStatusCodes.RUNNING)
+
+            by_priority: Dict[int, Dict[Any, List[Task]]] = {}
+            for task in self.queued.values():
+                user_tasks = by_priority.setdefault(self.effective_priority(task, now), OrderedDict())
+                user_tasks.setdefault(_user_key(task.creator), []).append(task)
+
+            ordered = []
+            for priority in sorted(by_priority.keys()):
+                user_tasks = by_priority[priority]
+                users = list(user_tasks.keys())
+                heap = [(running[u], user_tasks[u][0].queued_time, i) for i, u in enumerate(users)]
+                heapq.heapify(heap)
+                next_task = Counter()
+                while heap:
+                    n_running, _, i = heapq.heappop(heap)
+                    u = users[i]
+                    ordered.append(user_tasks[u][next_task[u]])
+                    next_task[u] += 1
+                    running[u] += 1
+                    if next_task[u] < len(user_tasks[u]):
+                        heapq.heappush(heap, (n_running + 1, user_tasks[u][next_task[u]].queued_time, i))
+
+            return ordered
+
+    def queue_positions(self) -> Dict[str, int]:
+        # positions of the queued (parent) tasks in the dispatch order, a sharded task is at its first queued subtask
+        with self.mutex:
+            positions = {}
+            for i, queued_task in enumerate(self.list_queued()):
+                positions.setdefault(queued_task.parent_id or queued_task.task_id, i)
+
+            return positions
+
+    def queue_position(self, task_id: str) -> int:
+        # position in the dispatch order (of the first queued subtask), -1 if the task is not queued (anymore)
+        return self.queue_positions().get(task_id, -1)
 
     def _id_by_runner(self, task_runner: TaskRunner) -> Optional[str]:
-        for task in self.tasks:
+        for task in self.tasks.values():
+            if task.parent_id is not None:
+                continue
+
             if task.task_runner == task_runner or (type(task.task_runner) == type(task_runner) and task.task_runner.identifier() == task_runner.identifier()):
                 return task.task_id
         return None
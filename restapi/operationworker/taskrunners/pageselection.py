@@ -26,12 +26,14 @@ class PageSelection:
                  pages: Optional[List[DatabasePage]] = None,
                  pcgts: Optional[List[PcGts]] = None,
                  single_page: bool = False,
+                 subset: bool = False,
                  ):
         self.book = book
         self.page_count = page_count
         self.pages = pages if pages else []
         self.pcgts = pcgts
         self.single_page = single_page
+        self.subset = subset    # restrict ALL or UNPROCESSED to the given pages instead of all pages of the book
 
         if pcgts:
             self.pages = [p.page.location for p in pcgts]
@@ -75,7 +77,19 @@ class PageSelection:
         )
 
     def identifier(self) -> Tuple:
-        return self.book, self.page_count, self.pages
+        return self.book, self.page_count, self.pages, self.subset
+
+    def split(self, pages_per_shard: int) -> List['PageSelection']:
+        # split into selections of (at most) pages_per_shard candidate pages that can be processed independently
+        if self.pcgts or self.single_page or pages_per_shard <= 0:
+            return [self]
+
+        candidates = self.pages if self.page_count == PageCount.CUSTOM or self.subset else self.book.pages()
+        if len(candidates) <= pages_per_shard:
+            return [self]
+
+        return [PageSelection(self.book, self.page_count, candidates[i:i + pages_per_shard], subset=True)
+                for i in range(0, len(candidates), pages_per_shard)]
 
     def __eq__(self, other):
         return isinstance(other, type(self)) and self.identifier() == other.identifier()
@@ -85,15 +99,17 @@ class PageSelection:
             return [DatabasePage(self.book, 'in_memory', skip_validation=True, pcgts=pcgts) for pcgts in self.pcgts]
 
         def page_count_pages() -> List[DatabasePage]:
+            if self.page_count == PageCount.CUSTOM:
+                return self.pages
+
+            candidates = self.pages if self.subset else self.book.pages()
             if self.page_count == PageCount.ALL:
-                return self.book.pages()
-            elif self.page_count == PageCount.UNPROCESSED:
+                return candidates
+            else:
                 if unprocessed:
-                    return [p for p in self.book.pages() if unprocessed(p)]
+                    return [p for p in candidates if unprocessed(p)]
                 else:
-                    return self.book.pages()
-            else:
-                return self.pages
+                    return candidates
 
         return [page for page in page_count_pages() if not page.page_progress().verified]
 
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from typing import Tuple, Type, Optional
+import logging
+import os
+
+from database.model import Model
+from omr.steps.algorithm import AlgorithmMeta, AlgorithmPredictor, AlgorithmPredictorSettings
+from ommr4all.settings import TASK_WORKER_POOL_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class PredictorCache:
+    """
+    LRU cache of AlgorithmPredictors (including their loaded models) of a single worker process.
+
+    Predictors are identified by the algorithm type, the model and the predictor parameters, since several
+    predictors evaluate their parameters (e.g. the ctc decoder) on construction.
+    """
+    def __init__(self, max_size: int = TASK_WORKER_POOL_SETTINGS.max_cached_predictors):
+        self.max_size = max_size
+        self.predictors: 'OrderedDict[Tuple, AlgorithmPredictor]' = OrderedDict()
+
+    @staticmethod
+    def key(meta: Type[AlgorithmMeta], settings: AlgorithmPredictorSettings) -> Tuple:
+        model: Optional[Model] = Model(settings.params.modelId) if settings.params.modelId else settings.model
+        if model is None:
+            return meta.type(), None, None, settings.params.to_json()
+
+        try:
+            # models can be overwritten in place (e.g. default models), reload them if so
+            modified = os.path.getmtime(model.meta_path)
+        except OSError:
+            modified = None
+
+        return meta.type(), model.id(), modified, settings.params.to_json()
+
+    def get(self, meta: Type[AlgorithmMeta], settings: AlgorithmPredictorSettings) -> AlgorithmPredictor:
+        if self.max_size <= 0:
+            return meta.create_predictor(settings)
+
+        key = PredictorCache.key(meta, settings)
+        predictor = self.predictors.pop(key, None)
+        if predictor is None:
+            logger.info("Loading predictor for algorithm {} and model {}".format(key[0].value, key[1]))
+            predictor = meta.create_predictor(settings)
+        else:
+            logger.debug("Reusing predictor for algorithm {} and model {}".format(key[0].value, key[1]))
+
+        self.predictors[key] = predictor
+        while len(self.predictors) > self.max_size:
+            self.predictors.popitem(last=False)
+
+        return predictor
+
+    def clear(self):
+        self.predictors.clear()
+
+
+predictor_cache = PredictorCache()
@@ -2,7 +2,7 @@ from abc import ABC, abstractmethod
 from typing import List, Tuple, Type
 from multiprocessing import Queue
 from restapi.operationworker.taskrunners.pageselection import PageSelection
-from ..task import Task
+from ..task import Task, TaskPriority
 from ..taskworkergroup import TaskWorkerGroup
 from database.database_available_models import DatabaseAvailableModels, DefaultModel
 from database.database_page import DatabasePage, DatabaseBook
@@ -25,6 +25,21 @@ class TaskRunner(ABC):
     def identifier(self) -> Tuple:
         return ()
 
+    def priority(self) -> TaskPriority:
+        return TaskPriority.BATCH
+
+    def shards(self, pages_per_shard: int) -> List['TaskRunner']:
+        # independent subtasks that replace this task (e.g. to process a book in parallel), empty if not splittable
+        return []
+
+    def merge_shard_results(self, results: List[dict]) -> dict:
+        return {}
+
+    def final_result(self, result: dict, partial_results: List[dict]) -> dict:
+        # result of the finished task, runners that stream their results (see TaskCommunicationData.partial_results)
+        # build it from the streamed results instead of keeping them twice
+        return result
+
     @abstractmethod
     def run(self, task: Task, com_queue: Queue) -> dict:
         return {}
@@ -1,9 +1,9 @@
 from omr.steps.algorithmpreditorparams import AlgorithmPredictorParams
 from .taskrunner import TaskRunner, Queue, TaskWorkerGroup, Tuple, AlgorithmTypes
 from ..taskcommunicator import TaskCommunicationData
-from ..task import Task, TaskStatus, TaskStatusCodes, TaskProgressCodes
+from ..task import Task, TaskStatus, TaskStatusCodes, TaskProgressCodes, TaskPriority
 from .pageselection import PageSelection, DatabasePage
-from typing import NamedTuple
+from typing import NamedTuple, List
 import logging
 
 
@@ -28,8 +28,29 @@ class TaskRunnerPrediction(TaskRunner):
     def identifier(self) -> Tuple:
         return self.selection.identifier(), self.algorithm_type
 
+    def priority(self) -> TaskPriority:
+        # a user is waiting for the result of a single page
+        return TaskPriority.INTERACTIVE if self.selection.single_page else TaskPriority.BATCH
+
+    def shards(self, pages_per_shard: int) -> List['TaskRunnerPrediction']:
+        selections = self.selection.split(pages_per_shard)
+        if len(selections) <= 1:
+            return []
+
+        return [TaskRunnerPrediction(self.algorithm_type, s, self.settings) for s in selections]
+
+    def final_result(self, result: dict, partial_results: List[dict]) -> dict:
+        if self.selection.single_page:
+            return result
+
+        # the results of the pages were streamed (by all shards) during the prediction
+        return {
+            'results': partial_results
+        }
+
     def run(self, task: Task, com_queue: Queue) -> dict:
         from omr.steps.algorithm import PredictionCallback, AlgorithmPredictor, AlgorithmPredictorSettings
+        from .predictorcache import predictor_cache
         meta = self.algorithm_meta()
 
         class Callback(PredictionCallback):
@@ -53,24 +74,22 @@ class TaskRunnerPrediction(TaskRunner):
             model=meta.selected_model_for_book(self.selection.book),
             params=self.settings.params,
         )
-        staff_line_detector: AlgorithmPredictor = meta.create_predictor(params)
+        staff_line_detector: AlgorithmPredictor = predictor_cache.get(meta, params)
         com_queue.put(TaskCommunicationData(task, TaskStatus(TaskStatusCodes.RUNNING, TaskProgressCodes.WORKING)))
 
         pages = self.selection.get_pages(meta.predictor().unprocessed)
         logger.debug("Algorithm {} processing {} pages".format(self.algorithm_type.name, len(pages)))
 
-        staves = list(staff_line_detector.predict(pages, Callback()))
-        results = [
-            page_staves.to_dict() for page_staves in staves
-        ]
-
-        if self.settings.store_to_pcgts:
-            for page_staves in staves:
+        # commit each page as soon as it is predicted, the results of multiple pages are only streamed to the queue
+        # that builds the final result (see final_result)
+        result = {}
+        for page_staves in staff_line_detector.predict(pages, Callback()):
+            result = page_staves.to_dict()
+            if self.settings.store_to_pcgts:
                 page_staves.store_to_page()
 
-        if self.selection.single_page:
-            return results[0]
-        else:
-            return {
-                'results': results
-            }
+            if not self.selection.single_page:
+                com_queue.put(TaskCommunicationData(task, None, partial_results=[result]))
+                result = {}
+
+        return result
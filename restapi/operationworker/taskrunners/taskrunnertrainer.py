@@ -1,7 +1,7 @@
 from .taskrunner import TaskRunner, Queue, TaskWorkerGroup, Tuple, AlgorithmTypes, PageSelection
 from database import DatabaseBook, DatabasePage
 from ..taskcommunicator import TaskCommunicationData
-from ..task import Task, TaskStatus, TaskStatusCodes, TaskProgressCodes
+from ..task import Task, TaskStatus, TaskStatusCodes, TaskProgressCodes, TaskPriority
 from .trainerparams import TaskTrainerParams
 import logging
 from omr.dataset.datafiles import dataset_by_locked_pages, LockState
@@ -25,6 +25,9 @@ class TaskRunnerTrainer(TaskRunner):
     def identifier(self) -> Tuple:
         return self.selection.identifier(),
 
+    def priority(self) -> TaskPriority:
+        return TaskPriority.TRAINING
+
     @staticmethod
     def unprocessed(page: DatabasePage) -> bool:
         return True
@@ -0,0 +1,186 @@
+from multiprocessing import Process, Pipe, Queue
+from multiprocessing.connection import Connection
+from typing import Dict, Optional
+import logging
+import os
+
+from ommr4all.settings import TASK_WORKER_POOL_SETTINGS, TaskWorkerPoolSettings
+from .task import Task
+from .taskresources import Resources, TaskResource
+
+logger = logging.getLogger(__name__)
+
+
+def _peak_memory_mb() -> float:
+    try:
+        from resource import getrusage, RUSAGE_SELF
+    except ImportError:
+        return 0
+
+    # ru_maxrss is given in kilobytes on linux
+    return getrusage(RUSAGE_SELF).ru_maxrss / 1024
+
+
+class TaskWorkerProcess:
+    """
+    Long-lived process that runs the tasks of a single TaskResource.
+
+    Tasks are sent to the process via a pipe, the process answers with a single message after each task that
+    states whether the process will exit (recycling) or wait for the next task. Since models are loaded only once
+    per process (see PredictorCache) subsequent predictions of the same algorithm run warm.
+    """
+    def __init__(self, resource: TaskResource, com_queue: Queue,
+                 settings: TaskWorkerPoolSettings = TASK_WORKER_POOL_SETTINGS):
+        self.resource = resource
+        self.com_queue = com_queue
+        self.settings = settings
+        self.process: Optional[Process] = None
+        self.connection: Optional[Connection] = None
+        self.task: Optional[Task] = None
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def _start(self):
+        self.connection, child_connection = Pipe()
+        self.process = Process(target=TaskWorkerProcess._run,
+                               args=(child_connection, self.com_queue, self.resource.gpu_id, self.settings),
+                               name='task_worker_{}_{}'.format(self.resource.group.name, self.resource.gpu_id))
+        self.process.daemon = False     # must be stopped explicitly, daemons may not create child processes
+        self.process.start()
+        child_connection.close()
+        logger.info('THREAD {}: Started worker process'.format(self.process.name))
+
+    def _join(self):
+        if self.process:
+            self.process.join()
+        if self.connection:
+            self.connection.close()
+
+        self.process, self.connection = None, None
+
+    def run_task(self, task: Task):
+        if self.task is not None:
+            raise ValueError("Worker is already running task {}".format(self.task.task_id))
+
+        if not self.is_alive():
+            self._start()
+
+        self.task = task
+        try:
+            self.connection.send(task)
+        except Exception:
+            self.cancel()
+            raise
+
+    def wait_handles(self) -> list:
+        # objects that become ready (see multiprocessing.connection.wait) if the running task finished
+        if self.task is None or not self.process:
+            return []
+
+        return [self.connection, self.process.sentinel]
+
+    def finished(self) -> bool:
+        if self.task is None:
+            return True
+
+        try:
+            if self.connection.poll():
+                recycle = self.connection.recv()
+                self.task = None
+                if recycle:
+                    logger.info('THREAD {}: Recycling worker process'.format(self.process.name))
+                    self._join()
+                return True
+        except (EOFError, OSError):
+            pass
+
+        if not self.process.is_alive():
+            logger.error('THREAD {}: Worker process died while running task {}'.format(self.process.name, self.task.task_id))
+            self.task = None
+            self._join()
+            return True
+
+        return False
+
+    def cancel(self) -> bool:
+        if self.task is None or not self.process:
+            return False
+
+        logger.info('THREAD {}: Attempting to terminate worker process'.format(self.process.name))
+        self.process.terminate()
+        self._join()
+        self.task = None
+        logger.info('THREAD: Worker process terminated')
+        return True
+
+    def stop(self):
+        if not self.is_alive():
+            return
+
+        if self.task is not None:
+            self.cancel()
+            return
+
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self._join()
+
+    @staticmethod
+    def requires_recycling(n_tasks: int, settings: TaskWorkerPoolSettings) -> bool:
+        if 0 < settings.max_tasks_per_worker <= n_tasks:
+            return True
+
+        if 0 < settings.max_memory_mb < _peak_memory_mb():
+            return True
+
+        return False
+
+    @staticmethod
+    def _run(connection: Connection, com_queue: Queue, gpu_id: int, settings: TaskWorkerPoolSettings):
+        from .taskworkerthread import TaskWorkerThread
+        if gpu_id < 0:
+            os.environ['CUDA_VISIBLE_DEVICES'] = ''
+        else:
+            os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
+
+        n_tasks = 0
+        while True:
+            try:
+                task: Optional[Task] = connection.recv()
+            except EOFError:
+                # pipe closed by the server
+                break
+
+            if task is None:
+                break
+
+            TaskWorkerThread.run_task(task.task_id, task, com_queue)
+            n_tasks += 1
+
+            recycle = TaskWorkerProcess.requires_recycling(n_tasks, settings)
+            connection.send(recycle)
+            if recycle:
+                break
+
+        logger.debug('THREAD: Worker process exit after {} tasks'.format(n_tasks))
+
+
+class TaskWorkerPool:
+    def __init__(self, resources: Resources, com_queue: Queue,
+                 settings: TaskWorkerPoolSettings = TASK_WORKER_POOL_SETTINGS):
+        self.workers: Dict[TaskResource, TaskWorkerProcess] = {
+            r: TaskWorkerProcess(r, com_queue, settings) for r in resources.resources
+        }
+
+    def worker(self, resource: TaskResource) -> TaskWorkerProcess:
+        return self.workers[resource]
+
+    def shutdown(self):
+        for worker in self.workers.values():
+            worker.stop()
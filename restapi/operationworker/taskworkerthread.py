@@ -1,50 +1,33 @@
 from .taskqueue import TaskNotFinishedException
 from .taskcommunicator import TaskCommunicationData
 from .task import Task, TaskStatus, TaskStatusCodes, TaskProgressCodes
-from multiprocessing import Queue, Process
+from multiprocessing import Queue
 import time
 from omr.dataset.datafiles import EmptyDataSetException
 import logging
-from .taskresources import TaskResource
+from .taskworkerpool import TaskWorkerProcess
 logger = logging.getLogger(__name__)
 
 
 class TaskWorkerThread:
-    def __init__(self, resource: TaskResource, task: Task, com_queue: Queue):
-        self.resource = resource
+    def __init__(self, worker: TaskWorkerProcess, task: Task):
+        self.worker = worker
+        self.resource = worker.resource
         self.task = task
-        self.com_queue = com_queue
-        self.process = Process(target=TaskWorkerThread._run_task,
-                               args=(self.task.task_id, self.task, self.com_queue,
-                                     self.resource.gpu_id))
-        self.process.daemon = False     # must be stopped explicitly
-        self.process.start()
+        self.worker.run_task(self.task)
 
     def finished(self):
-        return not self.process or not self.process.is_alive()
+        return self.worker.task is not self.task or self.worker.finished()
 
     def cancel(self) -> bool:
-        if self.task is None:
+        if self.task is None or self.worker.task is not self.task:
             return False
 
-        if self.process:
-            logger.info('THREAD {}: Attempting to terminate thread'.format(self.process.name))
-            self.process.terminate()
-            self.process.join()
-            logger.info('THREAD {}: Thread terminated'.format(self.process.name))
-            return True
-
-        return False
+        return self.worker.cancel()
 
     @staticmethod
-    def _run_task(name: str, task: Task, com_queue: Queue, gpu_id: int):
+    def run_task(name: str, task: Task, com_queue: Queue):
         logger.info('THREAD: Running new task {} of type {}'.format(task.task_id, type(task.task_runner)))
-        
-        import os
-        if gpu_id < 0:
-            os.environ['CUDA_VISIBLE_DEVICES'] = ''
-        else:
-            os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
 
         try:
             start = time.time()
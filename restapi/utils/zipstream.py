@@ -0,0 +1,84 @@
+from typing import Callable, Generator, IO, Iterable, Tuple, Union
+import io
+import os
+import time
+import zipfile
+
+from django.http import FileResponse
+
+CHUNK_SIZE = 1024 * 1024
+
+# formats that are already compressed are stored as is
+STORED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.zip', '.gz'}
+
+# an entry is either the path of a local file or a function that writes the content of the entry
+ZipStreamEntry = Tuple[str, Union[str, Callable[[IO[bytes]], None]]]
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    # unseekable output of a ZipFile, the written bytes are collected until they are popped
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def pop(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _compress_type(arcname: str) -> int:
+    if os.path.splitext(arcname)[1].lower() in STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+
+    return zipfile.ZIP_DEFLATED
+
+
+def zip_stream(entries: Iterable[ZipStreamEntry]) -> Generator[bytes, None, None]:
+    """
+    Writes a zip archive and yields its bytes as soon as they are written.
+
+    Entries are read lazily (only one chunk of a file is held in memory) so that the archive can be sent while
+    it is written. Local files are streamed in chunks, generated entries are written by their function.
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        for arcname, content in entries:
+            if isinstance(content, str):
+                info = zipfile.ZipInfo.from_file(content, arcname)
+                info.compress_type = _compress_type(arcname)
+                with open(content, 'rb') as src, zf.open(info, 'w') as dst:
+                    while True:
+                        chunk = src.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+
+                        dst.write(chunk)
+                        yield buffer.pop()
+            else:
+                info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+                info.compress_type = _compress_type(arcname)
+                with zf.open(info, 'w') as dst:
+                    content(dst)
+
+            yield buffer.pop()
+
+    yield buffer.pop()
+
+
+class ZipStreamResponse(FileResponse):
+    """
+    Response that sends a zip archive while it is written (see zip_stream) as attachment.
+    """
+    def __init__(self, entries: Iterable[ZipStreamEntry], filename: str):
+        content = (chunk for chunk in zip_stream(entries) if chunk)
+        super().__init__(content, as_attachment=True, filename=filename)
+        # FileResponse only sets the headers for file-like objects
+        self.set_headers(content)
@@ -10,6 +10,7 @@ from database.database_permissions import BookPermissionFlags
 from database.models.permissions import DatabasePermissionFlag
 from restapi.models.auth import RestAPIUser
 from restapi.models.error import APIError, ErrorCodes
+from restapi.utils.zipstream import ZipStreamResponse
 import json
 import logging
 import re
@@ -119,6 +120,7 @@ class BookUploadView(APIView):
 
                 original = DatabaseFile(page, 'color_original')
                 img.save(original.local_path())
+                page.set_image_size('color_original', img.size)
                 logger.debug('Created page at {}'.format(page.local_path()))
 
             try:
@@ -171,8 +173,14 @@ class BooksImportView(APIView):
                                     errorCode=ErrorCodes.BOOK_IMPORT_FAILED_BOOK_EXISTS,
                                     ).response()
 
+                # the caches of the pages are not imported, they are computed again
+                from omr.dewarping.dewarp_cache import DewarpCache
+                from omr.dataset.dataset_cache import DatasetCache
+                caches = {DewarpCache.DIRECTORY, DatasetCache.DIRECTORY}
+                members = [f for f in files if not caches.intersection(re.split(r'[\\/]', f.filename))]
+
                 logger.info("Extracting imported file to {}".format(book.local_path(os.pardir)))
-                zf.extractall(book.local_path(os.pardir))
+                zf.extractall(book.local_path(os.pardir), members)
 
             except Exception as e:
                 logger.exception(e)
@@ -227,19 +235,35 @@ class BooksView(APIView):
                             ).response()
 
     def get(self, request, format=None):
-        # TODO: sort by in request
-        books = DatabaseBook.list_available_book_metas_for_user(request.user, DatabaseBookPermissionFlag.READ)
+        from database.database_book_catalog import book_catalog
+        books = book_catalog.books_for_user(request.user, DatabaseBookPermissionFlag.READ)
 
-        pageIndex = request.query_params.get("pageIndex", 0)
-        pageSize = request.query_params.get("pageSize", len(books))  # by default all books
+        # sort and paginate before serializing the books
+        sort_by = request.query_params.get("sortBy", "name")
+        if sort_by not in ('name', 'id', 'created', 'last_opened', 'notationStyle'):
+            return APIError(status.HTTP_400_BAD_REQUEST,
+                            "Invalid sort key {}".format(sort_by),
+                            "Invalid sort key",
+                            ErrorCodes.BOOK_INVALID_SORT_KEY,
+                            ).response()
 
-        paginatedBooks = books[pageIndex:pageIndex + pageSize]
+        books.sort(key=lambda b: getattr(b[0], sort_by), reverse=request.query_params.get("sortOrder", "asc") == "desc")
+
+        try:
+            page_index = max(0, int(request.query_params.get("pageIndex", 0)))
+            page_size = int(request.query_params.get("pageSize", 0))
+        except ValueError:
+            page_index, page_size = 0, 0
+
+        if page_size > 0:
+            paginated_books = books[page_index * page_size:(page_index + 1) * page_size]
+        else:
+            paginated_books = books     # by default all books
 
         return Response({
             'totalPages': len(books),
-            'books': sorted([{
-                **book.to_dict(), **{'permissions': DatabaseBook(book.id).resolve_user_permissions(request.user).flags}
-        } for book in paginatedBooks], key=lambda b: b['name'])})
+            'books': [{**meta.to_dict(), **{'permissions': flags.flags}} for meta, flags in paginated_books],
+        })
 
 
 class BookDownloaderView(APIView):
@@ -247,41 +271,39 @@ class BookDownloaderView(APIView):
 
     @require_permissions([DatabaseBookPermissionFlag.READ])
     def post(self, request, book, type):
-        import json, zipfile, io, os
+        import json, io, os
         pages = json.loads(request.body, encoding='utf-8').get('pages', [])
         book = DatabaseBook(book)
         pages = book.pages() if len(pages) == 0 else [book.page(p) for p in pages]
         if type == 'annotations.zip':
-            s = io.BytesIO()
-            zf = zipfile.ZipFile(s, 'w')
-            for page in pages:
+            def annotation_entries():
                 file_names = ['color_original', 'color_norm_x2', 'binary_norm_x2', 'pcgts', 'meta']
-                files = [page.file(f) for f in file_names]
-
-                if any([not f.exists() for f in files]):
-                    continue
+                for page in pages:
+                    files = [page.file(f) for f in file_names]
 
-                for file, fn in zip(files, file_names):
-                    zf.write(file.local_path(), os.path.join(fn, page.page + file.ext()))
-
-            zf.close()
-            s.seek(0)
-            return FileResponse(s, as_attachment=True, filename=book.book + '.zip')
-        elif type == 'backup.zip':
-            s = io.BytesIO()
-            zf = zipfile.ZipFile(s, 'w')
-            files_to_ignore = [re.compile(r".*\.zip$")]
-            for root, dirs, files in os.walk(book.local_path()):
-                for file in files:
-                    if any([f.match(file) for f in files_to_ignore]):
+                    if any([not f.exists() for f in files]):
                         continue
 
-                    f = os.path.join(root, file)
-                    zf.write(f, os.path.join(book.book, os.path.relpath(f, book.local_path())))
+                    for file, fn in zip(files, file_names):
+                        yield os.path.join(fn, page.page + file.ext()), file.local_path()
 
-            zf.close()
-            s.seek(0)
-            return FileResponse(s, as_attachment=True, filename=book.book + '.backup.zip')
+            return ZipStreamResponse(annotation_entries(), book.book + '.zip')
+        elif type == 'backup.zip':
+            def backup_entries():
+                from omr.dewarping.dewarp_cache import DewarpCache
+                from omr.dataset.dataset_cache import DatasetCache
+                files_to_ignore = [re.compile(r".*\.zip$")]
+                for root, dirs, files in os.walk(book.local_path()):
+                    # skip caches
+                    dirs[:] = [d for d in dirs if d not in [DewarpCache.DIRECTORY, DatasetCache.DIRECTORY]]
+                    for file in files:
+                        if any([f.match(file) for f in files_to_ignore]):
+                            continue
+
+                        f = os.path.join(root, file)
+                        yield os.path.join(book.book, os.path.relpath(f, book.local_path())), f
+
+            return ZipStreamResponse(backup_entries(), book.book + '.backup.zip')
         elif type == 'monodiplus.json':
             from database.file_formats.exporter.monodi.monodi2_exporter import PcgtsToMonodiConverter
             from database.file_formats import PcGts
@@ -298,41 +320,37 @@ class BookDownloaderView(APIView):
             pcgts = [PcGts.from_file(f) for f in [p.file('pcgts', False) for p in pages] if f.exists()]
             obj = PcgtsToMonodiConverter(pcgts).root.to_json()
 
-            s = io.BytesIO()
-            with zipfile.ZipFile(s, 'w') as zf:
-                with zf.open(book.book + '.json', 'w') as f:
-                    f.write(json.dumps(obj, indent=2).encode('utf-8'))
+            def write_monodi(f):
+                f.write(json.dumps(obj, indent=2).encode('utf-8'))
 
-            s.seek(0)
-            return FileResponse(s, as_attachment=True, filename=book.book + '.monodi2.zip')
+            return ZipStreamResponse([(book.book + '.json', write_monodi)], book.book + '.monodi2.zip')
         elif type == 'mei4.zip':
             from database.file_formats.exporter.mei.pcgts_to_mei4_exporter import PcgtsToMeiConverter
             from database.file_formats import PcGts
-            pcgts = [PcGts.from_file(f) for f in [p.file('pcgts', False) for p in pages] if f.exists()]
 
-            s = io.BytesIO()
-            with zipfile.ZipFile(s, 'w') as zf:
-                for p in pcgts:
-                    with zf.open(os.path.join(book.book, p.page.location.page + '.xml'), 'w') as f:
-                        PcgtsToMeiConverter(p).write(f)
+            def mei_entries():
+                # load and convert the pages one by one while writing
+                for file in [p.file('pcgts', False) for p in pages]:
+                    if not file.exists():
+                        continue
 
-            s.seek(0)
-            return FileResponse(s, as_attachment=True, filename=book.book + '.mei.zip')
-        elif type == 'original_images.zip':
-            s = io.BytesIO()
-            zf = zipfile.ZipFile(s, 'w')
-            for page in pages:
-                file = page.file('color_original')
+                    def write_mei(f, file=file):
+                        PcgtsToMeiConverter(PcGts.from_file(file)).write(f)
 
-                if not file.exists():
-                    continue
+                    yield os.path.join(book.book, file.page.page + '.xml'), write_mei
 
-                zf.write(file.local_path(), os.path.join(book.book, page.page + file.ext()))
+            return ZipStreamResponse(mei_entries(), book.book + '.mei.zip')
+        elif type == 'original_images.zip':
+            def original_image_entries():
+                for page in pages:
+                    file = page.file('color_original')
 
-            zf.close()
-            s.seek(0)
-            return FileResponse(s, as_attachment=True, filename=book.book + '.zip')
+                    if not file.exists():
+                        continue
+
+                    yield os.path.join(book.book, page.page + file.ext()), file.local_path()
 
+            return ZipStreamResponse(original_image_entries(), book.book + '.zip')
 
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -42,7 +42,13 @@ class BookOperationTaskView(APIView):
     def get(self, request, book, operation, task_id):
         op_status = operation_worker.status(task_id)
         if op_status:
-            return Response({'status': op_status.to_dict()})
+            # results of the pages that were finished since the given cursor, pass the returned cursor to continue
+            try:
+                cursor = int(request.query_params.get('cursor', 0))
+            except ValueError:
+                cursor = 0
+            results, cursor = operation_worker.partial_results(task_id, cursor)
+            return Response({'status': op_status.to_dict(), 'results': results, 'cursor': cursor})
         else:
             return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -10,18 +10,24 @@ logger = logging.getLogger(__name__)
 class TasksView(APIView):
     @require_global_permissions(DatabasePermissionFlag.TASKS_LIST)
     def get(self, request):
+        queue = operation_worker.queue
+        queue_positions = queue.queue_positions()
         return Response([{'id': t.task_id,
                           'status': t.task_status.to_dict(),
                           'creator': RestAPIUser.from_user(t.creator).to_dict(),
                           'algorithmType': t.task_runner.algorithm_type.value,
                           'book': t.task_runner.selection.book.get_meta().to_dict(),
-                          } for t in operation_worker.queue.tasks])
+                          'priority': t.priority.name.lower(),
+                          'queuePosition': queue_positions.get(t.task_id, -1),
+                          } for t in queue.list_tasks()])
 
 
 class TaskView(APIView):
     @require_global_permissions(DatabasePermissionFlag.TASKS_LIST)
     def get(self, request, task_id):
-        return Response(operation_worker.queue.status_of_task(task_id).to_dict())
+        status = operation_worker.queue.status_of_task(task_id).to_dict()
+        status['queuePosition'] = operation_worker.queue.queue_position(task_id)
+        return Response(status)
 
     @require_global_permissions(DatabasePermissionFlag.TASKS_CANCEL)
     def delete(self, request, task_id):
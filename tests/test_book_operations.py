@@ -1,6 +1,8 @@
 import logging
 import sys
 import os
+import tempfile
+import multiprocessing
 from unittest import TestCase
 
 import ommr4all.settings as settings
@@ -17,6 +19,17 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 settings.PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'tests', 'storage')
 
 
+def _lock_pages(pages):
+    # lock the staff lines of the pages in the index (in another process)
+    from database.database_book_page_index import DatabaseBookPageIndex
+    from database.file_formats.performance.pageprogress import PageProgress
+    book = DatabaseBook('page_index')
+    for page in pages:
+        page_progress = PageProgress()
+        page_progress.locked[Locks.STAFF_LINES] = True
+        DatabaseBookPageIndex.update_progress(book, page, page_progress)
+
+
 class TestBookOperations(TestCase):
     def test_page_selection(self):
         book = DatabaseBook('demo')
@@ -34,6 +47,49 @@ class TestBookOperations(TestCase):
         pages = book.pages_with_lock([LockState(Locks.STAFF_LINES, False), LockState(Locks.SYMBOLS, True)])
         self.assertListEqual([p.local_path() for p in pages], [])
 
+    def test_page_index(self):
+        root = settings.PRIVATE_MEDIA_ROOT
+        with tempfile.TemporaryDirectory() as d:
+            settings.PRIVATE_MEDIA_ROOT = d
+            try:
+                book = DatabaseBook('page_index')
+                os.makedirs(book.local_path('pages'))
+                for page in ['page_b', 'page_a']:
+                    os.mkdir(book.page(page).local_path())
+                self.assertListEqual(['page_a', 'page_b'], book.page_names())
+
+                # the progress is stored in the index, the progress file is not read again
+                page = book.page('page_a')
+                page.page_progress().locked[Locks.STAFF_LINES] = True
+                page.save_page_progress()
+                os.remove(page.file('page_progress').local_path())
+                pages = book.pages_with_lock([LockState(Locks.STAFF_LINES, True)])
+                self.assertListEqual(['page_a'], [p.page for p in pages])
 
+                # renamed, deleted, and new pages
+                book.page('page_b').rename('page_c')
+                os.mkdir(book.page('page_d').local_path())
+                self.assertListEqual(['page_a', 'page_c', 'page_d'], book.page_names())
+                book.page('page_d').delete()
+                self.assertListEqual(['page_a', 'page_c'], book.page_names())
+                self.assertListEqual(['page_a'], [p.page for p in book.pages_with_lock([LockState(Locks.STAFF_LINES, True)])])
+            finally:
+                settings.PRIVATE_MEDIA_ROOT = root
 
+    def test_page_index_processes(self):
+        root = settings.PRIVATE_MEDIA_ROOT
+        with tempfile.TemporaryDirectory() as d:
+            settings.PRIVATE_MEDIA_ROOT = d
+            try:
+                book = DatabaseBook('page_index')
+                os.makedirs(book.local_path('pages'))
+                pages = ['page_{:03d}'.format(i) for i in range(100)]
+                for page in pages:
+                    os.mkdir(book.page(page).local_path())
 
+                # updates of two processes are not lost
+                with multiprocessing.get_context('fork').Pool(2) as pool:
+                    pool.map(_lock_pages, [pages[0::2], pages[1::2]])
+                self.assertListEqual(pages, [p.page for p in book.pages_with_lock([LockState(Locks.STAFF_LINES, True)])])
+            finally:
+                settings.PRIVATE_MEDIA_ROOT = root
@@ -0,0 +1,259 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+import numpy as np
+
+import ommr4all.settings as settings
+from database import DatabaseBook
+from database.file_formats import PcGts
+from omr.dataset import DatasetParams, DatasetCallback
+from ommr4all.settings import DatasetLoadingSettings
+from omr.dataset.dataset_cache import DatasetCache
+from omr.imageoperations import ImageOperationData
+from omr.adapters.pagesegmentation.batchpredictor import BatchPredictor, bucket_batches
+from omr.steps.algorithm import predict_lines_of_pages, PredictionCallback, PredictionDatasetCallback
+from omr.steps.symboldetection.dataset import SymbolDetectionDataset
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Change database to test storage
+settings.PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'tests', 'storage')
+
+
+class PixelwiseNetwork:
+    # stands in for the network of a pixel classifier, the logits only depend on the pixel itself
+    architecture = 'fcn_skip'
+
+    def __init__(self):
+        self.model = self
+        self.name = 'model'
+        self.batch_shapes = []
+
+    def predict_on_batch(self, inputs):
+        images, binaries = inputs
+        self.batch_shapes.append(images.shape)
+        return np.concatenate([images * c - binaries / 255 for c in range(3)], axis=-1)
+
+    def predict_single_data(self, data):
+        from ocr4all_pixel_classifier.lib.network import Network
+        return Network.predict_single_data(self, data)
+
+
+def symbol_detection_dataset(pcgts=None):
+    if pcgts is None:
+        book = DatabaseBook('demo')
+        pages = [book.page('page_test_symbol_detection_001'), book.page('page00000001'), book.page('page_test_symbol_detection_001')]
+        pcgts = [p.pcgts() for p in pages]
+    return SymbolDetectionDataset(pcgts, DatasetParams(pad=[0, 10, 0, 40]))
+
+
+class RecordingCallback(DatasetCallback):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def loading(self, n: int, total: int):
+        self.calls.append(('loading', n, total))
+
+    def loading_started(self, total: int):
+        self.calls.append(('started', total))
+
+    def loading_finished(self, total: int):
+        self.calls.append(('finished', total))
+
+
+class TestDatasetLoading(unittest.TestCase):
+    def test_load_pages(self):
+        dataset = symbol_detection_dataset()
+        pages = list(dataset.load_pages())
+        self.assertEqual([id(f) for f in dataset.files], [id(f) for f, _ in pages])
+        self.assertIsNone(dataset.loaded)
+        self.assertEqual(0, len(pages[1][1]))
+
+        loaded = dataset.load()
+        self.assertEqual(len(loaded), sum(len(lines) for _, lines in pages))
+        for (f, lines), (cached_f, cached_lines) in zip(pages, dataset.load_pages()):
+            self.assertIs(f, cached_f)
+            self.assertEqual(len(lines), len(cached_lines))
+            for line, cached_line in zip(lines, cached_lines):
+                self.assertIs(f, line.operation.pcgts)
+                np.testing.assert_array_equal(line.line_image, cached_line.line_image)
+
+    def test_load_in_parallel(self):
+        results = []
+        pcgts = symbol_detection_dataset().files
+        for processes in [1, 2]:
+            with mock.patch('omr.dataset.dataset.DATASET_LOADING_SETTINGS', DatasetLoadingSettings(processes)):
+                dataset = symbol_detection_dataset(pcgts)
+                callback = RecordingCallback()
+                results.append(dataset.load(callback))
+                self.assertEqual([('started', 3), ('loading', 0, 3), ('loading', 1, 3), ('loading', 2, 3), ('loading', 3, 3), ('finished', 3)],
+                                 callback.calls)
+
+        sequential, parallel = results
+        self.assertEqual(len(sequential), len(parallel))
+        points = np.array([[0, 0], [20.5, 7]])
+        for s, p in zip(sequential, parallel):
+            # the lines reference the PcGts of the dataset
+            self.assertIs(s.operation.music_line, p.operation.music_line)
+            self.assertIs(s.operation.pcgts, p.operation.pcgts)
+            np.testing.assert_array_equal(s.line_image, p.line_image)
+            np.testing.assert_array_equal(s.mask, p.mask)
+            np.testing.assert_allclose(dataset.local_to_global_points(points, s.operation.params),
+                                       dataset.local_to_global_points(points, p.operation.params))
+
+    def test_prediction_callback(self):
+        # the loaded pages are reported as the progress of the prediction
+        class Callback(PredictionCallback):
+            def __init__(self):
+                super().__init__()
+                self.calls = []
+
+            def progress_updated(self, percentage: float, n_pages: int = 0, n_processed_pages: int = 0):
+                self.calls.append((percentage, n_pages, n_processed_pages))
+
+        callback = Callback()
+        list(symbol_detection_dataset().load_pages(PredictionDatasetCallback(callback)))
+        self.assertEqual([(0, 3, 0), (1 / 3, 3, 1), (2 / 3, 3, 2), (1, 3, 3)], callback.calls)
+
+    def test_predict_lines_of_pages(self):
+        pages = [('a', [1, 2, 3]), ('b', []), ('c', [4]), ('d', [5, 6, 7, 8, 9]), ('e', [])]
+        batches = []
+        yielded = []
+
+        def predict_lines(lines):
+            batches.append(lines)
+            return [2 * l for l in lines]
+
+        def page_generator():
+            for page in pages:
+                yielded.append(page[0])
+                yield page
+
+        results = []
+        for page, line_results in predict_lines_of_pages(page_generator(), predict_lines, 2):
+            # a page is finished before all pages are loaded
+            results.append((page, line_results, len(yielded)))
+
+        self.assertEqual([[1, 2], [3, 4], [5, 6], [7, 8], [9]], batches)
+        self.assertEqual([('a', [2, 4, 6], 3), ('b', [], 3), ('c', [8], 3), ('d', [10, 12, 14, 16, 18], 5), ('e', [], 5)],
+                         results)
+
+        # a single batch
+        batches.clear()
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], [p for p, _ in predict_lines_of_pages(pages, predict_lines, 0)])
+        self.assertEqual(1, len(batches))
+
+
+class TestBatchPredictor(unittest.TestCase):
+    def test_bucket_batches(self):
+        shapes = [(80, 376), (80, 432), (78, 400), (80, 448), (80, 380), (80, 260)]
+        self.assertEqual([((80, 384), [0, 4]), ((80, 384), [5]), ((80, 512), [1, 2]), ((80, 512), [3])],
+                         bucket_batches(shapes, 2, 128, 3))
+        # the bucket width is rounded up to a multiple of 2 ** pad_power_of_2
+        self.assertEqual([((80, 416), [0, 2, 4]), ((80, 520), [1, 3]), ((80, 312), [5])],
+                         bucket_batches(shapes, 0, 100, 3))
+        self.assertEqual([((80, 376), [0]), ((80, 432), [1]), ((78, 400), [2]), ((80, 448), [3]), ((80, 380), [4]), ((80, 260), [5])],
+                         bucket_batches(shapes, 0, 1))
+
+    def test_predict(self):
+        from ocr4all_pixel_classifier.lib.dataset import Dataset, SingleData
+        from ocr4all_pixel_classifier.lib.predictor import Predictor, PredictSettings
+        rs = np.random.RandomState(0)
+        images = [rs.randint(0, 256, shape).astype(np.uint8) for shape in [(80, 376), (80, 432), (75, 400), (80, 384)]]
+        dataset = Dataset([SingleData(image=image, binary=((image < 125) * 255).astype(np.uint8), user_data=i)
+                           for i, image in enumerate(images)], {})
+
+        network = PixelwiseNetwork()
+        expected = list(Predictor(PredictSettings(n_classes=3), network).predict(dataset))
+        network.batch_shapes.clear()
+        predictions = list(BatchPredictor(Predictor(PredictSettings(n_classes=3), network), 2, 128, 3).predict(dataset))
+
+        self.assertEqual([(2, 80, 384, 1), (2, 80, 512, 1)], network.batch_shapes)
+        self.assertEqual([0, 1, 2, 3], [p.data.user_data for p in predictions])
+        for p, e in zip(predictions, expected):
+            np.testing.assert_array_equal(p.labels, e.labels)
+            np.testing.assert_allclose(p.probabilities, e.probabilities, rtol=1e-6)
+
+
+class TestDatasetCache(unittest.TestCase):
+    def test_dataset_cache(self):
+        page = DatabaseBook('demo').page('page_test_symbol_detection_001')
+        directory = os.path.join(page.local_path(), DatasetCache.DIRECTORY)
+        shutil.rmtree(directory, ignore_errors=True)
+        try:
+            pcgts = PcGts.from_file(page.file('pcgts'))
+            cache = DatasetCache(2)
+
+            def apply(cache: DatasetCache, height: int):
+                dataset = SymbolDetectionDataset([pcgts], DatasetParams(pad=[0, 10, 0, 40], dewarp=True, height=height))
+                dataset.use_cache = True
+                return dataset, cache.apply(dataset, ImageOperationData([], dataset.params.page_scale_reference, page=pcgts.page, pcgts=pcgts))
+
+            dataset, expected = apply(DatasetCache(0), 80)
+            self.assertFalse(os.path.exists(directory))
+            self.assertEqual(len(apply(cache, 80)[1]), len(expected))
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+            # the second call reads the stored lines
+            _, cached = apply(cache, 80)
+            self.assertEqual(len(cached), len(expected))
+            points = np.array([[0, 0], [20.5, 7]])
+            for d, e in zip(cached, expected):
+                self.assertIs(d.music_line, e.music_line)
+                self.assertIs(d.pcgts, pcgts)
+                self.assertEqual(len(d.images), len(e.images))
+                for i, ei in zip(d.images, e.images):
+                    self.assertIsInstance(i.image, np.memmap)
+                    self.assertEqual(i.image.dtype, ei.image.dtype)
+                    np.testing.assert_array_equal(i.image, ei.image)
+                np.testing.assert_allclose(dataset.local_to_global_points(points, d.params),
+                                           dataset.local_to_global_points(points, e.params))
+
+            # only the most recent entries are kept
+            for height in [60, 100]:
+                apply(cache, height)
+            self.assertEqual(len(os.listdir(directory)), 4)
+
+            # entries are removed if the page changed
+            cache.invalidate(pcgts.page)
+            self.assertEqual(len(os.listdir(directory)), 4)
+            pcgts.page.all_music_lines()[0].staff_lines[0].coords.points[0, 1] += 1
+            self.assertNotIsInstance(apply(cache, 100)[1][0].images[0].image, np.memmap)
+            cache.invalidate(pcgts.page)
+            self.assertEqual(len(os.listdir(directory)), 2)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_disabled_by_default(self):
+        page = DatabaseBook('demo').page('page_test_symbol_detection_001')
+        directory = os.path.join(page.local_path(), DatasetCache.DIRECTORY)
+        shutil.rmtree(directory, ignore_errors=True)
+        try:
+            pcgts = PcGts.from_file(page.file('pcgts'))
+            dataset = SymbolDetectionDataset([pcgts], DatasetParams(pad=[0, 10, 0, 40], dewarp=True, height=80))
+            DatasetCache(2).apply(dataset, ImageOperationData([], dataset.params.page_scale_reference, page=pcgts.page, pcgts=pcgts))
+            self.assertFalse(os.path.exists(directory))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_previews_not_in_key(self):
+        page = DatabaseBook('demo').page('page_test_symbol_detection_001')
+        pcgts = PcGts.from_file(page.file('pcgts'))
+        dataset = SymbolDetectionDataset([pcgts], DatasetParams(pad=[0, 10, 0, 40], dewarp=True, height=80))
+        preview = page.file('gray_highres_preproc', create_if_not_existing=True).local_thumbnail_path()
+        digest = DatasetCache._dataset_digest(dataset, pcgts.page)
+        os.utime(preview, ns=(0, 0))
+        self.assertEqual(DatasetCache._dataset_digest(dataset, pcgts.page), digest)
+
+    def test_restricted_unpickling(self):
+        import pickle
+        from omr.dataset.dataset_cache import _loads_entry
+
+        class Exploit:
+            def __reduce__(self):
+                return os.system, ('true', )
+
+        with self.assertRaises(pickle.UnpicklingError):
+            _loads_entry(pickle.dumps({'arrays': [], 'lines': [Exploit()]}))
@@ -0,0 +1,118 @@
+import os
+import shutil
+import unittest
+import numpy as np
+from PIL import Image
+
+import ommr4all.settings as settings
+from database import DatabaseBook
+from database.file_formats.pcgts import Coords, Point, PageScaleReference
+from omr.dewarping.dummy_dewarper import Dewarper, StaffLineInterpolation, transform, NoStaffsAvailable
+from omr.dewarping.dewarp_cache import DewarpCache
+from omr.dataset import DatasetParams
+from omr.imageoperations import ImageOperationData, ImageData, ImageCropToSmallestBoxOperation
+from omr.imageoperations.image_crop import label_bounding_boxes
+from omr.steps.symboldetection.dataset import SymbolDetectionDataset
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Change database to test storage
+settings.PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'tests', 'storage')
+
+
+def wavy_staves(n_staves=3, n_lines=4, width=1000):
+    xs = np.linspace(20, width - 20, 15)
+    return [[Coords(np.stack([xs, 100 + s * 200 + l * 20 + 5 * np.sin(xs / 100)], axis=1)) for l in range(n_lines)]
+            for s in range(n_staves)]
+
+
+class TestDewarper(unittest.TestCase):
+    def test_staff_line_interpolation(self):
+        staves = wavy_staves()
+        interpolation = StaffLineInterpolation(staves)
+        xs = np.array([0, 13, 20, 333.3, 980, 1200])
+        expected = np.array([sl.interpolate_y(xs) for staff in staves for sl in staff])
+        np.testing.assert_allclose(interpolation.interpolate_y(xs), expected)
+
+        # points between two (parallel) staff lines of the dewarped image are moved along with the staff lines
+        line = staves[1][2]
+        points = np.stack([xs, np.full(xs.shape, line.center_y() + 10)], axis=1)
+        np.testing.assert_allclose(interpolation.transform(points)[:, 1], line.interpolate_y(xs) + 10)
+        self.assertAlmostEqual(transform(points[3], staves)[1], line.interpolate_y(xs[3]) + 10)
+
+        with self.assertRaises(NoStaffsAvailable):
+            StaffLineInterpolation([])
+
+    def test_transform_points(self):
+        dewarper = Dewarper((1000, 800), wavy_staves())
+        points = np.array([[10, 10], [500, 333], [999.5, 150], [2000, 2000]])
+        transformed = dewarper.transform_points(points)
+        np.testing.assert_allclose(dewarper.inv_transform_points(transformed), points, atol=1e-6)
+        np.testing.assert_allclose(transformed[-1], points[-1])
+        np.testing.assert_allclose(dewarper.transform_point(points[1]), transformed[1])
+
+
+class TestDewarpCache(unittest.TestCase):
+    def test_dewarp_cache(self):
+        page = DatabaseBook('demo').page('page_test_symbol_detection_001').pcgts().page
+        directory = os.path.join(page.location.local_path(), DewarpCache.DIRECTORY)
+        shutil.rmtree(directory, ignore_errors=True)
+        try:
+            cache = DewarpCache(10, 2)
+            staves = wavy_staves()
+            image = Image.fromarray((np.arange(800 * 1000) % 251).astype(np.uint8).reshape(800, 1000))
+            expected = np.array(Dewarper(image.size, staves).dewarp([image])[0])
+
+            dewarper, (dewarped, ) = cache.dewarp(page, staves, PageScaleReference.NORMALIZED, [image])
+            np.testing.assert_array_equal(dewarped, expected)
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            # the second call reads the stored image and reuses the dewarper
+            cached_dewarper, (dewarped, ) = cache.dewarp(page, staves, PageScaleReference.NORMALIZED, [image])
+            self.assertIs(cached_dewarper, dewarper)
+            np.testing.assert_array_equal(dewarped, expected)
+
+            # only the most recent entries are kept
+            for i in range(3):
+                cache.dewarp(page, staves, PageScaleReference.NORMALIZED, [Image.fromarray(np.full((800, 1000), i, dtype=np.uint8))])
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+            cache.invalidate(page)
+            self.assertEqual(len(os.listdir(directory)), 2)
+
+            # entries are removed if the staff lines changed
+            page.all_music_lines()[0].staff_lines[0].coords.points[0, 1] += 1
+            cache.invalidate(page)
+            self.assertEqual(len(os.listdir(directory)), 0)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestImageOperations(unittest.TestCase):
+    def test_local_to_global_points(self):
+        page = DatabaseBook('demo').page('page_test_symbol_detection_001')
+        for dewarp in [True, False]:
+            dataset = SymbolDetectionDataset([page.pcgts()], DatasetParams(dewarp=dewarp, pad=[0, 10, 0, 40]))
+            for m in dataset.load()[:2]:
+                h, w = m.line_image.shape
+                points = np.array([[0, 0], [w / 2, h / 3], [w - 1, h - 1]])
+                expected = [dataset.local_to_global_pos(Point(*p), m.operation.params).xy() for p in points]
+                np.testing.assert_allclose(dataset.local_to_global_points(points, m.operation.params), expected)
+
+    def test_crop_label(self):
+        labels = np.zeros((200, 300), dtype=np.uint8)
+        labels[10:50, 20:280] = 1
+        labels[40:90, 5:100] = 2
+        labels[150:151, 299:300] = 4
+        image = np.arange(200 * 300).reshape(200, 300)
+        cropper = ImageCropToSmallestBoxOperation(pad=(3, 4, 5, 6))
+        boxes = label_bounding_boxes(labels, 4)
+        self.assertIsNone(boxes[2])
+        for label in [1, 2, 4]:
+            mask = labels == label
+            expected = cropper.apply_single(ImageOperationData([ImageData(mask, True), ImageData(image, False)], PageScaleReference.NORMALIZED))[0]
+            cropped = cropper.apply_label(ImageOperationData([ImageData(image, False)], PageScaleReference.NORMALIZED), labels, label, boxes[label - 1])[0]
+            self.assertEqual(tuple(expected.params), tuple(cropped.params))
+            for e, c in zip(expected.images, cropped.images):
+                np.testing.assert_array_equal(e.image, c.image)
+                self.assertEqual(e.nearest_neighbour_rescale, c.nearest_neighbour_rescale)
@@ -3,10 +3,18 @@ import os
 import logging
 import ommr4all.settings as settings
 from database.file_formats.pcgts.jsonloader import update_pcgts
-from database.file_formats.pcgts import PcGts
+from database.file_formats.pcgts import PcGts, Coords, Point, PageScaleReference, PageScaleNotAvailable, StaffLine, \
+    StaffLines, MusicSymbolPositionInStaff
 import sys
 import json
+import shutil
+import tempfile
+from contextlib import contextmanager
 from copy import deepcopy
+import numpy as np
+from PIL import Image
+from database.file_formats.filecache import ParsedFileCache, pcgts_cache, page_meta_cache
+from database import DatabaseBook, DatabasePage
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', stream=sys.stdout)
 
@@ -17,6 +25,23 @@ settings.PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'tests', 'storage')
 raw_storage = os.path.join(BASE_DIR, 'tests', 'raw_storage')
 
 
+@contextmanager
+def copy_of_demo_page(name='page00000001', file_ids=('color_original', )):
+    # copy of the given files (by default the original image) of a demo page in a temporary storage, without derived files
+    originals = [DatabasePage(DatabaseBook('demo'), name).file(f).local_path() for f in file_ids]
+    root = settings.PRIVATE_MEDIA_ROOT
+    with tempfile.TemporaryDirectory() as d:
+        settings.PRIVATE_MEDIA_ROOT = d
+        try:
+            page = DatabasePage(DatabaseBook('demo'), name)
+            os.makedirs(page.local_path())
+            for f, original in zip(file_ids, originals):
+                shutil.copy(original, page.file(f).local_path())
+            yield page
+        finally:
+            settings.PRIVATE_MEDIA_ROOT = root
+
+
 class GenericTests(unittest.TestCase):
     def test_upgrade(self):
         with open(os.path.join(raw_storage, 'page_test_upgrade_001', 'pcgts.json')) as f:
@@ -27,3 +52,153 @@ class GenericTests(unittest.TestCase):
 
         self.maxDiff = None
         self.assertEqual(json1, PcGts.from_json(json1, None).to_json())
+
+    def test_image_size(self):
+        with copy_of_demo_page() as page:
+            # legacy page: the original image and its preview exist, but the size is not recorded
+            page.file('color_original', create_if_not_existing=True)
+            os.remove(page.file('meta').local_path())
+            page_meta_cache.invalidate(page.file('meta').local_path())
+            page = DatabasePage(page.book, page.page)
+
+            with Image.open(page.file('color_original').local_path()) as img:
+                size = img.size
+
+            # the size is recorded in the (in-memory) page meta on first access, but the meta is not written by the lookup
+            self.assertEqual(size, page.image_size('color_original'))
+            recorded = page.meta().image_sizes['color_original']
+            self.assertEqual(size, (recorded.width, recorded.height))
+            self.assertFalse(page.file('meta').exists())
+            self.assertEqual(size, (page.pcgts().page.image_width, page.pcgts().page.image_height))
+
+    def test_page_scale_size(self):
+        with copy_of_demo_page() as page:
+            pcgts_page = PcGts.from_file(page.file('pcgts', create_if_not_existing=True)).page
+            size = page.image_size('color_original')
+            self.assertEqual(size, pcgts_page.page_scale_size(PageScaleReference.ORIGINAL))
+            self.assertAlmostEqual(0.5, pcgts_page.image_to_page_scale(pcgts_page.page_to_image_scale(0.5)))
+
+            # derived images are not created implicitly
+            with self.assertRaises(PageScaleNotAvailable):
+                pcgts_page.page_scale_size(PageScaleReference.NORMALIZED)
+            self.assertFalse(page.file('color_norm').exists())
+
+    def test_connected_components_selector_without_derived_images(self):
+        from omr.steps.algorithm import AlgorithmPredictorSettings
+        from omr.steps.algorithmpreditorparams import AlgorithmPredictorParams
+        from omr.steps.layout.correction_tools.connectedcomponentsselector.predictor import Predictor, Meta
+        with copy_of_demo_page('page_test_symbol_detection_001', ('color_original', 'pcgts')) as page:
+            line = Coords(np.array([[0.2, 0.3], [0.4, 0.3]]))
+            predictor = Predictor(AlgorithmPredictorSettings(Meta.selected_model_for_book(page.book),
+                                                             AlgorithmPredictorParams(initialLine=line)))
+            self.assertIsInstance(predictor.predict_single(page).polys, list)
+            self.assertTrue(page.file('color_norm').exists())
+
+    def test_coords(self):
+        coords = Coords.from_string('10.5,3 2,7.25 -1,4e-05')
+        np.testing.assert_array_equal(coords.points, [[10.5, 3], [2, 7.25], [-1, 4e-05]])
+        self.assertEqual('10.5,3.0 2.0,7.25 -1.0,4e-05', coords.to_string())
+        self.assertEqual(0, len(Coords.from_string('').points))
+        self.assertEqual('3,4', Point(3, 4).to_string())
+        self.assertEqual('0.1,4.0', Point.from_string('0.1,4').to_string())
+        with self.assertRaises(ValueError):
+            Coords.from_string('1,2 3')
+
+        aabb = coords.aabb()
+        self.assertEqual((-1, 4e-05), (aabb.left(), aabb.top()))
+        self.assertEqual((10.5, 7.25), (aabb.right(), aabb.bottom()))
+
+        points = coords.points.copy()
+        coords.rotate(90, (0, 0))
+        np.testing.assert_allclose(coords.points, np.stack([points[:, 1], -points[:, 0]], axis=1), atol=1e-12)
+        point = Point(points[1])
+        point.rotate(90, (0, 0))
+        np.testing.assert_allclose(point.p, coords.points[1])
+
+    def test_positions_in_staff(self):
+        staff_lines = StaffLines([StaffLine(Coords(np.array([[0, 0.1 * i], [1, 0.1 * i + 0.02]]))) for i in range(1, 5)])
+        xs, ys = np.array([0, 0.5, 0.5, 0.5, 1]), np.array([0.1, 0.26, 0.36, 0.5, 0.05])
+        expected = [MusicSymbolPositionInStaff.LINE_4, MusicSymbolPositionInStaff.SPACE_3,
+                    MusicSymbolPositionInStaff.SPACE_2, MusicSymbolPositionInStaff.LINE_0, MusicSymbolPositionInStaff.LINE_5]
+        np.testing.assert_array_equal(staff_lines.positions_in_staff(xs, ys), expected)
+        self.assertEqual(expected, staff_lines.compute_positions_in_staff(np.stack([xs, ys], axis=1)))
+        self.assertEqual(expected, [staff_lines.position_in_staff(Point(x, y)) for x, y in zip(xs, ys)])
+        self.assertAlmostEqual(0.36, staff_lines.snap_to_pos(Point(0.5, 0.355)))
+
+        # edited lines are not served from the cache
+        staff_lines[0].coords.points[:, 1] -= 0.1
+        staff_lines[0].update()
+        self.assertEqual(MusicSymbolPositionInStaff.SPACE_4, staff_lines.position_in_staff(Point(0, 0.1)))
+        staff_lines.append(StaffLine(Coords(np.array([[0, 0.5], [1, 0.5]]))))
+        self.assertEqual(MusicSymbolPositionInStaff.LINE_1, staff_lines.position_in_staff(Point(0.5, 0.5)))
+
+
+class FileCacheTests(unittest.TestCase):
+    def test_cache(self):
+        cache = ParsedFileCache(max_bytes=1024)
+        loads = []
+
+        def load(path):
+            loads.append(path)
+            with open(path) as f:
+                return json.load(f)
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'data.json')
+            with open(path, 'w') as f:
+                json.dump({'a': [1, 2]}, f)
+
+            # the second read is served from the cache, but returns a copy
+            data = cache.get(path, lambda: load(path))
+            data['a'].append(3)
+            self.assertEqual({'a': [1, 2]}, cache.get(path, lambda: load(path)))
+            self.assertEqual(1, len(loads))
+
+            # a modified file is parsed again
+            with open(path, 'w') as f:
+                json.dump({'a': [1, 2, 3, 4]}, f)
+            self.assertEqual({'a': [1, 2, 3, 4]}, cache.get(path, lambda: load(path)))
+            self.assertEqual(2, len(loads))
+
+            # invalidated and missing files are not served from the cache
+            cache.invalidate(path)
+            cache.get(path, lambda: load(path))
+            self.assertEqual(3, len(loads))
+            os.remove(path)
+            self.assertIsNone(cache.get(path, lambda: None))
+
+    def test_size_bound(self):
+        cache = ParsedFileCache(max_bytes=100)
+        with tempfile.TemporaryDirectory() as d:
+            paths = [os.path.join(d, '{}.json'.format(i)) for i in range(3)]
+            for path, size in zip(paths, [40, 40, 101]):
+                with open(path, 'w') as f:
+                    f.write(' ' * size)
+                cache.get(path, lambda: size)
+
+            # the file that is larger than the bound is not cached
+            self.assertEqual(paths[:2], list(cache.entries.keys()))
+            self.assertEqual(80, cache.size)
+
+            # the least recently used entries are removed
+            with open(paths[2], 'w') as f:
+                f.write(' ' * 50)
+            cache.get(paths[0], lambda: None)
+            cache.get(paths[2], lambda: None)
+            self.assertEqual([paths[0], paths[2]], list(cache.entries.keys()))
+            self.assertEqual(90, cache.size)
+
+            cache.invalidate(paths[0])
+            self.assertEqual(50, cache.size)
+
+    def test_pcgts_copy_on_read(self):
+        page = DatabasePage(DatabaseBook('demo'), 'page00000001')
+        pcgts_cache.invalidate(page.file('pcgts').local_path())
+        pcgts = PcGts.from_file(page.file('pcgts'))
+        expected = pcgts.to_json()
+        pcgts.page.blocks.clear()
+
+        other_page = DatabasePage(DatabaseBook('demo'), 'page00000001')
+        cached = PcGts.from_file(other_page.file('pcgts'))
+        self.assertEqual(expected, cached.to_json())
+        self.assertIs(other_page, cached.dataset_page())
@@ -0,0 +1,178 @@
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+from contextlib import contextmanager
+from unittest import mock
+import numpy as np
+from PIL import Image
+from scipy.ndimage import interpolation
+
+import ommr4all.settings as settings
+from database import DatabaseBook
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Change database to test storage
+settings.PRIVATE_MEDIA_ROOT = os.path.join(BASE_DIR, 'tests', 'storage')
+
+from omr.steps.preprocessing.deskewer.ocropus_deskewer import ProjectionProfiles, estimate_skew
+from omr.steps.preprocessing.scale.scale import LineDistanceComputer, vertical_run_histograms
+from omr.steps.preprocessing.pipeline import PreprocessingPipeline, high_res_max_width
+from omr.steps.preprocessing.preprocessing import Preprocessing
+from omr.steps.preprocessing.util.connected_compontents import connected_compontents_with_stats, ConnectedComponentsStore
+
+
+def staff_image(angle: float) -> np.ndarray:
+    # white page with horizontal black lines that is rotated by the given angle
+    image = np.ones((600, 800), dtype=np.uint8) * 255
+    image[50:550:20, 100:700] = 0
+    return 255 - interpolation.rotate(255 - image, angle, order=0, reshape=False)
+
+
+@contextmanager
+def temporary_page():
+    # page of a book in a temporary storage that only contains an original image
+    root = settings.PRIVATE_MEDIA_ROOT
+    with tempfile.TemporaryDirectory() as d:
+        settings.PRIVATE_MEDIA_ROOT = d
+        try:
+            page = DatabaseBook('temporary').page('page_a')
+            os.makedirs(page.local_path())
+            Image.fromarray(staff_image(0)).convert('RGB').save(page.local_file_path('color_original.jpg'))
+            yield page
+        finally:
+            settings.PRIVATE_MEDIA_ROOT = root
+
+
+class TestDeskewer(unittest.TestCase):
+    def test_projection_profiles(self):
+        image = 255 - staff_image(0)
+        profiles = ProjectionProfiles(image, column_pooling=1)
+        for angle in [-1, -0.25, 0, 0.5, 1.5]:
+            expected = np.var(np.mean(interpolation.rotate(image, angle, order=0, mode='constant'), axis=1))
+            self.assertAlmostEqual(profiles.variance(angle) / expected, 1, delta=0.1)
+
+    def test_estimate_skew(self):
+        for angle in [-0.75, 0.0, 0.5]:
+            image = staff_image(angle)
+            # the angles are relative to a rotation of -1 degree
+            self.assertAlmostEqual(estimate_skew(image) - 1, -angle, delta=0.125)
+            self.assertAlmostEqual(estimate_skew(image, by_profile=True) - 1, -angle, delta=0.125)
+
+
+class TestPreprocessing(unittest.TestCase):
+    def test_exact_by_default(self):
+        # deskewing angles and binary images of the (exact) implementation before the approximations were added,
+        # the binary images are identified by the hash of their bits
+        expected = {
+            'page00000001': (0.75, (1532, 1024), '915a9b8ece6000dc49aa8ae68bd859b52e20eab2'),
+            'page_test_syllable_detection_001': (1.0, (941, 665), '55ded4de35537dba46f15b43c35ace5802ba825f'),
+        }
+        book = DatabaseBook('demo')
+        for page, (angle, shape, digest) in expected.items():
+            original = Image.open(book.page(page).file('color_original').local_path())
+            w, h = original.size
+            out_w = min(high_res_max_width, w)
+            original = original.resize((out_w, (out_w * h) // w), Image.BILINEAR)
+
+            preproc = Preprocessing()
+            _, _, binary = preproc.preprocess(original)
+            binary = np.array(binary)
+            self.assertEqual(angle, preproc.deskewed_angle)
+            self.assertEqual(shape, binary.shape)
+            self.assertEqual(digest, hashlib.sha1(np.packbits(binary > 0).tobytes()).hexdigest())
+
+
+class TestLineDistance(unittest.TestCase):
+    def test_vertical_run_histograms(self):
+        img = np.array([[1, 0, 1],
+                        [0, 0, 1],
+                        [0, 1, 1],
+                        [1, 1, 1]])
+        white_runs, black_runs = vertical_run_histograms([img, img[:2]])
+        # first and last run of every column are counted, uniform columns twice
+        np.testing.assert_array_equal(white_runs[0], [0, 2, 1, 0, 2])
+        np.testing.assert_array_equal(black_runs[0], [0, 0, 2, 0, 0])
+        np.testing.assert_array_equal(white_runs[1], [0, 1, 2, 0, 0])
+        np.testing.assert_array_equal(black_runs[1], [0, 1, 2, 0, 0])
+
+    def test_line_distance(self):
+        # staff lines with a thickness of 4 and a distance of 40 px
+        pages = []
+        for height in [800, 1000]:
+            page = np.ones((height, 1600))
+            for y in range(100, height - 100, 40):
+                page[y:y + 4] = 0
+            pages.append(page)
+
+        results = LineDistanceComputer().get_line_distances(pages, confidence_scales=(0.75, 1.25))
+        self.assertEqual(len(results), 2)
+        for page, result in zip(pages, results):
+            self.assertAlmostEqual(result.line_distance, 40, delta=6)
+            self.assertGreater(result.confidence, 0.9)
+            self.assertEqual(LineDistanceComputer().get_line_distance(page)[:3], result[:3])
+
+
+class TestConnectedComponents(unittest.TestCase):
+    def test_store(self):
+        binary = np.full((300, 500), 255, dtype=np.uint8)
+        rs = np.random.RandomState(0)
+        for x, y, w, h in zip(rs.randint(0, 480, 60), rs.randint(0, 280, 60), rs.randint(1, 100, 60), rs.randint(1, 20, 60)):
+            binary[y:y + h, x:x + w] = 0
+        cc = connected_compontents_with_stats(binary)
+
+        with tempfile.TemporaryDirectory() as d:
+            labels_path, stats_path = os.path.join(d, 'labels.npy'), os.path.join(d, 'stats.npz')
+            ConnectedComponentsStore.save(cc, labels_path, stats_path)
+            store = ConnectedComponentsStore.load(labels_path, stats_path)
+            self.assertIsInstance(store.cc.labels, np.memmap)
+            np.testing.assert_array_equal(store.cc.labels, cc.labels)
+            np.testing.assert_array_equal(store.cc.stats, cc.stats)
+            self.assertEqual(cc.num_labels, store.cc.num_labels)
+
+            xs, ys = np.array([-1, 0, 250, 499, 500]), np.array([0, 0, 150.7, 299, 10])
+            expected = [0, cc.labels[0, 0], cc.labels[150, 250], cc.labels[299, 499], 0]
+            np.testing.assert_array_equal(store.labels_at(xs, ys), expected)
+
+            stats = cc.stats[1:]
+            for left, top, right, bottom in [(0, 0, 500, 300), (100, 100, 101, 101), (60, 20, 300, 90), (490, 290, 600, 400)]:
+                overlaps = (stats[:, 0] < right) & (stats[:, 0] + stats[:, 2] > left) \
+                           & (stats[:, 1] < bottom) & (stats[:, 1] + stats[:, 3] > top)
+                np.testing.assert_array_equal(store.components_in_rect(left, top, right, bottom), np.nonzero(overlaps)[0] + 1)
+            del store
+
+    def test_legacy_file_removed(self):
+        with temporary_page() as page:
+            legacy = page.local_file_path(PreprocessingPipeline.LEGACY_CONNECTED_COMPONENTS_FILE)
+            with open(legacy, 'wb') as f:
+                f.write(b'legacy')
+
+            page.file('connected_components_norm', create_if_not_existing=True)
+            self.assertTrue(page.file('connected_components_norm').exists())
+            self.assertFalse(os.path.exists(legacy))
+
+
+class TestPreprocessingPipeline(unittest.TestCase):
+    def test_concurrent_creation(self):
+        with temporary_page() as page:
+            computed = []
+            compute = PreprocessingPipeline._compute_color_highres_preproc
+
+            def compute_once(pipeline):
+                computed.append(pipeline)
+                return compute(pipeline)
+
+            # the second pipeline waits for the files of the first one and reuses the high resolution image
+            with mock.patch.object(PreprocessingPipeline, '_compute_color_highres_preproc', compute_once):
+                threads = [threading.Thread(target=page.file, args=(file_id, True))
+                           for file_id in ['connected_components_norm', 'color_norm_x2']]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+
+            self.assertEqual(1, len(computed))
+            for file_id in ['color_highres_preproc', 'color_norm', 'color_norm_x2', 'connected_components_norm']:
+                self.assertTrue(page.file(file_id).exists())
@@ -33,6 +33,27 @@ class GenericTests(APITestCase):
         response = client.get('/api/ping')
         self.assertEqual(response.status_code, 200)
 
+    def test_zip_stream(self):
+        import io
+        import zipfile
+        from restapi.utils.zipstream import zip_stream
+        page = DatabaseBook('demo').page('page00000001')
+        image = page.file('color_original').local_path()
+        chunks = list(zip_stream([
+            ('image.jpg', image),
+            ('generated.json', lambda f: f.write(b'{"a": 1}')),
+        ]))
+
+        # the archive is yielded entry by entry, images are stored without compression
+        self.assertGreater(len([c for c in chunks if c]), 2)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as zf:
+            self.assertListEqual(['image.jpg', 'generated.json'], zf.namelist())
+            self.assertEqual(zipfile.ZIP_STORED, zf.getinfo('image.jpg').compress_type)
+            self.assertEqual(zipfile.ZIP_DEFLATED, zf.getinfo('generated.json').compress_type)
+            with open(image, 'rb') as f:
+                self.assertEqual(f.read(), zf.read('image.jpg'))
+            self.assertEqual(b'{"a": 1}', zf.read('generated.json'))
+
 
 class PermissionTests(APITestCase):
 
@@ -76,6 +97,15 @@ class OperationTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
         self.assertEqual('demo', response.data['books'][0]['id'], response.content)
 
+    def test_books_pagination(self):
+        response = self.client.get('/api/books?pageIndex=1&pageSize=1&sortBy=created&sortOrder=desc', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(1, response.data['totalPages'])
+        self.assertListEqual([], response.data['books'])
+
+        response = self.client.get('/api/books?sortBy=unknown', format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, response.content)
+
     def test_pcgts_content(self):
         response = self.client.get('/api/book/demo/page/page00000001/content/pcgts', format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
@@ -4,14 +4,18 @@ import unittest
 import time
 from typing import List
 import uuid
+import os
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(name)-12s %(levelname)-8s %(message)s', stream=sys.stdout)
 
 from restapi.operationworker.taskresources import TaskResource
 from restapi.operationworker.operationworker import OperationWorker, Resources
-from restapi.operationworker.task import TaskStatusCodes, TaskNotFoundException
+from restapi.operationworker.task import TaskStatus, TaskStatusCodes, TaskNotFoundException, TaskPriority
+from restapi.operationworker.taskqueue import TaskQueue
+from restapi.operationworker.taskrunners.pageselection import PageSelection, PageCount
 from restapi.operationworker.taskrunners.taskrunner import TaskRunner
 from restapi.operationworker.taskworkergroup import TaskWorkerGroup
+from ommr4all.settings import TaskWorkerPoolSettings
 
 
 class SleepyTaskRunner(TaskRunner):
@@ -31,7 +35,93 @@ class SleepyTaskRunner(TaskRunner):
         return {}
 
 
+class PriorityTaskRunner(SleepyTaskRunner):
+    def __init__(self, priority: TaskPriority):
+        super().__init__([TaskWorkerGroup.NORMAL_TASKS_CPU], 0)
+        self._priority = priority
+
+    def priority(self):
+        return self._priority
+
+
+class ShardedTaskRunner(SleepyTaskRunner):
+    def __init__(self, pages: List[str], time_s: float):
+        super().__init__([TaskWorkerGroup.NORMAL_TASKS_CPU], time_s)
+        self.selection = PageSelection(None, PageCount.CUSTOM, pages)
+
+    def shards(self, pages_per_shard: int):
+        pages = self.selection.pages
+        return [ShardedTaskRunner(pages[i:i + pages_per_shard], self.time_s) for i in range(0, len(pages), pages_per_shard)]
+
+    def merge_shard_results(self, results):
+        return {'results': sum([r['results'] for r in results], [])}
+
+    def run(self, task, com_queue) -> dict:
+        time.sleep(self.time_s)
+        return {'results': self.selection.pages}
+
+
+class StreamingTaskRunner(ShardedTaskRunner):
+    def shards(self, pages_per_shard: int):
+        pages = self.selection.pages
+        return [StreamingTaskRunner(pages[i:i + pages_per_shard], self.time_s) for i in range(0, len(pages), pages_per_shard)]
+
+    def merge_shard_results(self, results):
+        return {}
+
+    def final_result(self, result, partial_results):
+        return {'results': partial_results}
+
+    def run(self, task, com_queue) -> dict:
+        return {}
+
+
+class PidTaskRunner(SleepyTaskRunner):
+    def run(self, task, com_queue) -> dict:
+        return {'pid': os.getpid()}
+
+
 class TestSkeduler(unittest.TestCase):
+    def _run_pid_task(self, worker: OperationWorker) -> int:
+        task_id = worker.put(PidTaskRunner([TaskWorkerGroup.SHORT_TASKS_CPU], 0), None)
+        for _ in range(50):
+            time.sleep(0.1)
+            if worker.status(task_id).code == TaskStatusCodes.FINISHED:
+                return worker.pop_result(task_id)['pid']
+
+        self.fail("Task did not finish")
+
+    def test_worker_reuse(self):
+        worker = OperationWorker(resources=Resources([TaskResource(TaskWorkerGroup.SHORT_TASKS_CPU)]),
+                                 watcher_interval=-1,
+                                 worker_pool_settings=TaskWorkerPoolSettings(3, -1, 1))
+
+        # the first three tasks must run in the same (warm) process, then the process is recycled
+        pids = [self._run_pid_task(worker) for _ in range(4)]
+        self.assertNotEqual(os.getpid(), pids[0])
+        self.assertEqual(1, len(set(pids[:3])))
+        self.assertNotEqual(pids[0], pids[3])
+        worker.task_creator().worker_pool.shutdown()
+
+    def test_shards(self):
+        worker = OperationWorker(resources=Resources([TaskResource(TaskWorkerGroup.NORMAL_TASKS_CPU) for _ in range(3)]),
+                                 watcher_interval=-1)
+        worker.queue.pages_per_shard = 2
+        pages = ['page_{}'.format(i) for i in range(5)]
+        task_id = worker.put(ShardedTaskRunner(pages, 2), None)
+
+        # the three shards must run in parallel, only the parent task is listed
+        time.sleep(0.5)
+        self.assertEqual(3, worker.resources.n_used())
+        self.assertEqual(TaskStatusCodes.RUNNING, worker.status(task_id).code)
+        self.assertEqual([task_id], [t.task_id for t in worker.queue.list_tasks()])
+
+        time.sleep(2.5)
+        self.assertEqual(TaskStatusCodes.FINISHED, worker.status(task_id).code)
+        self.assertEqual({'results': pages}, worker.pop_result(task_id))
+        self.assertEqual(0, len(worker.queue.tasks))
+        worker.task_creator().worker_pool.shutdown()
+
     def test_skeduler(self):
         user = None
         default_resources: Resources = Resources([
@@ -90,5 +180,91 @@ class TestSkeduler(unittest.TestCase):
         self.assertEqual(0, worker.resources.n_used())
 
 
+class TestTaskQueue(unittest.TestCase):
+    def test_priority_and_fair_share(self):
+        queue = TaskQueue(aging_interval=-1)
+        queue.put('a_batch_1', PriorityTaskRunner(TaskPriority.BATCH), 'a')
+        queue.put('a_batch_2', PriorityTaskRunner(TaskPriority.BATCH), 'a')
+        queue.put('a_training', PriorityTaskRunner(TaskPriority.TRAINING), 'a')
+        queue.put('b_batch_1', PriorityTaskRunner(TaskPriority.BATCH), 'b')
+        queue.put('c_interactive', PriorityTaskRunner(TaskPriority.INTERACTIVE), 'c')
+
+        # interactive first, then the users take turns, training last
+        self.assertEqual(['c_interactive', 'a_batch_1', 'b_batch_1', 'a_batch_2', 'a_training'],
+                         [t.task_id for t in queue.list_queued()])
+
+        # a user with running tasks is served last
+        queue.mark_running(queue.tasks['a_batch_1'])
+        self.assertEqual(['c_interactive', 'b_batch_1', 'a_batch_2', 'a_training'],
+                         [t.task_id for t in queue.list_queued()])
+        self.assertEqual(1, queue.queue_position('b_batch_1'))
+        self.assertEqual(-1, queue.queue_position('a_batch_1'))
+
+        # a sharded task is listed at its first queued subtask
+        queue.pages_per_shard = 1
+        queue.put('b_sharded', ShardedTaskRunner(['page_0', 'page_1'], 0), 'b')
+        self.assertEqual(['c_interactive', 'b_batch_1', 'a_batch_2', 'b_sharded:0', 'b_sharded:1', 'a_training'],
+                         [t.task_id for t in queue.list_queued()])
+        self.assertEqual({'c_interactive': 0, 'b_batch_1': 1, 'a_batch_2': 2, 'b_sharded': 3, 'a_training': 5},
+                         queue.queue_positions())
+        self.assertEqual(3, queue.queue_position('b_sharded'))
+
+    def test_aging(self):
+        queue = TaskQueue(aging_interval=10)
+        queue.put('training', PriorityTaskRunner(TaskPriority.TRAINING), 'a')
+        queue.put('interactive', PriorityTaskRunner(TaskPriority.INTERACTIVE), 'a')
+        self.assertEqual(['interactive', 'training'], [t.task_id for t in queue.list_queued()])
+
+        # after waiting for two aging intervals the training is raised to the interactive priority
+        queue.tasks['training'].queued_time -= 20
+        self.assertEqual(['training', 'interactive'], [t.task_id for t in queue.list_queued()])
+
+    def test_partial_results(self):
+        queue = TaskQueue()
+        queue.pages_per_shard = 2
+        queue.put('task', ShardedTaskRunner(['page_{}'.format(i) for i in range(4)], 0), None)
+        self.assertEqual(([], 0), queue.partial_results('task'))
+
+        # results of finished pages of any shard are collected at the parent task, status updates are optional
+        queue.update_status('task:1', None, partial_results=['page_2'])
+        queue.update_status('task:0', None, partial_results=['page_0', 'page_1'])
+        self.assertEqual(TaskStatusCodes.QUEUED, queue.status_of_task('task:0').code)
+        self.assertEqual((['page_2', 'page_0', 'page_1'], 3), queue.partial_results('task'))
+        self.assertEqual((['page_1'], 3), queue.partial_results('task', 2))
+        self.assertEqual(([], 3), queue.partial_results('task', 3))
+
+    def test_failed_shard(self):
+        queue = TaskQueue()
+        queue.pages_per_shard = 2
+        queue.put('task', ShardedTaskRunner(['page_{}'.format(i) for i in range(6)], 0), None)
+        canceled = []
+        queue.add_cancel_listener(canceled.append)
+        self.assertTrue(queue.mark_running(queue.tasks['task:0']))
+        self.assertTrue(queue.mark_running(queue.tasks['task:1']))
+
+        # the running shard is canceled and the queued shard is not started
+        queue.update_status('task:1', TaskStatus(TaskStatusCodes.ERROR), Exception('failed'))
+        self.assertEqual(['task:0'], [t.task_id for t in canceled])
+        self.assertEqual([], queue.list_queued())
+        self.assertFalse(queue.mark_running(queue.tasks['task:2']))
+        for task_id in ['task', 'task:0', 'task:1', 'task:2']:
+            self.assertEqual(TaskStatusCodes.ERROR, queue.status_of_task(task_id).code)
+
+        self.assertEqual(4, queue.status().n_in_state[TaskStatusCodes.ERROR])
+
+    def test_final_result_from_partial_results(self):
+        queue = TaskQueue()
+        queue.pages_per_shard = 2
+        queue.put('task', StreamingTaskRunner(['page_{}'.format(i) for i in range(4)], 0), None)
+        for shard, pages in [('task:1', ['page_2', 'page_3']), ('task:0', ['page_0', 'page_1'])]:
+            self.assertTrue(queue.mark_running(queue.tasks[shard]))
+            queue.update_status(shard, None, partial_results=pages)
+            queue.update_status(shard, TaskStatus(TaskStatusCodes.FINISHED), {})
+
+        # the shards only streamed their results
+        self.assertEqual(TaskStatusCodes.FINISHED, queue.status_of_task('task').code)
+        self.assertEqual({'results': ['page_2', 'page_3', 'page_0', 'page_1']}, queue.pop_result('task'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+from argparse import ArgumentParser
+from typing import List
+import time
+
+import numpy as np
+from PIL import Image
+from prettytable import PrettyTable
+
+from database import DatabaseBook
+from omr.steps.preprocessing.pipeline import high_res_max_width
+from omr.steps.preprocessing.preprocessing import Preprocessing
+
+
+def high_res_image(image: Image) -> Image:
+    # input of the preprocessing in the preprocessing pipeline
+    w, h = image.size
+    out_w = min(high_res_max_width, w)
+    return image.resize((out_w, (out_w * h) // w), Image.BILINEAR)
+
+
+def benchmark(books: List[str], pages: List[str]):
+    pt = PrettyTable(['Page', 'Angle (ref)', 'Angle', 'Time (ref)', 'Time', 'Binary agreement'])
+    total_ref, total, total_agreement, n = 0, 0, 0, 0
+    for book in books:
+        for page in DatabaseBook(book).pages():
+            if len(pages) > 0 and page.page not in pages:
+                continue
+
+            original = high_res_image(Image.open(page.file('color_original').local_path()))
+
+            t = time.time()
+            ref_preproc = Preprocessing()
+            _, _, ref_binary = ref_preproc.preprocess(original)
+            ref_angle = ref_preproc.deskewed_angle
+            t_ref = time.time() - t
+
+            t = time.time()
+            preproc = Preprocessing(approximate_skew_estimation=True, reuse_whitelevel=True)
+            _, _, binary = preproc.preprocess(original)
+            t_new = time.time() - t
+
+            agreement = np.mean(np.array(ref_binary) == np.array(binary))
+            pt.add_row([page.page, ref_angle, preproc.deskewed_angle, '{:.2f}s'.format(t_ref), '{:.2f}s'.format(t_new),
+                        '{:.2%}'.format(agreement)])
+            total_ref += t_ref
+            total += t_new
+            total_agreement += agreement
+            n += 1
+
+    print(pt)
+    if n > 0:
+        print('Speedup: {:.2f}, average binary agreement: {:.2%}'.format(total_ref / total, total_agreement / n))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Compare the deskewing angles, binarizations, and run times of the '
+                                        'approximate preprocessing with the exact preprocessing')
+    parser.add_argument("--books", nargs="+", required=True)
+    parser.add_argument("--pages", nargs="+", default=[])
+
+    args = parser.parse_args()
+
+    benchmark(args.books, args.pages)